@@ -8,6 +8,10 @@ import pandas as pd
 from fpdf import FPDF
 import io
 from decimal import Decimal
+from db_pool import ConnectionPool
+from report_cache import ReportCache, WATERMARK_VERSION_SQL
+from user_index import UserIndex, USER_WATERMARK_SQL, USERS_SQL
+import report_sql
 
 # ================================
 # ✅ CONFIGURATION
@@ -15,65 +19,87 @@ from decimal import Decimal
 
 class Config:
     OLLAMA_URL = "http://localhost:11434/api/generate"
-    DB_CONFIG = {
-        "host": "localhost",
-        "user": "root",
-        "password": "",  # Fill if needed
-        "database": "clocking_reports"
-    }
+    DB_CONFIG = report_sql.DB_CONFIG
+    DB_POOL = {"size": 5, "wait_timeout": 10.0, "health_check_seconds": 30.0}
+    REPORT_CACHE = {"max_entries": 256, "ttl_seconds": 600.0, "check_seconds": 2.0}
+    USER_INDEX = {"check_seconds": 5.0, "max_age_seconds": 3600.0}
     MODEL_LIST = ["qwen3:0.6b"]
-    SQL_MAPPING = {
-        "sql1": {
-            "description": "Clocking Month Of Month selama 4 bulan",
-            "query": """
-                SELECT 
-                  DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
-                  SUM(ca.duration_minutes) AS total_minutes
-                FROM clocking_activities ca
-                  JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                  JOIN users u ON da.user_id = u.user_id
-                WHERE u.full_name LIKE %s
-                  AND ca.category_id = 400
-                  AND ca.start_date >= DATE_SUB(CURDATE(), INTERVAL 4 MONTH)
-                GROUP BY DATE_FORMAT(ca.start_date, '%Y-%m')
-                ORDER BY month ASC;
-            """
-        },
-        "sql2": {
-            "description": "Analisa clocking bulan 1-3 dibanding target",
-            "query": """
-                SELECT 
-                  DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
-                  SUM(ca.duration_minutes) AS total_minutes,
-                  40 * 60 * 4 AS monthly_target_minutes,
-                  SUM(ca.duration_minutes) - (40 * 60 * 4) AS difference_from_target
-                FROM clocking_activities ca
-                  JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                  JOIN users u ON da.user_id = u.user_id
-                WHERE u.full_name LIKE %s
-                  AND MONTH(ca.start_date) BETWEEN 1 AND 3
-                  AND YEAR(ca.start_date) = YEAR(CURDATE())
-                GROUP BY DATE_FORMAT(ca.start_date, '%Y-%m')
-                ORDER BY month ASC;
-            """
-        }
-    }
+    # Report templates and their declared parameter kinds live in report_sql.py
+    SQL_MAPPING = report_sql.NONLP_SQL_MAPPING
 
 # ================================
 # ✅ DATABASE HANDLER
 # ================================
 
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    # Created once per process and shared by every session and rerun
+    return ConnectionPool(Config.DB_CONFIG, **Config.DB_POOL)
+
+@st.cache_resource
+def get_report_cache() -> ReportCache:
+    return ReportCache(**Config.REPORT_CACHE)
+
+@st.cache_resource
+def get_user_index() -> UserIndex:
+    return UserIndex(**Config.USER_INDEX)
+
 class Database:
     @staticmethod
     def run_query(sql: str, params: tuple = None) -> Union[List[Dict], str]:
         try:
-            with mysql.connector.connect(**Config.DB_CONFIG) as conn:
+            with get_pool().connection() as conn:
                 with conn.cursor(dictionary=True) as cursor:
                     cursor.execute(sql, params)
                     return cursor.fetchall()
         except mysql.connector.Error as e:
             return f"Database error: {e}"
 
+    @staticmethod
+    def watermark_version() -> tuple:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(WATERMARK_VERSION_SQL)
+                return cursor.fetchone()
+
+    @staticmethod
+    def user_watermark() -> list:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(USER_WATERMARK_SQL)
+                return cursor.fetchall()
+
+    @staticmethod
+    def load_users() -> list:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(USERS_SQL)
+                return cursor.fetchall()
+
+    @staticmethod
+    def resolve_user_ids(username: str) -> Union[List[int], str]:
+        # Resolved in memory (prefix trie + fuzzy tokens); the templates then filter on user_id only
+        try:
+            return get_user_index().resolve(username, Database.user_watermark, Database.load_users)
+        except mysql.connector.Error as e:
+            return f"Database error: {e}"
+
+    @staticmethod
+    def report_sql(sql_id: str, user_count: int = 0) -> str:
+        return report_sql.expand_user_ids(Config.SQL_MAPPING[sql_id]["query"], user_count)
+
+    @staticmethod
+    def run_report(sql_id: str, params: tuple = None, user_ids: List[int] = None) -> Union[List[Dict], str]:
+        user_ids = list(user_ids or ())
+        params = tuple(user_ids) + tuple(params or ())
+        sql = Database.report_sql(sql_id, len(user_ids))
+        # Served from the report cache until a migration advances a watermark (or the TTL expires)
+        return get_report_cache().get(
+            (sql_id, params),
+            lambda: Database.run_query(sql, params or None),
+            Database.watermark_version,
+        )
+
 # ================================
 # ✅ LLM HANDLER
 # ================================
@@ -231,7 +257,18 @@ def main():
                 st.error("❌ Username not found in query.")
                 return
 
-            result = Database.run_query(Config.SQL_MAPPING[sql_id]["query"], (f"%{username}%",))
+            user_ids = Database.resolve_user_ids(username)
+            if isinstance(user_ids, str):
+                st.error(user_ids)
+                return
+            if not user_ids:
+                st.error(f"❌ No user matches '{username}'.")
+                return
+            st.caption(f"👤 Matched users: {', '.join(get_user_index().names(user_ids))}")
+            if len(user_ids) > 1:
+                st.info(f"ℹ️ '{username}' matches {len(user_ids)} users; the report lists each of them separately.")
+
+            result = Database.run_report(sql_id, user_ids=user_ids)
             if isinstance(result, str):
                 st.error(result)
                 return
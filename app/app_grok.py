@@ -18,211 +18,109 @@ from reportlab.lib.styles import getSampleStyleSheet
 from io import BytesIO
 from streamlit_modal import Modal
 import os
-
-# Load environment variables from a .env file if present
-def load_env_file(env_path: str = ".env") -> None:
-    if os.path.exists(env_path):
-        try:
-            with open(env_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith("#"):
-                        continue
-                    if "=" not in line:
-                        continue
-                    key, value = line.split("=", 1)
-                    key = key.strip()
-                    value = value.strip().strip('"').strip("'")
-                    # Do not override existing environment variables
-                    if key and key not in os.environ:
-                        os.environ[key] = value
-        except Exception:
-            # Silently continue if .env cannot be read; fall back to defaults
-            pass
-
-# Ensure env vars are loaded before Config is defined
-load_env_file()
+from db_pool import ConnectionPool
+from report_cache import ReportCache, WATERMARK_VERSION_SQL
+from user_index import UserIndex, USER_WATERMARK_SQL, USERS_SQL
+# Also loads .env, so the os.getenv defaults below see it
+import report_sql
 
 # ================================
 # ✅ CONFIGURATION
 # ================================
 class Config:
     OLLAMA_URL = "http://localhost:11434/api/generate"
-    DB_CONFIG = {
-        "host": os.getenv("DB_HOST", "localhost"),
-        "user": os.getenv("DB_USER", "root"),
-        "password": os.getenv("DB_PASSWORD", ""),
-        "database": os.getenv("DB_NAME", "clocking_reports"),
+    DB_CONFIG = report_sql.DB_CONFIG
+    DB_POOL = {
+        "size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "wait_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        "health_check_seconds": float(os.getenv("DB_POOL_HEALTH_CHECK", "30")),
     }
-    MODEL_LIST = ["qwen3:0.6b"]
-    SQL_MAPPING = {
-        "sql1": {
-            "description": "Jumlah clocking untuk user A dengan detail per category",
-            "query": """
-                SELECT 
-                    cc.category_description,
-                    COUNT(ca.activity_id) AS total_clocking,
-                    SUM(ca.duration_minutes) AS total_minutes
-                FROM clocking_activities ca
-                JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                JOIN users u ON da.user_id = u.user_id
-                JOIN category_clocking cc ON ca.category_id = cc.category_id
-                WHERE u.full_name LIKE %s
-                GROUP BY cc.category_id, cc.category_description
-                ORDER BY total_minutes DESC;
-            """
-        },
-        "sql2": {
-            "description": "Top 5 over clocking & Top 5 under clocking users dengan detail category",
-            "query": """
-                WITH WeeklyClocking AS (
-                    SELECT 
-                        u.full_name,
-                        cc.category_description,
-                        WEEK(ca.start_date) AS week_number,
-                        SUM(ca.duration_minutes) / 60.0 AS total_hours
-                    FROM clocking_activities ca
-                    JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                    JOIN users u ON da.user_id = u.user_id
-                    JOIN category_clocking cc ON ca.category_id = cc.category_id
-                    GROUP BY u.user_id, u.full_name, cc.category_id, cc.category_description, WEEK(ca.start_date)
-                ),
-                OverUnderClocking AS (
-                    SELECT 
-                        full_name,
-                        category_description,
-                        AVG(total_hours) AS avg_weekly_hours,
-                        CASE 
-                            WHEN AVG(total_hours) > 40 THEN 'Overclocking'
-                            ELSE 'Underclocking'
-                        END AS clocking_status
-                    FROM WeeklyClocking
-                    GROUP BY full_name, category_description
-                )
-                (SELECT full_name, category_description, avg_weekly_hours, clocking_status
-                 FROM OverUnderClocking
-                 WHERE clocking_status = 'Overclocking'
-                 ORDER BY avg_weekly_hours DESC
-                 LIMIT 5)
-                UNION ALL
-                (SELECT full_name, category_description, avg_weekly_hours, clocking_status
-                 FROM OverUnderClocking
-                 WHERE clocking_status = 'Underclocking'
-                 ORDER BY avg_weekly_hours ASC
-                 LIMIT 5);
-            """
-        },
-        "sql3": {
-            "description": "Analisa efisiensi user B pada bulan tertentu",
-            "query": """
-                SELECT 
-                    u.full_name,
-                    SUM(ca.duration_minutes) / 60.0 AS total_hours,
-                    40 * 4 AS target_hours_month,
-                    (SUM(ca.duration_minutes) / 60.0) - (40 * 4) AS difference_from_target,
-                    CASE 
-                        WHEN SUM(ca.duration_minutes) / 60.0 >= 40 * 4 THEN 'Efficient'
-                        ELSE 'Not Efficient'
-                    END AS efficiency_status
-                FROM clocking_activities ca
-                JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                JOIN users u ON da.user_id = u.user_id
-                WHERE u.full_name LIKE %s
-                    AND MONTH(ca.start_date) = %s
-                    AND YEAR(ca.start_date) = YEAR(CURDATE())
-                GROUP BY u.user_id, u.full_name;
-            """
-        },
-        "sql4": {
-            "description": "Analisa clocking user dari bulan tertentu hingga bulan tertentu dibandingkan target",
-            "query": """
-                SELECT 
-                    DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
-                    SUM(ca.duration_minutes) / 60.0 AS total_hours,
-                    40 * 4 AS monthly_target_hours,
-                    (SUM(ca.duration_minutes) / 60.0) - (40 * 4) AS difference_from_target
-                FROM clocking_activities ca
-                JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                JOIN users u ON da.user_id = u.user_id
-                WHERE u.full_name LIKE %s
-                    AND MONTH(ca.start_date) BETWEEN %s AND %s
-                    AND YEAR(ca.start_date) = YEAR(CURDATE())
-                GROUP BY DATE_FORMAT(ca.start_date, '%Y-%m')
-                ORDER BY month ASC;
-            """
-        },
-        "sql5": {
-            "description": "Grafik clocking Month Of Month selama 4 bulan untuk user D pada category 400",
-            "query": """
-                SELECT 
-                    DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
-                    SUM(ca.duration_minutes) / 60.0 AS total_hours
-                FROM clocking_activities ca
-                JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                JOIN users u ON da.user_id = u.user_id
-                WHERE u.full_name LIKE %s
-                    AND ca.category_id = 400
-                    AND ca.start_date >= DATE_SUB(CURDATE(), INTERVAL 4 MONTH)
-                GROUP BY DATE_FORMAT(ca.start_date, '%Y-%m')
-                ORDER BY month ASC;
-            """
-        },
-        "sql6": {
-            "description": "Report clocking untuk Tim PM (top hingga under clocking)",
-            "query": """
-                WITH WeeklyClocking AS (
-                    SELECT 
-                        u.full_name,
-                        p.project_name,
-                        WEEK(ca.start_date) AS week_number,
-                        SUM(ca.duration_minutes) / 60.0 AS total_hours
-                    FROM clocking_activities ca
-                    JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-                    JOIN users u ON da.user_id = u.user_id
-                    JOIN project_users pu ON u.user_id = pu.user_id
-                    JOIN projects p ON pu.project_code = p.project_code
-                    WHERE p.project_manager_id IS NOT NULL
-                    GROUP BY u.user_id, u.full_name, p.project_code, p.project_name, WEEK(ca.start_date)
-                ),
-                RankedClocking AS (
-                    SELECT 
-                        full_name,
-                        project_name,
-                        AVG(total_hours) AS avg_weekly_hours,
-                        CASE 
-                            WHEN AVG(total_hours) > 40 THEN 'Overclocking'
-                            WHEN AVG(total_hours) < 40 THEN 'Underclocking'
-                            ELSE 'On Target'
-                        END AS clocking_status
-                    FROM WeeklyClocking
-                    GROUP BY full_name, project_name
-                )
-                SELECT 
-                    full_name,
-                    project_name,
-                    avg_weekly_hours,
-                    clocking_status
-                FROM RankedClocking
-                ORDER BY avg_weekly_hours DESC;
-            """
-        }
+    REPORT_CACHE = {
+        "max_entries": int(os.getenv("REPORT_CACHE_SIZE", "256")),
+        "ttl_seconds": float(os.getenv("REPORT_CACHE_TTL", "600")),
+        "check_seconds": float(os.getenv("REPORT_CACHE_CHECK", "2")),
+    }
+    USER_INDEX = {
+        "check_seconds": float(os.getenv("USER_INDEX_CHECK", "5")),
+        "max_age_seconds": float(os.getenv("USER_INDEX_MAX_AGE", "3600")),
     }
+    MODEL_LIST = ["qwen3:0.6b"]
+    # Report templates (rollup-backed) and their declared parameter kinds live in report_sql.py
+    SQL_MAPPING = report_sql.GROK_SQL_MAPPING
 
 # ================================
 # ✅ DATABASE HANDLER
 # ================================
 
+@st.cache_resource
+def get_pool() -> ConnectionPool:
+    # Created once per process and shared by every session and rerun
+    return ConnectionPool(Config.DB_CONFIG, **Config.DB_POOL)
+
+@st.cache_resource
+def get_report_cache() -> ReportCache:
+    return ReportCache(**Config.REPORT_CACHE)
+
+@st.cache_resource
+def get_user_index() -> UserIndex:
+    return UserIndex(**Config.USER_INDEX)
+
 class Database:
     @staticmethod
     def run_query(sql: str, params: tuple = None) -> Union[List[Dict], str]:
         try:
-            with mysql.connector.connect(**Config.DB_CONFIG) as conn:
+            with get_pool().connection() as conn:
                 with conn.cursor(dictionary=True) as cursor:
                     cursor.execute(sql, params)
                     return cursor.fetchall()
         except mysql.connector.Error as e:
             return f"Database error: {e}"
 
+    @staticmethod
+    def watermark_version() -> tuple:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(WATERMARK_VERSION_SQL)
+                return cursor.fetchone()
+
+    @staticmethod
+    def user_watermark() -> list:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(USER_WATERMARK_SQL)
+                return cursor.fetchall()
+
+    @staticmethod
+    def load_users() -> list:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(USERS_SQL)
+                return cursor.fetchall()
+
+    @staticmethod
+    def resolve_user_ids(username: str) -> Union[List[int], str]:
+        # Resolved in memory (prefix trie + fuzzy tokens); the templates then filter on user_id only
+        try:
+            return get_user_index().resolve(username, Database.user_watermark, Database.load_users)
+        except mysql.connector.Error as e:
+            return f"Database error: {e}"
+
+    @staticmethod
+    def report_sql(sql_id: str, user_count: int = 0) -> str:
+        return report_sql.expand_user_ids(Config.SQL_MAPPING[sql_id]["query"], user_count)
+
+    @staticmethod
+    def run_report(sql_id: str, params: tuple = None, user_ids: List[int] = None) -> Union[List[Dict], str]:
+        user_ids = list(user_ids or ())
+        params = tuple(user_ids) + tuple(params or ())
+        sql = Database.report_sql(sql_id, len(user_ids))
+        # Served from the report cache until a migration advances a watermark (or the TTL expires)
+        return get_report_cache().get(
+            (sql_id, params),
+            lambda: Database.run_query(sql, params or None),
+            Database.watermark_version,
+        )
+
 # ================================
 # ✅ LLM HANDLER
 # ================================
@@ -488,6 +386,14 @@ def main():
     # Initialize modal
     modal = Modal("Report", key="report_modal", padding=20, max_width=800)
 
+    # Pool-wait metrics of the shared connection pool (all sessions of this process)
+    with st.sidebar.expander("🔌 DB Pool"):
+        st.json(get_pool().stats())
+    with st.sidebar.expander("⚡ Report Cache"):
+        st.json(get_report_cache().stats())
+    with st.sidebar.expander("👤 User Index"):
+        st.json(get_user_index().stats())
+
     # Display history in sidebar immediately
     for i, entry in enumerate(st.session_state.history):
         with st.sidebar.expander(f"Q{i+1}: {entry['query'][:30]}..."):
@@ -511,18 +417,21 @@ def main():
                 if 'month' in df.columns and 'total_hours' in df.columns:
                     df['month'] = pd.to_datetime(df['month'], format='%Y-%m').dt.strftime('%b %Y')
                     df['total_hours'] = df['total_hours'].astype(float)
+                    # One line per matched user when the username matched several
+                    several_users = 'full_name' in df.columns and df['full_name'].nunique() > 1
                     fig = px.line(
                         df,
                         x='month',
                         y='total_hours',
                         title=f"Clocking Hours for User {entry['username']} (Category 400, Last 4 Months)",
-                        labels={'month': 'Month', 'total_hours': 'Total Hours'},
+                        labels={'month': 'Month', 'total_hours': 'Total Hours', 'full_name': 'User'},
+                        color='full_name' if several_users else None,
                         markers=True
                     )
                     fig.update_layout(
                         xaxis_title="Month",
                         yaxis_title="Total Hours",
-                        showlegend=False
+                        showlegend=several_users
                     )
                     st.plotly_chart(fig, key=f"sql5_chart_history_{st.session_state.selected_history_index}")
             st.markdown(f"**Summary:** {entry['response']}")
@@ -579,17 +488,24 @@ def main():
                     st.error("❌ Username not found in query.")
                     return
                 st.session_state.last_username = username
-                if sql_id == "sql3":
-                    query_params = (f"%{username}%", month_range[0])
-                elif sql_id == "sql4":
-                    query_params = (f"%{username}%", month_range[0], month_range[1])
-                else:
-                    query_params = (f"%{username}%",)
+                user_ids = Database.resolve_user_ids(username)
+                if isinstance(user_ids, str):
+                    st.error(user_ids)
+                    return
+                if not user_ids:
+                    st.error(f"❌ No user matches '{username}'.")
+                    return
+                st.caption(f"👤 Matched users: {', '.join(get_user_index().names(user_ids))}")
+                if len(user_ids) > 1:
+                    st.info(f"ℹ️ '{username}' matches {len(user_ids)} users; the report lists each of them separately.")
+                month_values = {"month": month_range[0], "month_from": month_range[0], "month_to": month_range[1]} if month_range else {}
+                query_params = report_sql.template_params(Config.SQL_MAPPING[sql_id], month_values)
             else:
+                user_ids = None
                 query_params = None
                 st.session_state.last_username = None
 
-            result = Database.run_query(Config.SQL_MAPPING[sql_id]["query"], query_params)
+            result = Database.run_report(sql_id, query_params, user_ids)
             if isinstance(result, str):
                 st.error(result)
                 return
@@ -605,18 +521,21 @@ def main():
                 if 'month' in df.columns and 'total_hours' in df.columns:
                     df['month'] = pd.to_datetime(df['month'], format='%Y-%m').dt.strftime('%b %Y')
                     df['total_hours'] = df['total_hours'].astype(float)
+                    # One line per matched user when the username matched several
+                    several_users = 'full_name' in df.columns and df['full_name'].nunique() > 1
                     fig = px.line(
                         df,
                         x='month',
                         y='total_hours',
                         title=f"Clocking Hours for User {username} (Category 400, Last 4 Months)",
-                        labels={'month': 'Month', 'total_hours': 'Total Hours'},
+                        labels={'month': 'Month', 'total_hours': 'Total Hours', 'full_name': 'User'},
+                        color='full_name' if several_users else None,
                         markers=True
                     )
                     fig.update_layout(
                         xaxis_title="Month",
                         yaxis_title="Total Hours",
-                        showlegend=False
+                        showlegend=several_users
                     )
                     st.plotly_chart(fig, key="sql5_chart_submit")
                     chart_image_buffer = BytesIO()
@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector import errors
+
+# ================================
+# ✅ CONNECTION POOL
+# ================================
+
+class ConnectionPool:
+    """Thread-safe MySQL connection pool shared by every Streamlit session of a process.
+
+    Connections are opened lazily up to ``size``. A session that finds the pool
+    empty waits up to ``wait_timeout`` seconds for one to be returned.
+    Connections idle for more than ``health_check_seconds`` are pinged (and
+    reconnected) before reuse, and connections that fail mid-query are dropped.
+    """
+
+    def __init__(self, config: dict, size: int = 5, wait_timeout: float = 10.0, health_check_seconds: float = 30.0):
+        # autocommit: a pooled connection must not keep an old REPEATABLE READ snapshot between reports
+        self.config = {**config, "autocommit": True}
+        self.size = max(1, int(size))
+        self.wait_timeout = wait_timeout
+        self.health_check_seconds = health_check_seconds
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.metrics = {
+            "acquired": 0, "waited": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+            "timeouts": 0, "opened": 0, "health_checks": 0, "discarded": 0,
+        }
+
+    def _count(self, **values):
+        with self.lock:
+            for key, value in values.items():
+                self.metrics[key] += value
+
+    def _take(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            grow = self.opened < self.size
+            if grow:
+                self.opened += 1
+        if grow:
+            try:
+                conn = mysql.connector.connect(**self.config)
+            except Exception:
+                with self.lock:
+                    self.opened -= 1
+                raise
+            self._count(opened=1)
+            return conn, time.monotonic()
+        try:
+            return self.idle.get(timeout=self.wait_timeout)
+        except queue.Empty:
+            self._count(timeouts=1)
+            raise errors.PoolError(f"No database connection free after {self.wait_timeout}s (pool size {self.size})")
+
+    def acquire(self):
+        started = time.perf_counter()
+        conn, last_used = self._take()
+        waited = time.perf_counter() - started
+        with self.lock:
+            self.metrics["acquired"] += 1
+            self.metrics["wait_seconds"] += waited
+            self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], waited)
+            if waited >= 0.001:
+                self.metrics["waited"] += 1
+        if time.monotonic() - last_used > self.health_check_seconds:
+            self._count(health_checks=1)
+            try:
+                conn.ping(reconnect=True, attempts=2, delay=0)
+            except mysql.connector.Error:
+                self.discard(conn)
+                raise
+        return conn
+
+    def release(self, conn):
+        self.idle.put((conn, time.monotonic()))
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.opened -= 1
+            self.metrics["discarded"] += 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except (errors.OperationalError, errors.InterfaceError):
+            # Lost/broken connection: never hand it to the next session
+            self.discard(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.metrics)
+            stats["size"] = self.size
+            stats["in_use"] = self.opened - self.idle.qsize()
+        stats["avg_wait_ms"] = round(1000 * stats["wait_seconds"] / stats["acquired"], 3) if stats["acquired"] else 0.0
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+        return stats
@@ -0,0 +1,144 @@
+import argparse
+import re
+import mysql.connector
+from report_sql import DB_CONFIG, DBCON_SQL_MAPPING, GROK_SQL_MAPPING, NONLP_SQL_MAPPING, expand_user_ids, template_params
+
+# ================================
+# ✅ INDEX ADVISOR
+# ================================
+
+# Composite indexes the report templates are written for: equality / join columns first, then the range column.
+RECOMMENDED_INDEXES = {
+    "clocking_activities": [("idx_ca_daily_start_category", ("daily_activity_id", "start_date", "category_id"))],
+    "daily_activities": [("idx_da_user", ("user_id", "daily_activity_id"))],
+    "clocking_rollup_month": [("idx_rollup_month_user", ("user_id", "cal_month"))],
+    "project_users": [("idx_pu_user_project", ("user_id", "project_code"))],
+}
+
+# Plans that read a whole table or index instead of seeking into it
+SCAN_TYPES = ("ALL", "index")
+
+# A value for every parameter kind the templates declare (report_sql.py)
+SAMPLE_VALUES = {"month": 1, "month_from": 1, "month_to": 12}
+
+TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|GROUP\b|ORDER\b)(\w+))?", re.IGNORECASE)
+
+
+def templates():
+    """(name, spec) for every report template of the apps."""
+    sources = (("grok", GROK_SQL_MAPPING), ("noNLP", NONLP_SQL_MAPPING), ("dbcon", DBCON_SQL_MAPPING))
+    for prefix, mapping in sources:
+        for sql_id, spec in mapping.items():
+            yield f"{prefix}:{sql_id}", spec
+
+
+def sample_params(spec, user_id):
+    # The {user_ids} list (expanded for one user) comes first, then the declared kinds
+    users = (user_id,) if "{user_ids}" in spec["query"] else ()
+    params = users + template_params(spec, SAMPLE_VALUES)
+    return params or None
+
+
+def alias_map(sql):
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        aliases[alias or table] = table
+        aliases[table] = table
+    return aliases
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql.strip().rstrip(";"), params)
+    return cursor.fetchall()
+
+
+def load_indexes(cursor, table):
+    """{index_name: [columns in order]} for a table in the current database."""
+    cursor.execute(
+        """
+        SELECT INDEX_NAME, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """,
+        (table,),
+    )
+    indexes = {}
+    for row in cursor.fetchall():
+        indexes.setdefault(row["INDEX_NAME"], []).append(row["COLUMN_NAME"])
+    return indexes
+
+
+def covered(indexes, columns):
+    return any(tuple(existing[:len(columns)]) == tuple(columns) for existing in indexes.values())
+
+
+def advise(cursor, plan, aliases):
+    """Recommended (table, name, columns) for plan rows that scan, or that seek on a shorter prefix."""
+    advice = []
+    for row in plan:
+        table = aliases.get(row["table"] or "")
+        if table not in RECOMMENDED_INDEXES:
+            continue
+        indexes = load_indexes(cursor, table)
+        used = indexes.get(row["key"] or "", [])
+        for name, columns in RECOMMENDED_INDEXES[table]:
+            if covered(indexes, columns):
+                continue
+            extends_used = bool(used) and tuple(columns[:len(used)]) == tuple(used)
+            if row["type"] in SCAN_TYPES or not row["key"] or extends_used:
+                advice.append((table, name, columns))
+    return advice
+
+
+def print_plan(name, plan):
+    print(f"📋 {name}")
+    for row in plan:
+        print(
+            f"   {row['table'] or '-':<24} type={row['type'] or '-':<7} key={row['key'] or '-':<28} "
+            f"rows={row['rows'] or 0:<10} {row['Extra'] or ''}"
+        )
+
+
+def run(apply=False):
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT MIN(user_id) AS user_id FROM users")
+    user_id = (cursor.fetchone() or {}).get("user_id") or 0
+
+    pending = {}
+    for name, spec in templates():
+        sql = expand_user_ids(spec["query"], 1)
+        try:
+            plan = explain(cursor, sql, sample_params(spec, user_id))
+        except mysql.connector.Error as e:
+            print(f"⚠️ {name}: EXPLAIN failed: {e}")
+            continue
+        print_plan(name, plan)
+        for table, index_name, columns in advise(cursor, plan, alias_map(sql)):
+            pending.setdefault((table, index_name), columns)
+            print(f"   💡 {table}: ADD INDEX {index_name} ({', '.join(columns)})")
+
+    if not pending:
+        print("✅ No missing indexes for the report templates.")
+    elif apply:
+        for (table, index_name), columns in pending.items():
+            print(f"🧱 Creating {index_name} on {table} ({', '.join(columns)})...")
+            cursor.execute(
+                f"ALTER TABLE `{table}` ADD INDEX `{index_name}` ({', '.join(f'`{c}`' for c in columns)}), "
+                "ALGORITHM=INPLACE, LOCK=NONE"
+            )
+        print(f"✅ Created {len(pending)} indexes; re-run without --apply to check the new plans.")
+    else:
+        print(f"ℹ️ {len(pending)} indexes recommended; run with --apply to create them.")
+
+    cursor.close()
+    conn.close()
+    return pending
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN every report template and recommend (or create) composite indexes")
+    parser.add_argument("--apply", action="store_true", help="Create the recommended indexes (online, INPLACE)")
+    args = parser.parse_args()
+    run(apply=args.apply)
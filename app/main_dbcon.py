@@ -2,23 +2,22 @@ import streamlit as st
 import requests
 import json
 import re
-import mysql.connector
 import pandas as pd
 from fpdf import FPDF
 import io
 from decimal import Decimal
+from db_pool import ConnectionPool
+from user_index import UserIndex, USER_WATERMARK_SQL, USERS_SQL
+import report_sql
 
 # ================================
 # ✅ CONFIGURATION
 # ================================
 
 OLLAMA_URL = "http://localhost:11434/api/generate"
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",  # Fill if needed
-    "database": "clocking_reports"
-}
+DB_CONFIG = report_sql.DB_CONFIG
+DB_POOL = {"size": 5, "wait_timeout": 10.0, "health_check_seconds": 30.0}
+USER_INDEX = {"check_seconds": 5.0, "max_age_seconds": 3600.0}
 
 MODEL_LIST = ["qwen3:0.6b"]
 
@@ -26,42 +25,8 @@ MODEL_LIST = ["qwen3:0.6b"]
 # ✅ SQL MAPPING (TOOLS)
 # ================================
 
-SQL_MAPPING = {
-    "sql1": {
-        "description": "Clocking Month Of Month selama 4 bulan",
-        "query": """
-            SELECT 
-              DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
-              SUM(ca.duration_minutes) AS total_minutes
-            FROM clocking_activities ca
-              JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-              JOIN users u ON da.user_id = u.user_id
-            WHERE u.full_name LIKE %s
-              AND ca.category_id = 400
-              AND ca.start_date >= DATE_SUB(CURDATE(), INTERVAL 4 MONTH)
-            GROUP BY DATE_FORMAT(ca.start_date, '%Y-%m')
-            ORDER BY month ASC;
-        """
-    },
-    "sql2": {
-        "description": "Analisa clocking bulan 1-3 dibanding target",
-        "query": """
-            SELECT 
-              DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
-              SUM(ca.duration_minutes) AS total_minutes,
-              40 * 60 * 4 AS monthly_target_minutes,
-              SUM(ca.duration_minutes) - (40 * 60 * 4) AS difference_from_target
-            FROM clocking_activities ca
-              JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
-              JOIN users u ON da.user_id = u.user_id
-            WHERE u.full_name LIKE %s
-              AND MONTH(ca.start_date) BETWEEN %s AND %s
-              AND YEAR(ca.start_date) = YEAR(CURDATE())
-            GROUP BY DATE_FORMAT(ca.start_date, '%Y-%m')
-            ORDER BY month ASC;
-        """
-    }
-}
+# Templates and their declared parameter kinds live in report_sql.py
+SQL_MAPPING = report_sql.DBCON_SQL_MAPPING
 
 # ================================
 # ✅ UTILITY FUNCTIONS
@@ -93,18 +58,44 @@ def select_sql_tool(model, query):
     selected_tool = response.get("response", "").strip()
     return selected_tool if selected_tool in SQL_MAPPING else None
 
+@st.cache_resource
+def get_pool():
+    # Created once per process and shared by every session and rerun
+    return ConnectionPool(DB_CONFIG, **DB_POOL)
+
 def run_query(sql, params=None):
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(sql, params)
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            results = cursor.fetchall()
+            cursor.close()
         return results
     except Exception as e:
         return f"Database error: {e}"
 
+@st.cache_resource
+def get_user_index():
+    return UserIndex(**USER_INDEX)
+
+def fetch_rows(sql):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+def resolve_user_ids(username):
+    # Resolved in memory (prefix trie + fuzzy tokens); the templates then filter on user_id only
+    try:
+        return get_user_index().resolve(username, lambda: fetch_rows(USER_WATERMARK_SQL), lambda: fetch_rows(USERS_SQL))
+    except Exception as e:
+        return f"Database error: {e}"
+
+def report_query(sql_id, user_ids):
+    return report_sql.expand_user_ids(SQL_MAPPING[sql_id]["query"], len(user_ids))
+
 def save_json_to_excel(json_data, filename="output.xlsx"):
     try:
         if isinstance(json_data, dict):
@@ -271,9 +262,19 @@ if submit_button and query:
             st.error("❌ Username not found in your query.")
         else:
             start_month, end_month = extract_time_range(query)
-            sql_template = SQL_MAPPING[sql_id]["query"]
-            params = (f"%{username}%",) if sql_id == "sql1" else (f"%{username}%", start_month, end_month)
-            result = run_query(sql_template, params)
+            user_ids = resolve_user_ids(username)
+            if isinstance(user_ids, str):
+                result = user_ids
+            elif not user_ids:
+                result = f"❌ No user matches '{username}'."
+            else:
+                st.caption(f"👤 Matched users: {', '.join(get_user_index().names(user_ids))}")
+                if len(user_ids) > 1:
+                    st.info(f"ℹ️ '{username}' matches {len(user_ids)} users; the report lists each of them separately.")
+                params = tuple(user_ids) + report_sql.template_params(
+                    SQL_MAPPING[sql_id], {"month_from": start_month, "month_to": end_month}
+                )
+                result = run_query(report_query(sql_id, user_ids), params)
             if isinstance(result, str):  # Error
                 st.error(result)
             else:
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ================================
+# ✅ REPORT RESULT CACHE
+# ================================
+
+# Fingerprint of every migration watermark; it changes whenever any job advances
+# (migration_state.updated_at only moves when a row's values actually change)
+WATERMARK_VERSION_SQL = """
+    SELECT COUNT(*), MAX(updated_at),
+           COALESCE(SUM(CRC32(CONCAT_WS('|', job_name, last_updated_at, last_id))), 0)
+    FROM migration_state
+"""
+
+
+class ReportCache:
+    """LRU + TTL cache of report results keyed by ``(sql_id, params)``.
+
+    Report data only changes when a migration runs, so the whole cache is
+    dropped as soon as the ``migration_state`` fingerprint changes. The
+    fingerprint is re-read at most every ``check_seconds``, so a hit costs at
+    most one tiny query instead of re-aggregating the report.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600.0, check_seconds: float = 2.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.check_seconds = check_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked_at = None
+        self.generation = 0
+        self.metrics = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def _sync(self, load_version):
+        now = time.monotonic()
+        with self.lock:
+            if self.checked_at is not None and now - self.checked_at < self.check_seconds:
+                return
+            self.checked_at = now
+        version = load_version()
+        with self.lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.metrics["invalidations"] += 1
+                self.version = version
+                self.entries.clear()
+                self.generation += 1
+
+    def get(self, key, load, load_version):
+        """Cached rows for ``key``, or the result of ``load()`` (cached only if it is a row list)."""
+        try:
+            self._sync(load_version)
+        except Exception:
+            # Watermarks unreadable: serve uncached rather than risk stale reports
+            self.clear()
+            return load()
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry[0] < self.ttl_seconds:
+                self.entries.move_to_end(key)
+                self.metrics["hits"] += 1
+                return [dict(row) for row in entry[1]]
+            self.metrics["misses"] += 1
+            generation = self.generation
+        rows = load()
+        if isinstance(rows, list):
+            with self.lock:
+                # Skip storing if a migration advanced while the report was running
+                if generation == self.generation:
+                    self.entries[key] = (time.monotonic(), rows)
+                    self.entries.move_to_end(key)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                        self.metrics["evictions"] += 1
+            return [dict(row) for row in rows]
+        return rows
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = None
+            self.checked_at = None
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.metrics)
+            stats["entries"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,299 @@
+import os
+
+# ================================
+# ✅ SHARED REPORT CONFIGURATION
+# ================================
+# Plain module (no Streamlit) so the apps and CLI tools such as index_advisor.py
+# read the same connection settings and report templates.
+
+
+# Load environment variables from a .env file if present
+def load_env_file(env_path: str = ".env") -> None:
+    if os.path.exists(env_path):
+        try:
+            with open(env_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    if "=" not in line:
+                        continue
+                    key, value = line.split("=", 1)
+                    key = key.strip()
+                    value = value.strip().strip('"').strip("'")
+                    # Do not override existing environment variables
+                    if key and key not in os.environ:
+                        os.environ[key] = value
+        except Exception:
+            # Silently continue if .env cannot be read; fall back to defaults
+            pass
+
+# Ensure env vars are loaded before DB_CONFIG is read
+load_env_file()
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "database": os.getenv("DB_NAME", "clocking_reports"),
+}
+
+# Every template declares the kinds of its %s parameters under "params", in placeholder
+# order: "month" (1-12), "month_from" / "month_to" (a 1-12 range). The {user_ids} list
+# always comes first and is expanded separately (see expand_user_ids). A username can
+# match several users, so templates filtering on {user_ids} group by user and return
+# full_name: one report per matched user instead of their clocking summed together.
+
+
+def expand_user_ids(query: str, user_count: int) -> str:
+    # One placeholder per resolved user_id
+    return query.replace("{user_ids}", ", ".join(["%s"] * user_count))
+
+
+def template_params(spec: dict, values: dict) -> tuple:
+    """Positional parameters for a template from {kind: value}, in the order its placeholders expect."""
+    return tuple(values[kind] for kind in spec["params"])
+
+
+# app_grok.py: templates read the clocking rollups (migration/migration_rollup.py) instead of
+# re-aggregating clocking_activities: user x category x ISO week / calendar month buckets.
+# Periods are compared as plain integers, so every filter can use the rollup keys.
+GROK_SQL_MAPPING = {
+    "sql1": {
+        "description": "Jumlah clocking untuk user A dengan detail per category",
+        "query": """
+            SELECT 
+                u.full_name,
+                cc.category_description,
+                SUM(r.activity_count) AS total_clocking,
+                SUM(r.minutes) AS total_minutes
+            FROM clocking_rollup_month r
+            JOIN users u ON r.user_id = u.user_id
+            JOIN category_clocking cc ON r.category_id = cc.category_id
+            WHERE r.user_id IN ({user_ids})
+            GROUP BY u.user_id, u.full_name, cc.category_id, cc.category_description
+            ORDER BY u.full_name, total_minutes DESC;
+        """,
+        "params": [],
+    },
+    "sql2": {
+        "description": "Top 5 over clocking & Top 5 under clocking users dengan detail category",
+        "query": """
+            WITH WeeklyClocking AS (
+                SELECT 
+                    u.full_name,
+                    cc.category_description,
+                    r.iso_week AS week_number,
+                    SUM(r.minutes) / 60.0 AS total_hours
+                FROM clocking_rollup_week r
+                JOIN users u ON r.user_id = u.user_id
+                JOIN category_clocking cc ON r.category_id = cc.category_id
+                GROUP BY u.user_id, u.full_name, cc.category_id, cc.category_description, r.iso_week
+            ),
+            OverUnderClocking AS (
+                SELECT 
+                    full_name,
+                    category_description,
+                    AVG(total_hours) AS avg_weekly_hours,
+                    CASE 
+                        WHEN AVG(total_hours) > 40 THEN 'Overclocking'
+                        ELSE 'Underclocking'
+                    END AS clocking_status
+                FROM WeeklyClocking
+                GROUP BY full_name, category_description
+            )
+            (SELECT full_name, category_description, avg_weekly_hours, clocking_status
+             FROM OverUnderClocking
+             WHERE clocking_status = 'Overclocking'
+             ORDER BY avg_weekly_hours DESC
+             LIMIT 5)
+            UNION ALL
+            (SELECT full_name, category_description, avg_weekly_hours, clocking_status
+             FROM OverUnderClocking
+             WHERE clocking_status = 'Underclocking'
+             ORDER BY avg_weekly_hours ASC
+             LIMIT 5);
+        """,
+        "params": [],
+    },
+    "sql3": {
+        "description": "Analisa efisiensi user B pada bulan tertentu",
+        "query": """
+            SELECT 
+                u.full_name,
+                SUM(r.minutes) / 60.0 AS total_hours,
+                40 * 4 AS target_hours_month,
+                (SUM(r.minutes) / 60.0) - (40 * 4) AS difference_from_target,
+                CASE 
+                    WHEN SUM(r.minutes) / 60.0 >= 40 * 4 THEN 'Efficient'
+                    ELSE 'Not Efficient'
+                END AS efficiency_status
+            FROM clocking_rollup_month r
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.user_id IN ({user_ids})
+                AND r.cal_month = YEAR(CURDATE()) * 100 + %s
+            GROUP BY u.user_id, u.full_name;
+        """,
+        "params": ["month"],
+    },
+    "sql4": {
+        "description": "Analisa clocking user dari bulan tertentu hingga bulan tertentu dibandingkan target",
+        "query": """
+            SELECT 
+                u.full_name,
+                CONCAT(r.cal_month DIV 100, '-', LPAD(r.cal_month MOD 100, 2, '0')) AS month,
+                SUM(r.minutes) / 60.0 AS total_hours,
+                40 * 4 AS monthly_target_hours,
+                (SUM(r.minutes) / 60.0) - (40 * 4) AS difference_from_target
+            FROM clocking_rollup_month r
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.user_id IN ({user_ids})
+                AND r.cal_month BETWEEN YEAR(CURDATE()) * 100 + %s AND YEAR(CURDATE()) * 100 + %s
+            GROUP BY u.user_id, u.full_name, r.cal_month
+            ORDER BY u.full_name, month ASC;
+        """,
+        "params": ["month_from", "month_to"],
+    },
+    "sql5": {
+        "description": "Grafik clocking Month Of Month selama 4 bulan untuk user D pada category 400 (bulan penuh sejak tanggal 1, 4 bulan lalu, hingga hari ini)",
+        "query": """
+            SELECT 
+                u.full_name,
+                CONCAT(r.cal_month DIV 100, '-', LPAD(r.cal_month MOD 100, 2, '0')) AS month,
+                SUM(r.minutes) / 60.0 AS total_hours
+            FROM clocking_rollup_month r
+            JOIN users u ON r.user_id = u.user_id
+            WHERE r.user_id IN ({user_ids})
+                AND r.category_id = 400
+                AND r.cal_month >= EXTRACT(YEAR_MONTH FROM DATE_SUB(CURDATE(), INTERVAL 4 MONTH))
+            GROUP BY u.user_id, u.full_name, r.cal_month
+            ORDER BY u.full_name, month ASC;
+        """,
+        "params": [],
+    },
+    "sql6": {
+        "description": "Report clocking untuk Tim PM (top hingga under clocking)",
+        "query": """
+            WITH WeeklyClocking AS (
+                SELECT 
+                    u.full_name,
+                    p.project_name,
+                    r.iso_week AS week_number,
+                    SUM(r.minutes) / 60.0 AS total_hours
+                FROM clocking_rollup_week r
+                JOIN users u ON r.user_id = u.user_id
+                JOIN project_users pu ON u.user_id = pu.user_id
+                JOIN projects p ON pu.project_code = p.project_code
+                WHERE p.project_manager_id IS NOT NULL
+                GROUP BY u.user_id, u.full_name, p.project_code, p.project_name, r.iso_week
+            ),
+            RankedClocking AS (
+                SELECT 
+                    full_name,
+                    project_name,
+                    AVG(total_hours) AS avg_weekly_hours,
+                    CASE 
+                        WHEN AVG(total_hours) > 40 THEN 'Overclocking'
+                        WHEN AVG(total_hours) < 40 THEN 'Underclocking'
+                        ELSE 'On Target'
+                    END AS clocking_status
+                FROM WeeklyClocking
+                GROUP BY full_name, project_name
+            )
+            SELECT 
+                full_name,
+                project_name,
+                avg_weekly_hours,
+                clocking_status
+            FROM RankedClocking
+            ORDER BY avg_weekly_hours DESC;
+        """,
+        "params": [],
+    }
+}
+
+# app_connectdb_noNLP.py: dates are filtered as half-open ranges so (user_id) on
+# daily_activities and (daily_activity_id, start_date, ...) on clocking_activities apply
+NONLP_SQL_MAPPING = {
+    "sql1": {
+        "description": "Clocking Month Of Month selama 4 bulan (bulan penuh sejak tanggal 1, 4 bulan lalu, hingga hari ini)",
+        "query": """
+            SELECT 
+              u.full_name,
+              DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
+              SUM(ca.duration_minutes) AS total_minutes
+            FROM daily_activities da
+              JOIN users u ON u.user_id = da.user_id
+              JOIN clocking_activities ca ON ca.daily_activity_id = da.daily_activity_id
+            WHERE da.user_id IN ({user_ids})
+              AND ca.category_id = 400
+              AND ca.start_date >= DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 4 MONTH), '%Y-%m-01')
+            GROUP BY da.user_id, u.full_name, DATE_FORMAT(ca.start_date, '%Y-%m')
+            ORDER BY u.full_name, month ASC;
+        """,
+        "params": [],
+    },
+    "sql2": {
+        "description": "Analisa clocking bulan 1-3 dibanding target",
+        "query": """
+            SELECT 
+              u.full_name,
+              DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
+              SUM(ca.duration_minutes) AS total_minutes,
+              40 * 60 * 4 AS monthly_target_minutes,
+              SUM(ca.duration_minutes) - (40 * 60 * 4) AS difference_from_target
+            FROM daily_activities da
+              JOIN users u ON u.user_id = da.user_id
+              JOIN clocking_activities ca ON ca.daily_activity_id = da.daily_activity_id
+            WHERE da.user_id IN ({user_ids})
+              AND ca.start_date >= MAKEDATE(YEAR(CURDATE()), 1)
+              AND ca.start_date < MAKEDATE(YEAR(CURDATE()), 1) + INTERVAL 3 MONTH
+            GROUP BY da.user_id, u.full_name, DATE_FORMAT(ca.start_date, '%Y-%m')
+            ORDER BY u.full_name, month ASC;
+        """,
+        "params": [],
+    }
+}
+
+# main_dbcon.py: same tables as NONLP_SQL_MAPPING, but sql2 takes its month range from the query
+DBCON_SQL_MAPPING = {
+    "sql1": {
+        "description": "Clocking Month Of Month selama 4 bulan (bulan penuh sejak tanggal 1, 4 bulan lalu, hingga hari ini)",
+        "query": """
+            SELECT 
+              u.full_name,
+              DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
+              SUM(ca.duration_minutes) AS total_minutes
+            FROM daily_activities da
+              JOIN users u ON u.user_id = da.user_id
+              JOIN clocking_activities ca ON ca.daily_activity_id = da.daily_activity_id
+            WHERE da.user_id IN ({user_ids})
+              AND ca.category_id = 400
+              AND ca.start_date >= DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 4 MONTH), '%Y-%m-01')
+            GROUP BY da.user_id, u.full_name, DATE_FORMAT(ca.start_date, '%Y-%m')
+            ORDER BY u.full_name, month ASC;
+        """,
+        "params": [],
+    },
+    "sql2": {
+        "description": "Analisa clocking bulan 1-3 dibanding target",
+        "query": """
+            SELECT 
+              u.full_name,
+              DATE_FORMAT(ca.start_date, '%Y-%m') AS month,
+              SUM(ca.duration_minutes) AS total_minutes,
+              40 * 60 * 4 AS monthly_target_minutes,
+              SUM(ca.duration_minutes) - (40 * 60 * 4) AS difference_from_target
+            FROM daily_activities da
+              JOIN users u ON u.user_id = da.user_id
+              JOIN clocking_activities ca ON ca.daily_activity_id = da.daily_activity_id
+            WHERE da.user_id IN ({user_ids})
+              AND ca.start_date >= MAKEDATE(YEAR(CURDATE()), 1) + INTERVAL (%s - 1) MONTH
+              AND ca.start_date < MAKEDATE(YEAR(CURDATE()), 1) + INTERVAL %s MONTH
+            GROUP BY da.user_id, u.full_name, DATE_FORMAT(ca.start_date, '%Y-%m')
+            ORDER BY u.full_name, month ASC;
+        """,
+        "params": ["month_from", "month_to"],
+    }
+}
+
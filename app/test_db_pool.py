@@ -0,0 +1,135 @@
+import sys
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+try:
+    import mysql.connector  # noqa: F401
+except ImportError:
+    # The pool logic is tested without a server; a stand-in driver module is enough
+    mysql = types.ModuleType("mysql")
+    connector = types.ModuleType("mysql.connector")
+    errors = types.ModuleType("mysql.connector.errors")
+
+    class Error(Exception):
+        pass
+
+    for name in ("PoolError", "OperationalError", "InterfaceError"):
+        setattr(errors, name, type(name, (Error,), {}))
+    connector.Error, connector.errors, connector.connect = Error, errors, None
+    mysql.connector = connector
+    sys.modules.update({"mysql": mysql, "mysql.connector": connector, "mysql.connector.errors": errors})
+
+import db_pool
+from db_pool import ConnectionPool
+
+errors = db_pool.errors
+
+
+class FakeConnection:
+    def __init__(self, ping_error=None):
+        self.ping_error = ping_error
+        self.pings = 0
+        self.closed = False
+
+    def ping(self, **kwargs):
+        self.pings += 1
+        if self.ping_error is not None:
+            raise self.ping_error
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+        patcher = mock.patch.object(db_pool.mysql.connector, "connect", side_effect=self.connect)
+        self.connect_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, **config):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_opens_lazily_and_reuses_released_connections(self):
+        pool = ConnectionPool({"host": "db"}, size=2)
+        self.assertEqual(self.opened, [])
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(second, first)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(self.connect_mock.call_args.kwargs, {"host": "db", "autocommit": True})
+
+    def test_never_opens_more_than_size(self):
+        pool = ConnectionPool({}, size=2, wait_timeout=0.05)
+        held = [pool.acquire(), pool.acquire()]
+        with self.assertRaises(errors.PoolError):
+            pool.acquire()
+        self.assertEqual(len(self.opened), 2)
+        stats = pool.stats()
+        self.assertEqual((stats["timeouts"], stats["in_use"]), (1, 2))
+        for conn in held:
+            pool.release(conn)
+
+    def test_waiting_session_gets_the_released_connection(self):
+        pool = ConnectionPool({}, size=1, wait_timeout=5)
+        conn = pool.acquire()
+        threading.Timer(0.05, pool.release, (conn,)).start()
+        self.assertIs(pool.acquire(), conn)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_broken_connection_is_discarded(self):
+        pool = ConnectionPool({}, size=1)
+        with self.assertRaises(errors.OperationalError):
+            with pool.connection():
+                raise errors.OperationalError("gone away")
+        self.assertTrue(self.opened[0].closed)
+        with pool.connection() as conn:
+            self.assertIs(conn, self.opened[1])
+        self.assertEqual(pool.stats()["discarded"], 1)
+
+    def test_other_errors_return_the_connection(self):
+        pool = ConnectionPool({}, size=1)
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                raise ValueError("bad report")
+        with pool.connection() as conn:
+            self.assertIs(conn, self.opened[0])
+        self.assertFalse(self.opened[0].closed)
+
+    def test_idle_connections_are_pinged_before_reuse(self):
+        pool = ConnectionPool({}, size=1, health_check_seconds=0.01)
+        with pool.connection():
+            pass
+        time.sleep(0.02)
+        with pool.connection():
+            pass
+        self.assertEqual(self.opened[0].pings, 1)
+        self.assertEqual(pool.stats()["health_checks"], 1)
+
+    def test_failed_ping_discards_and_raises(self):
+        pool = ConnectionPool({}, size=1, health_check_seconds=0.0)
+        conn = pool.acquire()
+        conn.ping_error = db_pool.mysql.connector.Error("no server")
+        pool.release(conn)
+        time.sleep(0.01)
+        with self.assertRaises(db_pool.mysql.connector.Error):
+            pool.acquire()
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.opened, 0)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool({}, size=1)
+        self.connect_mock.side_effect = [errors.InterfaceError("refused"), FakeConnection()]
+        with self.assertRaises(errors.InterfaceError):
+            pool.acquire()
+        self.assertIsInstance(pool.acquire(), FakeConnection)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+
+import report_cache
+from report_cache import ReportCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ReportCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(report_cache.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.version = (1, "2025-03-01", 10)
+        self.loads = 0
+
+    def load_version(self):
+        return self.version
+
+    def load(self):
+        self.loads += 1
+        return [{"full_name": "Ani", "total_hours": self.loads}]
+
+    def test_hit_until_ttl_expires(self):
+        cache = ReportCache(ttl_seconds=60, check_seconds=1000)
+        first = cache.get(("sql1", (7,)), self.load, self.load_version)
+        self.assertEqual(cache.get(("sql1", (7,)), self.load, self.load_version), first)
+        self.clock.now += 61
+        self.assertNotEqual(cache.get(("sql1", (7,)), self.load, self.load_version), first)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_hits_are_copies(self):
+        cache = ReportCache()
+        cache.get("k", self.load, self.load_version)[0]["total_hours"] = "edited"
+        self.assertEqual(cache.get("k", self.load, self.load_version)[0]["total_hours"], 1)
+
+    def test_watermark_change_drops_everything(self):
+        cache = ReportCache(check_seconds=2)
+        cache.get("k", self.load, self.load_version)
+        self.version = (1, "2025-03-02", 11)
+        # Not re-read within check_seconds
+        self.assertEqual(cache.get("k", self.load, self.load_version)[0]["total_hours"], 1)
+        self.clock.now += 2
+        self.assertEqual(cache.get("k", self.load, self.load_version)[0]["total_hours"], 2)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = ReportCache(max_entries=2)
+        for key in ("a", "b"):
+            cache.get(key, self.load, self.load_version)
+        cache.get("a", self.load, self.load_version)
+        cache.get("c", self.load, self.load_version)
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_errors_are_not_cached(self):
+        cache = ReportCache()
+        self.assertEqual(cache.get("k", lambda: "Database error: gone", self.load_version), "Database error: gone")
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_result_of_a_run_overtaken_by_a_migration_is_not_stored(self):
+        cache = ReportCache(check_seconds=0)
+
+        def load_during_migration():
+            self.version = (2, "2025-03-02", 12)
+            cache.get("other", self.load, self.load_version)
+            return self.load()
+
+        cache.get("k", load_during_migration, self.load_version)
+        self.assertNotIn("k", cache.entries)
+
+    def test_unreadable_watermarks_serve_uncached(self):
+        cache = ReportCache()
+        cache.get("k", self.load, self.load_version)
+
+        def broken():
+            raise OSError("no server")
+
+        cache.checked_at = None
+        self.assertEqual(cache.get("k", self.load, broken)[0]["total_hours"], 2)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import re
+import unittest
+
+from report_sql import DBCON_SQL_MAPPING, GROK_SQL_MAPPING, NONLP_SQL_MAPPING, expand_user_ids, template_params
+
+MAPPINGS = {"grok": GROK_SQL_MAPPING, "noNLP": NONLP_SQL_MAPPING, "dbcon": DBCON_SQL_MAPPING}
+KINDS = {"month", "month_from", "month_to"}
+
+
+class ReportSqlTest(unittest.TestCase):
+    def test_declared_params_match_the_placeholders(self):
+        for prefix, mapping in MAPPINGS.items():
+            for sql_id, spec in mapping.items():
+                with self.subTest(template=f"{prefix}:{sql_id}"):
+                    self.assertLessEqual(set(spec["params"]), KINDS)
+                    sql = expand_user_ids(spec["query"], 3)
+                    users = 3 if "{user_ids}" in spec["query"] else 0
+                    self.assertEqual(sql.count("%s"), users + len(spec["params"]))
+
+    def test_templates_for_several_users_report_per_user(self):
+        for prefix, mapping in MAPPINGS.items():
+            for sql_id, spec in mapping.items():
+                if "{user_ids}" not in spec["query"]:
+                    continue
+                with self.subTest(template=f"{prefix}:{sql_id}"):
+                    group_by = re.search(r"GROUP BY ([^;]*)", spec["query"]).group(1)
+                    self.assertIn("user_id", group_by)
+                    self.assertIn("full_name", spec["query"])
+
+    def test_template_params_follow_the_declared_order(self):
+        spec = GROK_SQL_MAPPING["sql4"]
+        self.assertEqual(template_params(spec, {"month_to": 9, "month_from": 2, "month": 5}), (2, 9))
+        self.assertEqual(template_params(GROK_SQL_MAPPING["sql1"], {}), ())
+
+    def test_expand_user_ids(self):
+        self.assertEqual(expand_user_ids("IN ({user_ids})", 2), "IN (%s, %s)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+
+from user_index import DeletionIndex, PrefixTrie, UserIndex, UserSnapshot, fuzzy_limit, within_distance
+
+USERS = [
+    (1, "Juan Rico"),
+    (2, "Juan Ricardo"),
+    (3, "Budi Santoso"),
+    (4, "Siti Rahayu"),
+    (5, "Rahayu Putri"),
+    (6, "Ani"),
+]
+
+
+class PrefixTrieTest(unittest.TestCase):
+    def test_prefix_collects_every_token_below(self):
+        trie = PrefixTrie()
+        for token, user_id in (("rico", 1), ("ricardo", 2), ("rahayu", 4)):
+            trie.insert(token, user_id)
+        self.assertEqual(trie.prefix("ric"), {1, 2})
+        self.assertEqual(trie.prefix("r"), {1, 2, 4})
+        self.assertEqual(trie.prefix("rico"), {1})
+        self.assertEqual(trie.prefix("ricos"), set())
+
+
+class DeletionIndexTest(unittest.TestCase):
+    def test_matches_a_full_scan(self):
+        vocabulary = ["santoso", "santosa", "susanto", "rahayu", "rahayuningsih", "ricardo", "rico", "ani", "putri"]
+        index = DeletionIndex()
+        for token in vocabulary:
+            index.insert(token)
+        for query in ("santso", "santosso", "rahayoe", "ricardo", "rikardo", "puti", "xyz", "rahayuningsi"):
+            limit = fuzzy_limit(query)
+            expected = {token for token in vocabulary if within_distance(query, token, limit)}
+            self.assertEqual(index.search(query, limit), expected, query)
+
+    def test_limit_is_capped_at_the_indexed_depth(self):
+        index = DeletionIndex(max_edits=1)
+        index.insert("santoso")
+        self.assertEqual(index.search("sntso", 3), set())
+
+
+class UserSnapshotResolveTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = UserSnapshot(USERS)
+
+    def test_exact_full_name_wins_over_prefixes(self):
+        self.assertEqual(self.snapshot.resolve("Juan Rico"), [1])
+        self.assertEqual(self.snapshot.resolve("juanrico"), [1])
+
+    def test_every_token_must_match_a_prefix(self):
+        self.assertEqual(self.snapshot.resolve("juan"), [1, 2])
+        self.assertEqual(self.snapshot.resolve("juan ricar"), [2])
+        self.assertEqual(self.snapshot.resolve("rahayu"), [4, 5])
+
+    def test_typos_fall_back_to_fuzzy_tokens(self):
+        self.assertEqual(self.snapshot.resolve("budi santosso"), [3])
+        self.assertEqual(self.snapshot.resolve("rahayo"), [4, 5])
+
+    def test_short_tokens_are_never_fuzzy(self):
+        self.assertEqual(self.snapshot.resolve("ano"), [])
+
+    def test_substring_is_the_last_resort(self):
+        self.assertEqual(self.snapshot.resolve("uan ri"), [1, 2])
+
+    def test_no_tokens_match_nothing(self):
+        self.assertEqual(self.snapshot.resolve("  !! "), [])
+
+
+class UserIndexTest(unittest.TestCase):
+    def test_reloads_only_when_the_watermark_moves(self):
+        index = UserIndex(check_seconds=0)
+        state = {"version": [("ss_user", None, 6)], "users": list(USERS), "loads": 0}
+
+        def load_users():
+            state["loads"] += 1
+            return state["users"]
+
+        self.assertEqual(index.resolve("ani", lambda: state["version"], load_users), [6])
+        state["users"] = USERS + [(7, "Anita")]
+        self.assertEqual(index.resolve("ani", lambda: state["version"], load_users), [6])
+        state["version"] = [("ss_user", None, 7)]
+        self.assertEqual(index.resolve("anit", lambda: state["version"], load_users), [7])
+        self.assertEqual(state["loads"], 2)
+        self.assertEqual(index.names([7, 6]), ["Anita", "Ani"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+
+# ================================
+# ✅ USERNAME INDEX
+# ================================
+
+# Both jobs write to users (ss_user import and placeholder users from project members)
+USER_WATERMARK_SQL = """
+    SELECT job_name, last_updated_at, last_id
+    FROM migration_state
+    WHERE job_name IN ('ss_user', 'ss_project_management_members')
+    ORDER BY job_name
+"""
+USERS_SQL = "SELECT user_id, full_name FROM users"
+
+TOKEN = re.compile(r"[a-z0-9]+")
+# Most edits fuzzy_limit ever tolerates; the deletion index is built that deep
+MAX_EDITS = 2
+
+
+def tokenize(text: str) -> list:
+    return TOKEN.findall((text or "").lower())
+
+
+def fuzzy_limit(token: str) -> int:
+    # Edits tolerated per token: none for short tokens, where a typo is as likely another name
+    if len(token) >= 8:
+        return MAX_EDITS
+    return 1 if len(token) >= 4 else 0
+
+
+def within_distance(a: str, b: str, limit: int) -> bool:
+    """Levenshtein distance(a, b) <= limit, stopping as soon as a row exceeds it."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def deletions(token: str, depth: int) -> set:
+    """``token`` and every string left after deleting up to ``depth`` of its characters."""
+    found = frontier = {token}
+    for _ in range(depth):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        found = found | frontier
+    return found
+
+
+class DeletionIndex:
+    """Deletion-neighbourhood index over name tokens for typo lookups.
+
+    Two tokens within k edits share a string reachable from each by at most k
+    deletions, so a lookup only verifies the tokens filed under the query's
+    own deletions instead of scanning the whole vocabulary.
+    """
+
+    def __init__(self, max_edits: int = MAX_EDITS):
+        self.max_edits = max_edits
+        self.variants = {}
+
+    def insert(self, token: str):
+        for variant in deletions(token, self.max_edits):
+            self.variants.setdefault(variant, set()).add(token)
+
+    def search(self, token: str, limit: int) -> set:
+        limit = min(limit, self.max_edits)
+        candidates = set()
+        for variant in deletions(token, limit):
+            candidates |= self.variants.get(variant, set())
+        return {candidate for candidate in candidates if within_distance(token, candidate, limit)}
+
+
+class PrefixTrie:
+    """Token trie; every node keeps the user_ids of all tokens below it, so a prefix is one walk."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, token: str, user_id: int):
+        node = self.root
+        for char in token:
+            node = node.setdefault(char, {})
+            node.setdefault("", set()).add(user_id)
+
+    def prefix(self, token: str) -> set:
+        node = self.root
+        for char in token:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node.get("", set())
+
+
+class UserSnapshot:
+    """Immutable lookup structures built from one read of ``users``."""
+
+    def __init__(self, rows):
+        self.names = {}
+        self.by_full_name = {}
+        self.by_token = {}
+        self.trie = PrefixTrie()
+        self.tokens = DeletionIndex()
+        for user_id, full_name in rows:
+            tokens = tokenize(full_name)
+            self.names[user_id] = full_name
+            # Also keyed without spaces, so "juanrico" finds "Juan Rico"
+            for key in (" ".join(tokens), "".join(tokens)):
+                self.by_full_name.setdefault(key, set()).add(user_id)
+            for token in tokens:
+                if token not in self.by_token:
+                    self.tokens.insert(token)
+                self.by_token.setdefault(token, set()).add(user_id)
+                self.trie.insert(token, user_id)
+
+    def fuzzy(self, token: str) -> set:
+        limit = fuzzy_limit(token)
+        if not limit:
+            return set()
+        matches = set()
+        for candidate in self.tokens.search(token, limit):
+            matches |= self.by_token[candidate]
+        return matches
+
+    def resolve(self, name: str) -> list:
+        """user_ids for ``name``, from the most to the least precise tier that matches anything.
+
+        Tiers: exact full name, every query token is a prefix of a name token,
+        every query token is within a small edit distance of a name token, and
+        finally the old substring match on the full name.
+        """
+        tokens = tokenize(name)
+        if not tokens:
+            return []
+        exact = self.by_full_name.get(" ".join(tokens)) or self.by_full_name.get("".join(tokens))
+        if exact:
+            return sorted(exact)
+        for lookup in (self.trie.prefix, self.fuzzy):
+            matches = None
+            for token in tokens:
+                found = lookup(token)
+                matches = found if matches is None else matches & found
+                if not matches:
+                    break
+            if matches:
+                return sorted(matches)
+        needle = " ".join(tokens)
+        return sorted(user_id for user_id, full_name in self.names.items() if needle in (full_name or "").lower())
+
+
+class UserIndex:
+    """Process-wide username index, reloaded when a users migration watermark moves.
+
+    The watermarks are re-read at most every ``check_seconds``; ``users`` itself
+    is only read again when they changed (or after ``max_age_seconds``, for
+    users edited outside the migration).
+    """
+
+    def __init__(self, check_seconds: float = 5.0, max_age_seconds: float = 3600.0):
+        self.check_seconds = check_seconds
+        self.max_age_seconds = max_age_seconds
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.version = None
+        self.checked_at = None
+        self.loaded_at = None
+        self.metrics = {"loads": 0, "lookups": 0, "users": 0}
+
+    def _sync(self, load_version, load_users):
+        now = time.monotonic()
+        with self.lock:
+            if self.checked_at is not None and now - self.checked_at < self.check_seconds:
+                return
+        version = load_version()
+        with self.lock:
+            fresh = (
+                self.snapshot is not None and version == self.version
+                and now - self.loaded_at < self.max_age_seconds
+            )
+        if not fresh:
+            snapshot = UserSnapshot(load_users())
+            with self.lock:
+                self.snapshot, self.version, self.loaded_at = snapshot, version, now
+                self.metrics["loads"] += 1
+                self.metrics["users"] = len(snapshot.names)
+        # Only marked checked once the index is usable, so a failed load is retried next call
+        with self.lock:
+            self.checked_at = now
+
+    def resolve(self, name: str, load_version, load_users) -> list:
+        self._sync(load_version, load_users)
+        with self.lock:
+            self.metrics["lookups"] += 1
+            snapshot = self.snapshot
+        return snapshot.resolve(name)
+
+    def names(self, user_ids) -> list:
+        snapshot = self.snapshot
+        return [snapshot.names.get(user_id) for user_id in user_ids] if snapshot else []
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.metrics)
@@ -1,23 +1,36 @@
+import threading
 import mysql.connector
+from app.db_pool import ConnectionPool
 
-def get_database_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",  # Assuming 'root' user without password
-        database="clocking_reports"
-    )
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",  # Assuming 'root' user without password
+    "database": "clocking_reports"
+}
+# Same pool (and metrics) the Streamlit apps use; one per process
+DB_POOL = {"size": 5, "wait_timeout": 10.0, "health_check_seconds": 30.0}
 
-def execute_sql_query(sql_query):
-    db_connection = get_database_connection()
-    cursor = db_connection.cursor()
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    # Double-checked so two threads asking at once never build two pools
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **DB_POOL)
+    return _pool
 
+def execute_sql_query(sql_query):
     try:
-        cursor.execute(sql_query)
-        result = cursor.fetchall()
-        return result
+        with get_pool().connection() as db_connection:
+            cursor = db_connection.cursor()
+            try:
+                cursor.execute(sql_query)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return None
-    finally:
-        cursor.close()
-        db_connection.close()
\ No newline at end of file
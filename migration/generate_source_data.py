@@ -0,0 +1,277 @@
+import mysql.connector
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from migration_common import BatchWriter, Throughput
+
+# Preset ukuran dataset: jumlah baris ss_daily_activity; tabel lain diskalakan dari sini
+SCALES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+SOURCE_TABLES = {
+    "ss_user": """
+        CREATE TABLE IF NOT EXISTS ss_user (
+            id INT PRIMARY KEY,
+            id_key VARCHAR(64) NULL,
+            name VARCHAR(255) NULL,
+            email VARCHAR(255) NULL,
+            jabatan VARCHAR(32) NULL,
+            created_at DATETIME NULL,
+            updated_at DATETIME NULL,
+            KEY idx_id_key (id_key)
+        )
+    """,
+    "ss_category_clocking": """
+        CREATE TABLE IF NOT EXISTS ss_category_clocking (
+            cc_id INT PRIMARY KEY,
+            cc_definition VARCHAR(255) NULL,
+            cc_productive TINYINT NULL,
+            cc_billable TINYINT NULL,
+            cc_used TINYINT NULL,
+            cc_direct TINYINT NULL
+        )
+    """,
+    "ss_project_management": """
+        CREATE TABLE IF NOT EXISTS ss_project_management (
+            pr_project_code VARCHAR(64) PRIMARY KEY,
+            pr_project_name VARCHAR(255) NULL,
+            pr_customer_name VARCHAR(255) NULL,
+            pr_pic_project INT NULL,
+            pr_created_by VARCHAR(64) NULL,
+            pr_created_date DATETIME NULL,
+            pr_last_update DATETIME NULL,
+            pr_status VARCHAR(4) NULL,
+            pr_members LONGTEXT NULL
+        )
+    """,
+    "ss_daily_activity": """
+        CREATE TABLE IF NOT EXISTS ss_daily_activity (
+            da_id BIGINT PRIMARY KEY,
+            da_clocking LONGTEXT NULL,
+            da_activity VARCHAR(64) NULL,
+            da_duration INT NULL,
+            da_date DATE NULL,
+            da_start_tm DATETIME NULL,
+            da_end_tm DATETIME NULL,
+            da_project_code VARCHAR(64) NULL,
+            da_priority VARCHAR(4) NULL,
+            da_created_by VARCHAR(64) NULL,
+            da_created_date DATETIME NULL,
+            da_updated_date DATETIME NULL,
+            da_keterangan TEXT NULL,
+            da_data LONGTEXT NULL,
+            KEY idx_updated_id (da_updated_date, da_id),
+            KEY idx_never_updated (da_updated_date, da_created_date, da_id),
+            KEY idx_created (da_created_date)
+        )
+    """,
+}
+
+ACTIVITIES = ["Remote", "WFH", "Onsite", "WFO", "Meeting", "Development", "Support", None]
+JABATAN = ["1", "2", "3", "4", "5", None, "staff"]
+EPOCH = datetime(2023, 1, 1, 7, 0, 0)
+
+
+def connect_db(host, user, password, db):
+    return mysql.connector.connect(
+        host=host,
+        user=user,
+        password=password,
+        database=db
+    )
+
+
+def random_moment(rng, days=730):
+    return EPOCH + timedelta(days=rng.randrange(days), minutes=rng.randrange(0, 10 * 60))
+
+
+def user_rows(rng, count):
+    for user_id in range(1, count + 1):
+        created = random_moment(rng)
+        # ~3% user tanpa id_key, supaya lookup id_key -> id ikut teruji
+        id_key = None if rng.random() < 0.03 else f"U{user_id:07d}"
+        yield (
+            user_id,
+            id_key,
+            f"User {user_id}",
+            f"user{user_id}@example.com",
+            rng.choice(JABATAN),
+            created,
+            created + timedelta(days=rng.randrange(60)) if rng.random() < 0.5 else None,
+        )
+
+
+def category_rows(rng, count):
+    for cc_id in range(1, count + 1):
+        yield (
+            cc_id,
+            f"Category {cc_id}",
+            rng.choice([0, 1, None]),
+            rng.choice([0, 1, None]),
+            rng.choice([0, 1]),
+            rng.choice([0, 1, None]),
+        )
+
+
+def project_rows(rng, count, users):
+    for number in range(1, count + 1):
+        created = random_moment(rng)
+        members = {}
+        for _ in range(rng.randint(0, 12)):
+            user_id = rng.randint(1, users)
+            # Sebagian member memakai email di luar ss_user agar get_or_create_user membuat user baru
+            email = f"user{user_id}@example.com" if rng.random() < 0.9 else f"guest{rng.randrange(10 ** 6)}@example.org"
+            members[f"U{user_id:07d}"] = {"email": email, "nickname": f"user{user_id}", "jabatan": rng.choice(JABATAN)}
+        members_json = rng.choice([json.dumps(members)] * 8 + ["", None, "[]"])
+        yield (
+            f"PRJ-{number:06d}",
+            f"Project {number}",
+            f"Customer {number % 97}",
+            rng.randint(1, users),
+            f"U{rng.randint(1, users):07d}",
+            created,
+            created + timedelta(days=rng.randrange(90)),
+            rng.choice("pfic"),
+            members_json,
+        )
+
+
+def clocking_entries(rng, day, categories):
+    entries = []
+    start = day.replace(hour=8, minute=0)
+    for _ in range(rng.randint(1, 4)):
+        minutes = rng.choice([15, 30, 45, 60, 90, 120])
+        end = start + timedelta(minutes=minutes)
+        entry = {
+            "activity": rng.choice(ACTIVITIES),
+            "start_date": start.date().isoformat(),
+            "start_time": start.strftime("%H:%M"),
+            "end_date": end.date().isoformat(),
+            "end_time": end.strftime("%H:%M"),
+            "detail": {"note": "synthetic", "tags": ["bench", str(minutes)]},
+        }
+        # Field yang kadang hilang: duration dihitung ulang, task_id dari label activity
+        if rng.random() < 0.7:
+            entry["duration"] = minutes
+        if rng.random() < 0.5:
+            entry["task_id"] = rng.choice([0, 1, 7])
+        roll = rng.random()
+        if roll < 0.8:
+            entry["category_id"] = rng.randint(1, categories)
+        elif roll < 0.9:
+            entry["category_id"] = categories + rng.randint(1, 50)  # category tidak valid
+        entries.append(entry)
+        start = end
+    return entries
+
+
+def activity_rows(rng, count, users, projects, categories):
+    for da_id in range(1, count + 1):
+        day = random_moment(rng)
+        created = day + timedelta(hours=9)
+        roll = rng.random()
+        if roll < 0.6:
+            da_clocking = json.dumps(clocking_entries(rng, day, categories))
+        elif roll < 0.7:
+            da_clocking = "null"
+        elif roll < 0.8:
+            da_clocking = ""
+        elif roll < 0.9:
+            da_clocking = None
+        else:
+            da_clocking = "[]"
+        user_id = rng.randint(1, users)
+        # ~5% tanpa id_key di da_data, ~2% id_key yang tidak ada di ss_user
+        data = {"source": "synthetic", "meta": {"device": rng.choice(["web", "android", "ios"])}}
+        roll = rng.random()
+        if roll < 0.93:
+            data["id_key"] = f"U{user_id:07d}"
+        elif roll < 0.95:
+            data["id_key"] = f"X{rng.randrange(10 ** 6):07d}"
+        start = day.replace(hour=8, minute=0)
+        end = start + timedelta(minutes=rng.randrange(30, 600))
+        yield (
+            da_id,
+            da_clocking,
+            rng.choice(ACTIVITIES),
+            rng.choice([None, rng.randrange(15, 600)]),
+            day.date(),
+            start if rng.random() < 0.9 else None,
+            end if rng.random() < 0.9 else None,
+            f"PRJ-{rng.randint(1, projects):06d}",
+            rng.choice(["H", "M", "L", None]),
+            f"U{user_id:07d}",
+            created,
+            created + timedelta(hours=rng.randrange(1, 72)) if rng.random() < 0.3 else None,
+            rng.choice([None, "", "Catatan harian"]),
+            json.dumps(data),
+        )
+
+
+def insert_query(table, width):
+    return f"INSERT INTO {table} VALUES ({', '.join(['%s'] * width)})"
+
+
+def generate(database: str, scale: str = "10k", rows: int = None, seed: int = 42,
+             reset: bool = False, batch_size: int = 5000):
+    config = {
+        "host": "localhost",
+        "user": "root",
+        "password": ""  # Adjust with your credentials if needed
+    }
+    activities = rows or SCALES[scale]
+    users = max(50, activities // 200)
+    projects = max(10, activities // 1000)
+    categories = 40
+
+    rng = random.Random(seed)
+    db = connect_db(**config, db=database)
+    cursor = db.cursor()
+
+    for table, ddl in SOURCE_TABLES.items():
+        if reset:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(ddl)
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        if cursor.fetchone()[0]:
+            raise SystemExit(f"❌ {database}.{table} is not empty; rerun with --reset to regenerate it.")
+
+    plan = [
+        ("ss_user", user_rows(rng, users), 7),
+        ("ss_category_clocking", category_rows(rng, categories), 6),
+        ("ss_project_management", project_rows(rng, projects, users), 9),
+        ("ss_daily_activity", activity_rows(rng, activities, users, projects, categories), 14),
+    ]
+    for table, generator, width in plan:
+        timer = Throughput()
+        writer = BatchWriter(cursor, insert_query(table, width), batch_size)
+        for row in generator:
+            writer.add(row)
+            if not writer.buffer:
+                db.commit()
+        writer.flush()
+        db.commit()
+        timer.report(f"{database}.{table}", writer.rows_written)
+
+    cursor.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic system-smartpro source dataset for benchmarks")
+    # No default: --reset drops the ss_* tables, so the database is always named explicitly
+    parser.add_argument("--database", type=str, required=True,
+                        help="Local source database to fill (a scratch/dev copy; --reset drops its ss_* tables)")
+    parser.add_argument("--scale", choices=list(SCALES), default="10k", help="ss_daily_activity rows (10k/1m/10m)")
+    parser.add_argument("--rows", type=int, default=None, help="Exact ss_daily_activity rows (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same seed gives the same dataset")
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate the ss_* tables first")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    generate(database=args.database, scale=args.scale, rows=args.rows, seed=args.seed,
+             reset=args.reset, batch_size=args.batch_size)
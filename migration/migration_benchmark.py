@@ -0,0 +1,193 @@
+import mysql.connector
+import argparse
+import json
+import multiprocessing
+import queue
+import time
+from migration_common import peak_rss_mb
+from migration_orchestrator import JOBS, run_job
+from migration_rollup import ROLLUPS
+from migration_snapshot import LIVE_DB, check_replay_target, load_manifest, prepare_replay_target
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": ""  # Adjust with your credentials if needed
+}
+
+# Source table read by each job; its row count is the job's "rows" for rows/sec
+SOURCE_TABLE = {
+    "users": "ss_user",
+    "categories": "ss_category_clocking",
+    "projects": "ss_project_management",
+    "project_users": "ss_project_management",
+    "daily_activities": "ss_daily_activity",
+    "clocking_activities": "ss_daily_activity",
+}
+
+# Child tables first so TRUNCATE never trips over a FK
+TARGET_TABLES = ["clocking_activities", "daily_activities", "project_users", "projects", "category_clocking", "users"]
+# Jobs write here unless --target says otherwise; never the live clocking_reports
+BENCHMARK_DB = "clocking_reports_benchmark"
+
+
+def connect_db(host, user, password, db):
+    return mysql.connector.connect(
+        host=host,
+        user=user,
+        password=password,
+        database=db
+    )
+
+
+def server_questions(cursor):
+    """Statements received by the server so far (all sessions); the delta is the job's round trips."""
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    return int(cursor.fetchone()[1])
+
+
+def prepare_target(target, tables=TARGET_TABLES, reset=False):
+    """Create the scratch schema (tables copied from clocking_reports, no rows); ``reset`` empties it."""
+    check_replay_target(target)
+    db = connect_db(**DB_CONFIG, db=LIVE_DB)
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{target}`")
+        for table in tables:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS `{target}`.`{table}` LIKE `{LIVE_DB}`.`{table}`")
+        if reset:
+            cursor.execute("SET SESSION foreign_key_checks = 0")
+            for table in tables:
+                cursor.execute(f"TRUNCATE TABLE `{target}`.`{table}`")
+            for table in ["migration_state", *ROLLUPS]:
+                cursor.execute(f"DROP TABLE IF EXISTS `{target}`.`{table}`")
+            cursor.execute("SET SESSION foreign_key_checks = 1")
+        db.commit()
+    finally:
+        cursor.close()
+        db.close()
+    if reset:
+        print(f"🧪 Benchmark target {target} reset.")
+
+
+def _run_child(name, options, results):
+    # Fresh process per job so peak RSS belongs to this job alone
+    try:
+        run_job(name, options)
+        results.put((peak_rss_mb(), None))
+    except Exception as exc:
+        results.put((peak_rss_mb(), repr(exc)))
+
+
+def benchmark_job(name, options, monitor_cursor):
+    if options.get("snapshot"):
+        # Replayed jobs read the snapshot; its manifest has the row count
+        rows = load_manifest(options["snapshot"])["tables"][SOURCE_TABLE[name]]["rows"]
+    else:
+        monitor_cursor.execute(f"SELECT COUNT(*) FROM {SOURCE_TABLE[name]}")
+        rows = monitor_cursor.fetchone()[0]
+    before = server_questions(monitor_cursor)
+
+    results = multiprocessing.Queue()
+    started = time.perf_counter()
+    process = multiprocessing.Process(target=_run_child, args=(name, options, results))
+    process.start()
+    process.join()
+    try:
+        peak, error = results.get(timeout=5)
+    except queue.Empty:
+        peak, error = None, f"process exited with code {process.exitcode}"
+    elapsed = time.perf_counter() - started
+
+    # Exclude the monitor's own SHOW STATUS statement from the delta
+    round_trips = server_questions(monitor_cursor) - before - 1
+    return {
+        "job": name,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+        "round_trips": round_trips,
+        "rows_per_round_trip": round(rows / round_trips, 2) if round_trips > 0 else None,
+        "error": error,
+    }
+
+
+def run_benchmark(options, only=None, repeat=1, reset=False):
+    """Run each selected job in FK order (sequentially, so round-trip deltas are not mixed).
+
+    Jobs write to the scratch database ``options["target"]``, never the live
+    clocking_reports. With ``reset`` it is emptied before every attempt;
+    otherwise later attempts run against the rows the earlier ones wrote.
+    """
+    check_replay_target(options["target"])
+    monitor_db = connect_db(**DB_CONFIG, db="system-smartpro")
+    monitor_cursor = monitor_db.cursor()
+    report = []
+    if not options.get("snapshot"):
+        prepare_target(options["target"])
+    for attempt in range(1, repeat + 1):
+        if reset:
+            if options.get("snapshot"):
+                # Replays go to a scratch copy: lookups from clocking_reports, activity tables empty
+                prepare_replay_target(options["target"])
+            else:
+                prepare_target(options["target"], reset=True)
+        for name in JOBS:
+            if only and name not in only:
+                continue
+            result = benchmark_job(name, options, monitor_cursor)
+            result["attempt"] = attempt
+            report.append(result)
+            status = "❌" if result["error"] else "✅"
+            print(
+                f"{status} [{attempt}] {name:<20} {result['rows']:>10} rows  {result['seconds']:>9.2f}s  "
+                f"{result['rows_per_sec'] or 0:>10.1f} rows/s  peak {result['peak_rss_mb'] or 0:>7.1f} MB  "
+                f"{result['round_trips']:>8} round trips"
+            )
+    monitor_cursor.close()
+    monitor_db.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark migration jobs against a local (synthetic) system-smartpro; see generate_source_data.py"
+    )
+    parser.add_argument("--mode", choices=["incremental", "full"], default="full")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--bulk", action="store_true")
+    parser.add_argument("--only", nargs="+", choices=list(JOBS), default=None, help="Benchmark a subset of jobs")
+    parser.add_argument("--repeat", type=int, default=1, help="Run the whole suite N times")
+    parser.add_argument("--reset", action="store_true", help="Empty the --target database before every attempt")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file")
+    parser.add_argument("--snapshot", type=str, default=None,
+                        help="Replay the activity jobs from a migration_snapshot.py directory (implies --only for them)")
+    parser.add_argument("--target", type=str, default=BENCHMARK_DB, help="Scratch database the jobs write to")
+    args = parser.parse_args()
+    only = args.only
+    if args.target == LIVE_DB:
+        parser.error(f"--target must be a scratch database, not the live {LIVE_DB}")
+    if args.snapshot and not args.reset:
+        parser.error("--snapshot replays in full mode into an emptied target: add --reset")
+    if args.snapshot:
+        # Only the activity jobs can replay a snapshot; the others would read the source again
+        only = [name for name in (only or JOBS) if "snapshot" in JOBS[name][2]]
+
+    options = {
+        "mode": args.mode,
+        "since": None,
+        "limit": None,
+        "dry_run": False,
+        "batch_size": args.batch_size,
+        "chunk_size": args.chunk_size,
+        "bulk": args.bulk,
+        "snapshot": args.snapshot,
+        "target": args.target,
+    }
+    report = run_benchmark(options, only=only, repeat=args.repeat, reset=args.reset)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"options": options, "results": report}, handle, indent=2)
+        print(f"📝 Report written to {args.output}")
@@ -1,6 +1,7 @@
 import mysql.connector
 from datetime import datetime
 import argparse
+from migration_common import RunMetrics, UpsertWriter, WriteTransaction, stream_rows, report_peak_rss
 
 def connect_db(host, user, password, db):
     return mysql.connector.connect(
@@ -56,23 +57,21 @@ def update_watermark(target_cursor, target_db, job_name, last_updated_at, last_i
         pass
 
 
-def category_exists(cursor, category_id):
-    try:
-        cursor.execute("SELECT 1 FROM category_clocking WHERE category_id = %s LIMIT 1", (category_id,))
-        return cursor.fetchone() is not None
-    except Exception:
-        return False
-
-
-def migrate_category_docking(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False):
+def migrate_category_docking(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False, chunk_size: int = 1000,
+                             batch_size: int = 1000, metrics_json: str = None, record_run: bool = False, ids: list = None,
+                             commit_rows: int = 10000, commit_seconds: float = 5.0, max_retries: int = 5, target: str = "clocking_reports"):
     config = {
         "host": "localhost",
         "user": "root",
         "password": ""  # Adjust with your credentials if needed
     }
 
-    source_db = connect_db(**config, db="system-smartpro")
-    target_db = connect_db(**config, db="clocking_reports")
+    metrics = RunMetrics("category_clocking", {
+        "mode": mode, "limit": limit, "dry_run": dry_run, "chunk_size": chunk_size, "batch_size": batch_size,
+        "commit_rows": commit_rows, "commit_seconds": commit_seconds, "max_retries": max_retries,
+    })
+    source_db = metrics.connection(connect_db(**config, db="system-smartpro"))
+    target_db = metrics.connection(connect_db(**config, db=target))
 
     source_cursor = source_db.cursor(dictionary=True)
     target_cursor = target_db.cursor()
@@ -88,6 +87,10 @@ def migrate_category_docking(mode: str = "incremental", since: str = None, limit
     if mode == "incremental" and wm_last_id is not None:
         where_clauses.append("cc_id > %s")
         params.append(wm_last_id)
+    # Restrict to explicit ids (used by migration_reconcile.py to re-sync drifted rows)
+    if ids:
+        where_clauses.append(f"cc_id IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
 
     if where_clauses:
         base_query += " WHERE " + " AND ".join(where_clauses)
@@ -95,8 +98,8 @@ def migrate_category_docking(mode: str = "incremental", since: str = None, limit
     if limit and isinstance(limit, int) and limit > 0:
         base_query += f" LIMIT {int(limit)}"
 
-    source_cursor.execute(base_query, tuple(params) if params else None)
-    rows = source_cursor.fetchall()
+    # Stream source rows in chunks so memory stays flat regardless of table size
+    rows = metrics.iterate("fetch", stream_rows(source_cursor, base_query, tuple(params) if params else None, chunk_size))
 
     upsert_query = """
         INSERT INTO category_clocking (
@@ -110,12 +113,15 @@ def migrate_category_docking(mode: str = "incremental", since: str = None, limit
             is_direct = VALUES(is_direct)
     """
 
-    inserted = 0
-    updated = 0
+    transaction = WriteTransaction(target_db, target_cursor, commit_rows, commit_seconds, max_retries, metrics=metrics)
+    writer = UpsertWriter(
+        target_cursor, upsert_query, batch_size, dry_run=dry_run,
+        metrics=metrics, stage="upsert", transaction=transaction,
+    )
+
     max_id = wm_last_id or 0
 
     for row in rows:
-        exists = category_exists(target_cursor, row["cc_id"])
         payload = (
             row["cc_id"],
             row["cc_definition"],
@@ -124,23 +130,28 @@ def migrate_category_docking(mode: str = "incremental", since: str = None, limit
             row["cc_used"] if row["cc_used"] is not None else 0,
             row["cc_direct"] if row["cc_direct"] is not None else 0,
         )
+        writer.add(payload)
         if not dry_run:
-            target_cursor.execute(upsert_query, payload)
-        if exists:
-            updated += 1
-        else:
-            inserted += 1
+            # Upserts are idempotent, so any flushed prefix is a safe commit point
+            transaction.maybe_commit()
         cid = row["cc_id"]
         if cid is not None and cid > max_id:
             max_id = cid
 
+    writer.flush()
     if not dry_run:
-        target_db.commit()
-    total = inserted + updated
-    print(f"✅ Categories processed: {total}. Inserted: {inserted}, Updated: {updated}.")
+        transaction.commit()
+    inserted, updated, unchanged = writer.inserted, writer.updated, writer.unchanged
+    total = inserted + updated + unchanged
+    print(f"✅ Categories processed: {total}. Inserted: {inserted}, Updated: {updated}, Unchanged: {unchanged}.")
 
     if mode == "incremental" and not dry_run:
-        update_watermark(target_cursor, target_db, "ss_category_clocking", None, max_id)
+        with metrics.stage("watermark"):
+            update_watermark(target_cursor, target_db, "ss_category_clocking", None, max_id)
+
+    report_peak_rss("category_clocking")
+    metrics.count(processed=total, inserted=inserted, updated=updated, unchanged=unchanged, deadlock_retries=transaction.retried)
+    metrics.emit(metrics_json, target_cursor if record_run and not dry_run else None, target_db)
 
     source_cursor.close()
     target_cursor.close()
@@ -153,5 +164,14 @@ if __name__ == "__main__":
     parser.add_argument("--since", type=str, default=None)  # diabaikan karena tidak ada timestamp di sumber
     parser.add_argument("--limit", type=int, default=None)
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched from the source per round trip")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per multi-row INSERT ... ON DUPLICATE KEY UPDATE")
+    parser.add_argument("--metrics-json", type=str, default=None, help="Append the JSON run report to this file ('-' for stdout)")
+    parser.add_argument("--record-run", action="store_true", help="Also append the run report to migration_runs")
+    parser.add_argument("--commit-rows", type=int, default=10000, help="Commit after this many written rows")
+    parser.add_argument("--commit-seconds", type=float, default=5.0, help="...or after this many seconds, whichever comes first")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries (with backoff) for a batch hit by a deadlock/lock-wait timeout")
     args = parser.parse_args()
-    migrate_category_docking(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run)
+    migrate_category_docking(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run, chunk_size=args.chunk_size,
+                             batch_size=args.batch_size, metrics_json=args.metrics_json, record_run=args.record_run,
+                             commit_rows=args.commit_rows, commit_seconds=args.commit_seconds, max_retries=args.max_retries)
@@ -2,15 +2,49 @@ import mysql.connector
 import json
 from datetime import datetime
 import argparse
-
-def connect_db(host, user, password, db):
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from migration_common import (
+    BatchWriter, RunMetrics, Throughput, TsvStager, WriteTransaction, bulk_load, drop_secondary_indexes, load_int_set, read_snapshot,
+    acquire_lock, rebuild_indexes, release_lock, report_peak_rss,
+)
+from migration_snapshot import LIVE_DB, check_replay_target, prepare_replay_target, snapshot_path
+from migration_rollup import BACKFILL_JOB_NAME, WRITER_LOCK, ensure_rollup_tables, fold_rollups, rebuild_rollups, rolled_up_to
+
+def connect_db(host, user, password, db, **options):
     return mysql.connector.connect(
         host=host,
         user=user,
         password=password,
-        database=db
+        database=db,
+        **options
     )
 
+DAILY_ACTIVITY_COLUMNS = (
+    "daily_activity_id", "project_code", "activity_date", "priority",
+    "start_time", "end_time", "created_by", "created_at",
+    "updated_at", "activity_type", "description",
+    "activity_duration_minutes", "user_id",
+)
+CLOCKING_ACTIVITY_COLUMNS = (
+    "daily_activity_id", "task_id", "activity_description", "duration_minutes",
+    "start_date", "start_time", "end_date", "end_time", "category_id",
+)
+DAILY_TABLE = "daily_activities"
+CLOCKING_TABLE = "clocking_activities"
+# Full rebuilds load into <table>__shadow and swap it in with one RENAME TABLE
+SHADOW_SUFFIX = "__shadow"
+OLD_SUFFIX = "__old"
+
+
+def insert_query(table, columns):
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+
 DEFAULT_CATEGORY_ID = 1  # Fallback category when da_clocking JSON is empty and category not found
 TASK_ID_MAP = {
     # Assumptive task mapping based on common activity labels
@@ -33,32 +67,35 @@ def map_priority(priority):
         return None
 
 # --- Helpers for Daily Activities migration ---
-def get_user_id_from_key(cursor, user_key):
-    """Lookup source ss_user.id by id_key."""
-    try:
-        cursor.execute("SELECT id FROM ss_user WHERE id_key = %s", (user_key,))
-        result = cursor.fetchone()
-        return result[0] if result else None
-    except Exception:
-        return None
+def load_user_id_map(cursor):
+    """Preload source ss_user id_key -> id in one read instead of one lookup per row."""
+    cursor.execute("SELECT id_key, id FROM ss_user WHERE id_key IS NOT NULL ORDER BY id ASC")
+    user_ids = {}
+    for id_key, user_id in cursor.fetchall():
+        user_ids.setdefault(str(id_key), user_id)
+    return user_ids
 
-def daily_activity_exists(target_cursor, da_id):
-    try:
-        target_cursor.execute("SELECT 1 FROM daily_activities WHERE daily_activity_id = %s LIMIT 1", (da_id,))
-        return target_cursor.fetchone() is not None
-    except Exception:
-        return False
+def load_existing_daily_ids(target_cursor, table=DAILY_TABLE):
+    """Preload every daily_activity_id already present in the target (compact IntSet, chunked)."""
+    return load_int_set(target_cursor, table, "daily_activity_id")
 
-def get_target_user_id_from_id_key(cursor, id_key):
-    try:
-        if not id_key:
-            return None
-        placeholder_email = f"{id_key}@placeholder.local"
-        cursor.execute("SELECT user_id FROM users WHERE email = %s", (placeholder_email,))
-        res = cursor.fetchone()
-        return res[0] if res else None
-    except Exception:
-        return None
+def load_valid_category_ids(target_cursor):
+    return load_int_set(target_cursor, "category_clocking", "category_id")
+
+def load_daily_ids_with_clockings(target_cursor, table=CLOCKING_TABLE):
+    return load_int_set(target_cursor, table, "daily_activity_id", distinct=True)
+
+def load_placeholder_user_ids(target_cursor):
+    """Preload id_key -> user_id for placeholder users (id_key@placeholder.local).
+
+    Keys are casefolded to match MySQL's case-insensitive email comparison.
+    """
+    suffix = "@placeholder.local"
+    target_cursor.execute("SELECT email, user_id FROM users WHERE email LIKE %s ORDER BY user_id ASC", (f"%{suffix}",))
+    user_ids = {}
+    for email, user_id in target_cursor.fetchall():
+        user_ids.setdefault(email[: -len(suffix)].casefold(), user_id)
+    return user_ids
 
 def compute_diff_minutes(start_date, start_time, end_date, end_time):
     try:
@@ -72,56 +109,86 @@ def compute_diff_minutes(start_date, start_time, end_date, end_time):
         return None
 
 
-def backfill_clocking_fields(target_cursor, target_db):
-    # 1) Isi duration_minutes dari start/end ketika tersedia
-    target_cursor.execute(
-        """
-        UPDATE clocking_activities
-        SET duration_minutes = TIMESTAMPDIFF(
-            MINUTE,
-            TIMESTAMP(start_date, start_time),
-            TIMESTAMP(end_date, end_time)
-        )
-        WHERE duration_minutes IS NULL
-          AND start_date IS NOT NULL AND start_time IS NOT NULL
-          AND end_date IS NOT NULL AND end_time IS NOT NULL
-        """
-    )
-
-    # 2) Set task_id via mapping umum, hanya untuk yang NULL/0
-    target_cursor.execute(
-        """
-        UPDATE clocking_activities
-        SET task_id = CASE
-            WHEN LOWER(activity_description) = 'remote' THEN 1
-            WHEN LOWER(activity_description) = 'wfh' THEN 1
-            WHEN LOWER(activity_description) = 'onsite' THEN 7
-            WHEN LOWER(activity_description) = 'wfo' THEN 7
-            ELSE NULL
-        END
-        WHERE (task_id IS NULL OR task_id = 0)
-        """
-    )
+def get_max_activity_id(target_cursor, table=CLOCKING_TABLE):
+    target_cursor.execute(f"SELECT COALESCE(MAX(activity_id), 0) FROM {table}")
+    return target_cursor.fetchone()[0]
+
+
+def backfill_query(table, bounded=True):
+    # Satu pass per window:
+    # - duration_minutes dari start/end bila tersedia, sisanya 0 sebagai default aman
+    # - task_id via mapping umum hanya untuk yang NULL/0 (0 tanpa mapping menjadi NULL)
+    upper = "AND activity_id <= %s" if bounded else ""
+    return f"""
+        UPDATE {table}
+        SET duration_minutes = COALESCE(
+                duration_minutes,
+                TIMESTAMPDIFF(MINUTE, TIMESTAMP(start_date, start_time), TIMESTAMP(end_date, end_time)),
+                0
+            ),
+            task_id = CASE
+                WHEN task_id IS NOT NULL AND task_id <> 0 THEN task_id
+                WHEN LOWER(activity_description) IN ('remote', 'wfh') THEN 1
+                WHEN LOWER(activity_description) IN ('onsite', 'wfo') THEN 7
+                ELSE NULL
+            END
+        WHERE activity_id > %s {upper}
+          AND (duration_minutes IS NULL OR task_id IS NULL OR task_id = 0)
+    """
 
-    # 3) Pastikan sisa task_id=0 menjadi NULL
-    target_cursor.execute(
-        """
-        UPDATE clocking_activities
-        SET task_id = NULL
-        WHERE task_id = 0
-        """
-    )
 
-    # 4) Untuk sisa duration NULL, set ke 0 sebagai default aman
+def backfill_check(target_cursor, id_from, id_to, table=CLOCKING_TABLE):
+    """Verification counts (task_id=0, task_id NULL, duration NULL) for activity_id in (id_from, id_to]."""
     target_cursor.execute(
-        """
-        UPDATE clocking_activities
-        SET duration_minutes = 0
-        WHERE duration_minutes IS NULL
-        """
+        f"""
+        SELECT
+            COALESCE(SUM(task_id = 0), 0),
+            COALESCE(SUM(task_id IS NULL), 0),
+            COALESCE(SUM(duration_minutes IS NULL), 0)
+        FROM {table}
+        WHERE activity_id > %s AND activity_id <= %s
+        """,
+        (id_from, id_to),
     )
-
-    target_db.commit()
+    task_zero, task_null, duration_null = target_cursor.fetchone()
+    return int(task_zero), int(task_null), int(duration_null)
+
+
+def backfill_clocking_fields(target_cursor, target_db, id_from=None, id_to=None, chunk_size=10000, table=CLOCKING_TABLE,
+                             max_retries=5, checkpoint=False, rollup_from=None):
+    """Backfill duration_minutes/task_id for activity_id in (id_from, id_to].
+
+    Without bounds the whole table is covered. The range is walked in windows
+    of ``chunk_size`` ids, each committed separately so row locks stay short;
+    a window hit by a deadlock is retried with backoff. With ``checkpoint``
+    each window also advances the backfill watermark in its own transaction
+    (only valid when ``id_from`` is at or below that watermark). With
+    ``rollup_from`` (the rollup watermark) each window's backfilled rows are
+    folded into the rollups in that same transaction. Returns the
+    verification counts for the same range.
+    """
+    transaction = WriteTransaction(target_db, target_cursor, retries=max_retries)
+    if id_from is None:
+        id_from = 0
+    if id_to is None:
+        id_to = get_max_activity_id(target_cursor, table)
+    step = max(1, int(chunk_size or (id_to - id_from) or 1))
+
+    lo = id_from
+    while lo < id_to:
+        hi = min(lo + step, id_to)
+        transaction.execute(backfill_query(table), (lo, hi))
+        if checkpoint:
+            transaction.execute(WATERMARK_UPSERT, (BACKFILL_JOB_NAME, None, hi), rows=0)
+        if rollup_from is not None and rollup_from < hi:
+            fold_rollups(transaction, rollup_from, hi)
+        transaction.commit()
+        if rollup_from is not None:
+            rollup_from = max(rollup_from, hi)
+        lo = hi
+
+    # Verifikasi pada rentang yang sama
+    return backfill_check(target_cursor, id_from, id_to, table)
 
 
 def ensure_migration_state_table(target_cursor):
@@ -156,426 +223,1449 @@ def get_watermark(target_cursor, job_name):
     return None, None
 
 
+WATERMARK_UPSERT = """
+    INSERT INTO migration_state (job_name, last_updated_at, last_id)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE last_updated_at = VALUES(last_updated_at), last_id = VALUES(last_id)
+"""
+
+
 def update_watermark(target_cursor, target_db, job_name, last_updated_at, last_id):
     try:
-        target_cursor.execute(
-            """
-            INSERT INTO migration_state (job_name, last_updated_at, last_id)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE last_updated_at = VALUES(last_updated_at), last_id = VALUES(last_id)
-            """,
-            (job_name, last_updated_at, last_id)
-        )
+        target_cursor.execute(WATERMARK_UPSERT, (job_name, last_updated_at, last_id))
         target_db.commit()
     except Exception:
         # Best-effort; do not break migration because watermark update fails
         pass
 
 
-def migrate_daily_activity(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False):
+def resolve_bulk(bulk, mode, dry_run):
+    if bulk and mode != "full":
+        print("⚠️ --bulk hanya untuk --mode full; memakai INSERT biasa.")
+        return False
+    return bulk and not dry_run
+
+
+# Each job keeps its own watermark; they used to share ss_daily_activity, which made the
+# clocking pass start from the point the daily pass had just reached in the same run
+CLOCKING_JOB_NAME = "ss_daily_activity"
+DAILY_JOB_NAME = "ss_daily_activity_daily"
+# Keyset sort key; rows never updated fall back to their creation time.
+# It is never filtered or sorted on directly (COALESCE cannot use an index): each page is the
+# UNION of one branch per real column tuple, each a range scan on its own composite index
+# (da_updated_date, da_id) / (da_updated_date, da_created_date, da_id).
+ACTIVITY_KEY = "COALESCE(da_updated_date, da_created_date)"
+
+
+def activity_key(row):
+    return row.get("da_updated_date") or row.get("da_created_date"), row.get("da_id")
+
+
+def activity_sort_key(row):
+    # Rows without any timestamp sort first, as NULLs do in MySQL
+    last_ts, last_id = activity_key(row)
+    return last_ts is not None, last_ts, last_id
+
+
+def keyset_branches(last_ts, last_id):
+    """(condition, params, order) per index range holding the rows after (last_ts, last_id) in key order."""
+    after_id = last_id if last_id is not None else -1
+    if last_ts is None:
+        return [
+            ("da_updated_date IS NULL AND da_created_date IS NULL AND da_id > %s", [after_id], "da_id"),
+            ("da_updated_date IS NULL AND da_created_date IS NOT NULL", [], "da_created_date, da_id"),
+            ("da_updated_date IS NOT NULL", [], "da_updated_date, da_id"),
+        ]
+    return [
+        (
+            "da_updated_date IS NULL AND (da_created_date > %s OR (da_created_date = %s AND da_id > %s))",
+            [last_ts, last_ts, after_id], "da_created_date, da_id",
+        ),
+        ("(da_updated_date > %s OR (da_updated_date = %s AND da_id > %s))", [last_ts, last_ts, after_id], "da_updated_date, da_id"),
+    ]
+
+
+def iter_activity_pages(cursor, base_query, where_clauses, params, after_key=(None, None), page_size=1000, limit=None, by_id=False):
+    """Keyset-paginate ss_daily_activity on (COALESCE(updated, created), da_id).
+
+    Each page is a short, independent query that starts strictly after the
+    last key of the previous page (or ``after_key`` when resuming from a
+    checkpoint), so committed pages are never rescanned and rows sharing a
+    timestamp are neither skipped nor repeated. Every keyset_branches range
+    returns at most one page in its index order; the page is the first
+    ``page_size`` rows of their merge. Full scans that do not checkpoint pass
+    ``by_id=True`` and walk the primary key instead.
+    """
+    page_size = max(1, int(page_size or 1))
+    remaining = int(limit) if limit and isinstance(limit, int) and limit > 0 else None
+    last_ts, last_id = after_key
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        if by_id:
+            clauses = list(where_clauses)
+            page_params = list(params)
+            if last_id is not None:
+                clauses.append("da_id > %s")
+                page_params.append(last_id)
+            query = base_query
+            if clauses:
+                query += " WHERE " + " AND ".join(clauses)
+            query += f" ORDER BY da_id ASC LIMIT {size}"
+        else:
+            branches = []
+            page_params = []
+            for condition, branch_params, order in keyset_branches(last_ts, last_id):
+                branches.append(
+                    f"({base_query} WHERE {' AND '.join(list(where_clauses) + [condition])} ORDER BY {order} LIMIT {size})"
+                )
+                page_params.extend(list(params) + branch_params)
+            query = " UNION ALL ".join(branches)
+        cursor.execute(query, tuple(page_params) if page_params else None)
+        page = cursor.fetchall()
+        if not by_id:
+            page = sorted(page, key=activity_sort_key)[:size]
+        if not page:
+            break
+        yield page
+        last_ts, last_id = activity_key(page[-1])
+        if remaining is not None:
+            remaining -= len(page)
+        if len(page) < size:
+            break
+
+
+def resolve_start_key(target_cursor, job_name, mode, since, legacy_job_name=None):
+    """Return (where_clauses, params, after_key, checkpoint) for an activity run.
+
+    An explicit --since filters on the keyset columns (sargable form of
+    ``ACTIVITY_KEY >= since``); otherwise incremental runs resume strictly
+    after the stored (last_updated_at, last_id) key.
+    """
+    if since:
+        return ["(da_updated_date >= %s OR (da_updated_date IS NULL AND da_created_date >= %s))"], [since, since], (None, None), True
+    if mode == "full":
+        return [], [], (None, None), False
+    wm_updated_at, wm_last_id = get_watermark(target_cursor, job_name)
+    if wm_last_id is None and legacy_job_name:
+        wm_updated_at, wm_last_id = get_watermark(target_cursor, legacy_job_name)
+    return [], [], (wm_updated_at, wm_last_id), True
+
+
+def resolve_snapshot_mode(snapshot, mode):
+    if snapshot and mode != "full":
+        print("ℹ️ Snapshot replay always runs as --mode full (no watermark).")
+        return "full"
+    return mode
+
+
+def iter_snapshot_pages(directory, page_size=1000, limit=None, id_range=None, ids=None):
+    """Replay ss_daily_activity from a local snapshot in da_id order, paged like iter_activity_pages."""
+    page_size = max(1, int(page_size or 1))
+    remaining = int(limit) if limit and isinstance(limit, int) and limit > 0 else None
+    wanted = set(ids) if ids else None
+    page = []
+    for row in read_snapshot(snapshot_path(directory, "ss_daily_activity")):
+        if remaining is not None and remaining <= 0:
+            break
+        da_id = row["da_id"]
+        if id_range and not (id_range[0] <= da_id < id_range[1]):
+            continue
+        if wanted is not None and da_id not in wanted:
+            continue
+        page.append(row)
+        if remaining is not None:
+            remaining -= 1
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def load_snapshot_user_id_map(directory):
+    """Same mapping as load_user_id_map, read from the snapshot's ss_user file."""
+    user_ids = {}
+    for row in read_snapshot(snapshot_path(directory, "ss_user")):
+        if row["id_key"] is not None:
+            user_ids.setdefault(str(row["id_key"]), row["id"])
+    return user_ids
+
+
+def migrate_daily_activity(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False, batch_size: int = 1000, chunk_size: int = 1000,
+                           bulk: bool = False, metrics_json: str = None, record_run: bool = False, context=None, ids: list = None,
+                           id_range: tuple = None, daily_table: str = DAILY_TABLE, snapshot: str = None, target: str = LIVE_DB,
+                           commit_rows: int = 10000, commit_seconds: float = 5.0, max_retries: int = 5):
     config = {
         "host": "localhost",
         "user": "root",
         "password": ""  # Adjust with your credentials if needed
     }
 
-    source_db = connect_db(**config, db="system-smartpro")  # Source db name
-    target_db = connect_db(**config, db="clocking_reports")  # Target db name
-
-    source_cursor = source_db.cursor(dictionary=True)
+    mode = resolve_snapshot_mode(snapshot, mode)
+    if snapshot:
+        check_replay_target(target)
+    bulk = resolve_bulk(bulk, mode, dry_run)
+    metrics = RunMetrics("daily_activities", {
+        "mode": mode, "since": since, "limit": limit, "dry_run": dry_run,
+        "batch_size": batch_size, "chunk_size": chunk_size, "bulk": bulk, "id_range": id_range, "daily_table": daily_table,
+        "snapshot": snapshot, "commit_rows": commit_rows, "commit_seconds": commit_seconds, "max_retries": max_retries,
+    })
+    if context is None:
+        # Snapshot replay never opens the source database
+        source_db = None if snapshot else metrics.connection(connect_db(**config, db="system-smartpro"))  # Source db name
+        target_db = metrics.connection(connect_db(**config, db=target, allow_local_infile=bulk))  # Target db name
+    else:
+        # Daemon mode: reuse the long-lived connections and caches
+        source_db = metrics.connection(context.source_db)
+        target_db = metrics.connection(context.target_db)
+
+    source_cursor = source_db.cursor(dictionary=True) if source_db else None
     target_cursor = target_db.cursor()
-    user_lookup_cursor = source_db.cursor()  # Lookup id from ss_user in source DB
+    user_lookup_cursor = source_db.cursor() if source_db else None  # Preload id from ss_user in source DB
 
     # Ensure watermark table exists
     ensure_migration_state_table(target_cursor)
-    wm_updated_at, wm_last_id = get_watermark(target_cursor, "ss_daily_activity")
 
-    # Build incremental query
+    # Build incremental query; --mode full ignores the stored watermark (an explicit --since still applies)
     base_query = "SELECT * FROM ss_daily_activity"
-    params = []
-    where_clauses = []
-
-    effective_since = since or (wm_updated_at.isoformat(sep=' ') if isinstance(wm_updated_at, datetime) else None)
-    if effective_since:
-        where_clauses.append("((da_updated_date IS NOT NULL AND da_updated_date >= %s) OR (da_created_date IS NOT NULL AND da_created_date >= %s))")
-        params.extend([effective_since, effective_since])
-
-    if where_clauses:
-        base_query += " WHERE " + " AND ".join(where_clauses)
-    base_query += " ORDER BY da_updated_date ASC, da_id ASC"
-    if limit and isinstance(limit, int) and limit > 0:
-        base_query += f" LIMIT {int(limit)}"
-
-    source_cursor.execute(base_query, tuple(params) if params else None)
-    rows = source_cursor.fetchall()
-
-    insert_query = """
-        INSERT INTO daily_activities (
-            daily_activity_id, project_code, activity_date, priority,
-            start_time, end_time, created_by, created_at,
-            updated_at, activity_type, description,
-            activity_duration_minutes, user_id
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
+    # First run under its own job name seeds from the formerly shared watermark
+    where_clauses, params, after_key, checkpoint = resolve_start_key(
+        target_cursor, DAILY_JOB_NAME, mode, since, legacy_job_name=CLOCKING_JOB_NAME
+    )
+    # Restrict to a half-open da_id range [start, end) (shadow rebuilds pin the source snapshot this way)
+    if id_range:
+        where_clauses.append("da_id >= %s AND da_id < %s")
+        params.extend([id_range[0], id_range[1]])
+    # Restrict to explicit da_ids (used by migration_reconcile.py to re-sync drifted rows)
+    if ids:
+        where_clauses.append(f"da_id IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
+
+    # Resolve users and duplicates locally instead of per-row round trips
+    with metrics.stage("preload"):
+        if context is None:
+            user_id_by_key = load_snapshot_user_id_map(snapshot) if snapshot else load_user_id_map(user_lookup_cursor)
+            existing_daily_ids = load_existing_daily_ids(target_cursor, daily_table)
+        else:
+            user_id_by_key = context.user_id_by_key
+            existing_daily_ids = context.existing_daily_ids
+
+    # Keyset pages of chunk_size rows; memory stays flat regardless of table size
+    if snapshot:
+        pages = iter_snapshot_pages(snapshot, chunk_size, limit, id_range, ids)
+    else:
+        pages = iter_activity_pages(
+            source_cursor, base_query, where_clauses, params, after_key, chunk_size, limit, by_id=not checkpoint
+        )
+    pages = metrics.iterate("fetch", pages, rows=len)
+
+    # Pages are committed every commit_rows rows / commit_seconds; deadlocks replay the open window
+    transaction = WriteTransaction(target_db, target_cursor, commit_rows, commit_seconds, max_retries, metrics=metrics)
+    # Bulk mode stages rows to a TSV file and loads it once at the end
+    if bulk:
+        daily_writer = TsvStager(daily_table, DAILY_ACTIVITY_COLUMNS)
+    else:
+        daily_writer = BatchWriter(
+            target_cursor, insert_query(daily_table, DAILY_ACTIVITY_COLUMNS), batch_size, metrics=metrics, transaction=transaction
+        )
+    timer = Throughput()
+    last_key = None
 
     inserted_total = 0
     inserted_with_user = 0
     inserted_without_user = 0
     skipped_parse_errors = 0
-    max_updated_at = None
-    max_id = None
 
-    for row in rows:
-        # Extract id_key from da_data JSON
-        da_data = row.get("da_data", "{}")
-        user_key = None
-        try:
-            da_data_json = json.loads(da_data) if isinstance(da_data, str) else da_data
-            if isinstance(da_data_json, dict):
-                user_key = da_data_json.get("id_key")
-        except json.JSONDecodeError:
-            skipped_parse_errors += 1
-
-        user_id = None
-        if user_key:
-            user_id = get_user_id_from_key(user_lookup_cursor, user_key)
-
-        # Track maxima
-        da_id = row.get("da_id")
-        upd = row.get("da_updated_date") or row.get("da_created_date")
-        try:
-            if isinstance(upd, datetime):
-                max_updated_at = upd if (max_updated_at is None or upd > max_updated_at) else max_updated_at
-            max_id = da_id if (max_id is None or (da_id is not None and da_id > max_id)) else max_id
-        except Exception:
-            pass
-
-        # Avoid duplicate if already present
-        if daily_activity_exists(target_cursor, da_id):
-            continue
+    for page in pages:
+        with metrics.stage("transform", rows=len(page)):
+            for row in page:
+                # Extract id_key from da_data JSON
+                da_data = row.get("da_data", "{}")
+                user_key = None
+                try:
+                    da_data_json = json.loads(da_data) if isinstance(da_data, str) else da_data
+                    if isinstance(da_data_json, dict):
+                        user_key = da_data_json.get("id_key")
+                except json.JSONDecodeError:
+                    skipped_parse_errors += 1
+
+                user_id = None
+                if user_key:
+                    user_id = user_id_by_key.get(str(user_key))
+
+                # Avoid duplicate if already present
+                da_id = row.get("da_id")
+                if da_id in existing_daily_ids:
+                    continue
+                existing_daily_ids.add(da_id)
 
-        if not dry_run:
-            target_cursor.execute(insert_query, (
-                da_id,
-                row.get("da_project_code"),
-                row.get("da_date"),
-                map_priority(row.get("da_priority")),
-                row.get("da_start_tm"),
-                row.get("da_end_tm"),
-                row.get("da_created_by"),
-                row.get("da_created_date"),
-                row.get("da_updated_date"),
-                row.get("da_activity"),
-                row.get("da_keterangan"),
-                row.get("da_duration"),
-                user_id,
-            ))
-        inserted_total += 1
-        if user_id is not None:
-            inserted_with_user += 1
-        else:
-            inserted_without_user += 1
+                if not dry_run:
+                    daily_writer.add((
+                        da_id,
+                        row.get("da_project_code"),
+                        row.get("da_date"),
+                        map_priority(row.get("da_priority")),
+                        row.get("da_start_tm"),
+                        row.get("da_end_tm"),
+                        row.get("da_created_by"),
+                        row.get("da_created_date"),
+                        row.get("da_updated_date"),
+                        row.get("da_activity"),
+                        row.get("da_keterangan"),
+                        row.get("da_duration"),
+                        user_id,
+                    ))
+                inserted_total += 1
+                if user_id is not None:
+                    inserted_with_user += 1
+                else:
+                    inserted_without_user += 1
+
+        # The page's last key is written in the same transaction as its rows, so a killed run
+        # resumes right after the last committed page and never re-applies part of one
+        last_key = activity_key(page[-1])
+        if not dry_run and not bulk:
+            daily_writer.flush()
+            if checkpoint:
+                with metrics.stage("watermark"):
+                    transaction.execute(WATERMARK_UPSERT, (DAILY_JOB_NAME, *last_key), rows=0)
+            transaction.maybe_commit()
+
+    if not dry_run and not bulk:
+        transaction.commit()
+
+    if bulk:
+        with metrics.stage("bulk_load", rows=daily_writer.rows_written):
+            bulk_load(target_cursor, target_db, [daily_writer])
+        if checkpoint and last_key:
+            with metrics.stage("watermark"):
+                update_watermark(target_cursor, target_db, DAILY_JOB_NAME, *last_key)
 
-    if not dry_run:
-        target_db.commit()
     print(
         f"✅ Inserted: {inserted_total} daily activity records. "
         f"(with user: {inserted_with_user}, without user: {inserted_without_user})"
     )
+    timer.report(f"daily_activities ({daily_writer.method}, batch_size={daily_writer.batch_size})", inserted_total)
     if skipped_parse_errors:
         print(f"⚠️ JSON parse issues: {skipped_parse_errors} records (da_data invalid).")
 
-    # Update watermark if running incremental and not dry-run
-    if (mode == "incremental" or effective_since) and not dry_run:
-        update_watermark(target_cursor, target_db, "ss_daily_activity", max_updated_at, max_id)
+    report_peak_rss("daily_activities")
+    metrics.count(
+        inserted=inserted_total, with_user=inserted_with_user, without_user=inserted_without_user,
+        parse_errors=skipped_parse_errors, deadlock_retries=transaction.retried,
+    )
+    report = metrics.emit(metrics_json, target_cursor if record_run and not dry_run else None, target_db)
 
-    source_cursor.close()
+    if source_db:
+        source_cursor.close()
+        user_lookup_cursor.close()
     target_cursor.close()
-    user_lookup_cursor.close()
-    source_db.close()
-    target_db.close()
+    if context is None:
+        if source_db:
+            source_db.close()
+        target_db.close()
+    return report
+
+
+def parse_da_clocking(da_clocking_raw):
+    # Normalize da_clocking: treat None/empty string/'null' as empty list
+    if da_clocking_raw is None or str(da_clocking_raw).strip() in ("", "null", "NULL"):
+        return []
+    try:
+        # If stored as JSON string, parse; if already list/dict, keep
+        da_clocking = (
+            json.loads(da_clocking_raw)
+            if isinstance(da_clocking_raw, str)
+            else da_clocking_raw
+        )
+        return [] if da_clocking is None else da_clocking
+    except json.JSONDecodeError:
+        # Fall back to empty list on invalid JSON
+        return []
+
+
+def split_dt(ts):
+    if ts is None:
+        return None, None
+    if isinstance(ts, datetime):
+        return ts.date().isoformat(), ts.time().isoformat()
+    # If ts is a string, try to parse
+    try:
+        parsed = datetime.fromisoformat(str(ts))
+        return parsed.date().isoformat(), parsed.time().isoformat()
+    except ValueError:
+        return None, None
+
+
+def transform_activity_row(row):
+    """CPU-bound part of the clocking migration for one ss_daily_activity row.
+
+    Pure: no DB access and no shared state, so it can run in a worker
+    process. FK and duplicate decisions are made afterwards, in source order,
+    by ClockingApplier.
+    """
+    da_id = row["da_id"]
+    da_clocking = parse_da_clocking(row.get("da_clocking"))
+
+    # id_key for an auto-created parent; maps to the placeholder user email
+    id_key = None
+    try:
+        da_data_raw = row.get("da_data")
+        if da_data_raw:
+            da_json = json.loads(da_data_raw) if isinstance(da_data_raw, str) else da_data_raw
+            if isinstance(da_json, dict):
+                id_key = da_json.get("id_key")
+    except json.JSONDecodeError:
+        id_key = None
+
+    # Parent daily_activities values without user_id (resolved by the applier)
+    parent = (
+        da_id,
+        row.get("da_project_code"),
+        row.get("da_date"),
+        map_priority(row.get("da_priority")),
+        row.get("da_start_tm"),
+        row.get("da_end_tm"),
+        row.get("da_created_by"),
+        row.get("da_created_date"),
+        row.get("da_updated_date"),
+        row.get("da_activity"),
+        row.get("da_keterangan"),
+        row.get("da_duration"),
+    )
+
+    entries = []
+    fallback = None
+    if isinstance(da_clocking, list) and len(da_clocking) > 0:
+        for entry in da_clocking:
+            task_id = entry.get("task_id")
+            activity = entry.get("activity")
+            duration = entry.get("duration")
+            start_date = entry.get("start_date")
+            start_time = entry.get("start_time")
+            end_date = entry.get("end_date")
+            end_time = entry.get("end_time")
+            # If duration missing, try compute from start/end
+            if duration is None:
+                duration = compute_diff_minutes(start_date, start_time, end_date, end_time)
+            # If task_id missing, try mapping from activity label
+            if task_id is None and activity:
+                task_id = TASK_ID_MAP.get(str(activity).strip().lower())
+            # Leave task_id as None (NULL) if no mapping
+            # Prefer explicit category_id; otherwise fall back to task_id; else default
+            category_id = (
+                entry.get("category_id")
+                if entry.get("category_id") is not None
+                else (entry.get("task_id") if entry.get("task_id") is not None else DEFAULT_CATEGORY_ID)
+            )
+            entries.append((task_id, activity, duration, start_date, start_time, end_date, end_time, category_id))
+    else:
+        # Fallback: build a single clocking activity record from ss_daily_activity columns
+        # This reduces skipped rows and creates usable data even without JSON
+        activity_desc = row.get("da_activity") or None
+        duration_minutes = row.get("da_duration") or None
+
+        # Extract date/time parts from timestamps (if present)
+        start_date, start_time = split_dt(row.get("da_start_tm"))
+        end_date, end_time = split_dt(row.get("da_end_tm"))
+
+        # If duration missing, compute from start/end
+        if duration_minutes is None:
+            duration_minutes = compute_diff_minutes(start_date, start_time, end_date, end_time)
+        # Fallback to 0 if still None (ensure non-null)
+        if duration_minutes is None:
+            duration_minutes = 0
+        fallback = (activity_desc, duration_minutes, start_date, start_time, end_date, end_time)
+
+    return {"da_id": da_id, "id_key": id_key, "parent": parent, "entries": entries, "fallback": fallback}
+
+
+def transform_page(page):
+    return [transform_activity_row(row) for row in page]
+
+
+class ClockingApplier:
+    """Stateful stage: FK guards, duplicate-fallback checks and counters.
+
+    Must see rows in source order; both the serial and the pipelined paths
+    feed it the same transformed rows, so their counts are identical.
+    """
+
+    def __init__(self, existing_daily_ids, valid_category_ids, daily_ids_with_clockings, user_id_by_id_key):
+        self.existing_daily_ids = existing_daily_ids
+        self.valid_category_ids = valid_category_ids
+        self.daily_ids_with_clockings = daily_ids_with_clockings
+        self.user_id_by_id_key = user_id_by_id_key
+        self.inserted_total = 0
+        self.inserted_from_json = 0
+        self.inserted_from_fallback = 0
+        self.skipped_count = 0
+        self.category_fixed_count = 0
+
+    def apply(self, item):
+        """Return (daily_rows, clocking_rows) to write for one transformed row."""
+        da_id = item["da_id"]
+        daily_rows = []
+        clocking_rows = []
+
+        # Ensure parent daily_activities exists; auto-create minimal row if missing
+        if da_id not in self.existing_daily_ids:
+            id_key = item["id_key"]
+            user_id = self.user_id_by_id_key.get(str(id_key).casefold()) if id_key else None
+            daily_rows.append(item["parent"] + (user_id,))
+            # Update local set to avoid double counting even in dry-run
+            self.existing_daily_ids.add(da_id)
+
+        if item["entries"]:
+            for task_id, activity, duration, start_date, start_time, end_date, end_time, category_id in item["entries"]:
+                # Guard against invalid category ids
+                if category_id not in self.valid_category_ids:
+                    category_id = DEFAULT_CATEGORY_ID
+                    self.category_fixed_count += 1
+                clocking_rows.append((
+                    da_id, task_id, activity, duration,
+                    start_date, start_time, end_date, end_time, category_id,
+                ))
+                self.inserted_total += 1
+                self.inserted_from_json += 1
+        # Only insert fallback if this daily_activity_id has no existing clocking entries
+        elif da_id not in self.daily_ids_with_clockings:
+            activity_desc, duration_minutes, start_date, start_time, end_date, end_time = item["fallback"]
+            clocking_rows.append((
+                da_id,
+                None,  # task_id unknown when no JSON
+                activity_desc,
+                duration_minutes,
+                start_date,
+                start_time,
+                end_date,
+                end_time,
+                DEFAULT_CATEGORY_ID,  # use default category
+            ))
+            self.inserted_total += 1
+            self.inserted_from_fallback += 1
+            self.daily_ids_with_clockings.add(da_id)
+
+        return daily_rows, clocking_rows
+
+
+class ClockingSink:
+    """Write stage: buffered (or bulk) writers, per-page commit, scoped backfill and checkpoint."""
+
+    def __init__(self, target_cursor, target_db, dry_run=False, bulk=False, batch_size=1000,
+                 run_backfill=True, backfill_chunk_size=10000, checkpoint=False, metrics=None,
+                 daily_table=DAILY_TABLE, clocking_table=CLOCKING_TABLE, transaction=None, max_retries=5, rollup=True,
+                 lease=None):
+        self.metrics = metrics or RunMetrics("clocking_activities")
+        self.transaction = transaction or WriteTransaction(target_db, target_cursor, metrics=self.metrics)
+        self.max_retries = max_retries
+        self.target_cursor = target_cursor
+        self.target_db = target_db
+        self.dry_run = dry_run
+        self.bulk = bulk
+        self.run_backfill = run_backfill
+        # Rollups fold in backfilled rows only, in the transaction that backfills them
+        self.rollup = rollup and run_backfill and not dry_run and clocking_table == CLOCKING_TABLE
+        self.rolled_up = 0
+        self.backfill_chunk_size = backfill_chunk_size
+        self.checkpoint = checkpoint
+        self.daily_table = daily_table
+        self.clocking_table = clocking_table
+        # Parallel worker lease: its progress is journaled with every page (see migration_parallel.py)
+        self.lease = lease
+        self.last_key = None
+
+        # Rows inserted by this run get activity_id > run_first_id; the backfill is scoped to them,
+        # plus whatever an earlier run committed but died before backfilling (live table only)
+        self.run_first_id = get_max_activity_id(target_cursor, clocking_table)
+        self.backfill_from_id = self.run_first_id
+        self.track_backfill = run_backfill and not dry_run and clocking_table == CLOCKING_TABLE
+        if self.track_backfill:
+            _, backfilled = get_watermark(target_cursor, BACKFILL_JOB_NAME)
+            if backfilled is None:
+                update_watermark(target_cursor, target_db, BACKFILL_JOB_NAME, None, self.run_first_id)
+            else:
+                self.backfill_from_id = min(backfilled, self.run_first_id)
+        self.backfill_start_id = self.backfill_from_id
+        if self.rollup:
+            ensure_rollup_tables(target_cursor)
+            self.rollup_from_id = rolled_up_to(target_cursor)
+        self.backfill_counts = [0, 0, 0]
+
+        # Buffered writers; parents are flushed before children to keep FK order.
+        # Bulk mode stages both tables to TSV files and loads them once at the end.
+        if bulk:
+            self.daily_writer = TsvStager(daily_table, DAILY_ACTIVITY_COLUMNS)
+            self.clocking_writer = TsvStager(clocking_table, CLOCKING_ACTIVITY_COLUMNS)
+        else:
+            self.daily_writer = BatchWriter(
+                target_cursor, insert_query(daily_table, DAILY_ACTIVITY_COLUMNS), batch_size,
+                metrics=self.metrics, stage="insert_daily", transaction=self.transaction,
+            )
+            self.clocking_writer = BatchWriter(
+                target_cursor, insert_query(clocking_table, CLOCKING_ACTIVITY_COLUMNS), batch_size, parent=self.daily_writer,
+                metrics=self.metrics, stage="insert_clocking", transaction=self.transaction,
+            )
+
+    def write(self, daily_rows, clocking_rows):
+        if self.dry_run:
+            return
+        for row in daily_rows:
+            self.daily_writer.add(row)
+        for row in clocking_rows:
+            self.clocking_writer.add(row)
+
+    def backfill(self):
+        """Journal the backfill of every row inserted since the last commit into the open
+        transaction, then fold them into the rollups, so those rows (and both watermarks)
+        commit already backfilled and counted."""
+        with self.metrics.stage("backfill"):
+            # Open-ended: a deadlock replay re-inserts the window's rows under new activity_ids
+            self.transaction.execute(backfill_query(self.clocking_table, bounded=False), (self.backfill_from_id,), rows=0)
+            if self.track_backfill:
+                self.transaction.execute(
+                    f"""
+                    INSERT INTO migration_state (job_name, last_updated_at, last_id)
+                    SELECT %s, NULL, COALESCE(MAX(activity_id), 0) FROM {self.clocking_table}
+                    ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)
+                    """,
+                    (BACKFILL_JOB_NAME,), rows=0,
+                )
+        if self.rollup:
+            with self.metrics.stage("rollup"):
+                fold_rollups(self.transaction, self.rollup_from_id)
+
+    def commit(self):
+        if self.run_backfill:
+            self.backfill()
+        self.transaction.commit()
+        if self.run_backfill:
+            self.backfill_from_id = get_max_activity_id(self.target_cursor, self.clocking_table)
+        if self.rollup:
+            self.rolled_up += max(0, self.backfill_from_id - self.rollup_from_id)
+            self.rollup_from_id = max(self.rollup_from_id, self.backfill_from_id)
+
+    def commit_page(self, last_key):
+        """Flush the page and checkpoint its last key in the same transaction; once the
+        transaction is due, backfill its rows and commit, so a killed run resumes right after
+        the last committed page without rescanning, duplicating or leaving raw rows behind."""
+        self.last_key = last_key
+        if self.dry_run or self.bulk:
+            return
+        self.flush_page()
+        if self.checkpoint:
+            with self.metrics.stage("watermark"):
+                self.transaction.execute(WATERMARK_UPSERT, (CLOCKING_JOB_NAME, *last_key), rows=0)
+        if self.lease is not None:
+            self.transaction.execute(*self.lease.progress(last_key), rows=0)
+        if self.transaction.due():
+            self.commit()
+
+    def flush_page(self):
+        # Flushes the daily parent writer first
+        self.clocking_writer.flush()
+
+    def finish(self):
+        if not self.bulk:
+            if self.transaction.journal:
+                self.commit()
+            if self.run_backfill and not self.dry_run:
+                self.backfill_counts = list(backfill_check(
+                    self.target_cursor, self.backfill_start_id, self.backfill_from_id, self.clocking_table
+                ))
+            return
+        rows = self.daily_writer.rows_written + self.clocking_writer.rows_written
+        with self.metrics.stage("bulk_load", rows=rows):
+            bulk_load(self.target_cursor, self.target_db, [self.daily_writer, self.clocking_writer])
+        if self.run_backfill:
+            # LOAD DATA has already committed; the watermark advances per backfill window, so a
+            # crash in between is picked up by the next run
+            with self.metrics.stage("backfill"):
+                page_last_id = get_max_activity_id(self.target_cursor, self.clocking_table)
+                self.backfill_counts = list(backfill_clocking_fields(
+                    self.target_cursor, self.target_db, self.backfill_from_id, page_last_id, self.backfill_chunk_size,
+                    self.clocking_table, self.max_retries, checkpoint=self.track_backfill,
+                    rollup_from=self.rollup_from_id if self.rollup else None,
+                ))
+            self.backfill_from_id = page_last_id
+            if self.rollup:
+                self.rolled_up += max(0, page_last_id - self.rollup_from_id)
+                self.rollup_from_id = max(self.rollup_from_id, page_last_id)
+        if self.checkpoint and self.last_key:
+            with self.metrics.stage("watermark"):
+                update_watermark(self.target_cursor, self.target_db, CLOCKING_JOB_NAME, *self.last_key)
+
+
+# TEMPORARY tables (per connection) for --fk-mode staging
+DAILY_STAGE = "tmp_daily_stage"
+CLOCKING_STAGE = "tmp_clocking_stage"
+
+
+class StagingApplier:
+    """--fk-mode staging counterpart of ClockingApplier: no lookups, FK checks happen in SQL.
+
+    Every source row stages its parent (with the raw id_key) and its clocking
+    rows; entries and the fallback are told apart by ``is_fallback``. The
+    counters are filled in by StagedClockingSink once each page is resolved.
+    """
+
+    def __init__(self):
+        self.inserted_total = 0
+        self.inserted_from_json = 0
+        self.inserted_from_fallback = 0
+        self.skipped_count = 0
+        self.category_fixed_count = 0
+
+    def apply(self, item):
+        da_id = item["da_id"]
+        id_key = str(item["id_key"]) if item["id_key"] else None
+        daily_rows = [item["parent"] + (None, id_key)]
+        if item["entries"]:
+            clocking_rows = [(da_id,) + entry + (0,) for entry in item["entries"]]
+        else:
+            activity_desc, duration_minutes, start_date, start_time, end_date, end_time = item["fallback"]
+            clocking_rows = [(
+                da_id, None, activity_desc, duration_minutes,
+                start_date, start_time, end_date, end_time, DEFAULT_CATEGORY_ID, 1,
+            )]
+        return daily_rows, clocking_rows
+
+
+class StagedClockingSink(ClockingSink):
+    """Set-based FK handling: each page is staged in TEMPORARY tables and resolved with
+    anti-joins against the target's indexes, then moved with one INSERT ... SELECT.
+
+    Replaces the Python-side preloads of daily, category, clocking and
+    placeholder-user ids. Every statement runs in the page's WriteTransaction,
+    so a deadlock replays the staging along with the move.
+    """
+
+    def __init__(self, target_cursor, target_db, counters, batch_size=1000, **kwargs):
+        super().__init__(target_cursor, target_db, batch_size=batch_size, **kwargs)
+        self.counters = counters
+        self.staged_json = 0
+        self.staged_fallback = 0
+        for stage, table, extra in (
+            (DAILY_STAGE, self.daily_table, "ADD COLUMN id_key VARCHAR(255) NULL"),
+            (CLOCKING_STAGE, self.clocking_table, "ADD COLUMN is_fallback TINYINT NOT NULL DEFAULT 0"),
+        ):
+            # LIKE copies column types and keys but no FKs; activity_id keeps the staged order
+            target_cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {stage}")
+            target_cursor.execute(f"CREATE TEMPORARY TABLE {stage} LIKE {table}")
+            target_cursor.execute(f"ALTER TABLE {stage} {extra}")
+        self.daily_writer = BatchWriter(
+            target_cursor, insert_query(DAILY_STAGE, DAILY_ACTIVITY_COLUMNS + ("id_key",)), batch_size,
+            metrics=self.metrics, stage="stage_daily", transaction=self.transaction,
+        )
+        self.clocking_writer = BatchWriter(
+            target_cursor, insert_query(CLOCKING_STAGE, CLOCKING_ACTIVITY_COLUMNS + ("is_fallback",)), batch_size,
+            parent=self.daily_writer, metrics=self.metrics, stage="stage_clocking", transaction=self.transaction,
+        )
+
+    def write(self, daily_rows, clocking_rows):
+        super().write(daily_rows, clocking_rows)
+        for row in clocking_rows:
+            if row[-1]:
+                self.staged_fallback += 1
+            else:
+                self.staged_json += 1
+
+    def flush_page(self):
+        self.clocking_writer.flush()
+        if not (self.staged_json or self.staged_fallback):
+            return
+        tx = self.transaction
+        parent_columns = ", ".join(DAILY_ACTIVITY_COLUMNS[:-1])
+        staged_parent_columns = ", ".join(f"s.{column}" for column in DAILY_ACTIVITY_COLUMNS[:-1])
+        clocking_columns = ", ".join(CLOCKING_ACTIVITY_COLUMNS)
+        with self.metrics.stage("fk_check"):
+            # Missing parents: anti-join on the PK; user_id from the id_key's placeholder user (lowest id wins)
+            tx.execute(
+                f"""
+                INSERT INTO {self.daily_table} ({parent_columns}, user_id)
+                SELECT {staged_parent_columns},
+                       (SELECT MIN(u.user_id) FROM users u WHERE u.email = CONCAT(s.id_key, %s))
+                FROM {DAILY_STAGE} s
+                LEFT JOIN {self.daily_table} d ON d.daily_activity_id = s.daily_activity_id
+                WHERE d.daily_activity_id IS NULL
+                """,
+                ("@placeholder.local",), rows=0,
+            )
+            # Invalid (or NULL) category_id on JSON entries falls back to the default category
+            fixed = tx.execute(
+                f"""
+                UPDATE {CLOCKING_STAGE} s
+                LEFT JOIN category_clocking c ON c.category_id = s.category_id
+                SET s.category_id = %s
+                WHERE s.is_fallback = 0 AND c.category_id IS NULL
+                """,
+                (DEFAULT_CATEGORY_ID,), rows=0,
+            )
+            # A fallback row is only added when the activity has no clocking rows yet
+            duplicate_fallbacks = tx.execute(
+                f"""
+                DELETE s FROM {CLOCKING_STAGE} s
+                JOIN {self.clocking_table} c ON c.daily_activity_id = s.daily_activity_id
+                WHERE s.is_fallback = 1
+                """,
+                rows=0,
+            )
+        with self.metrics.stage("insert_clocking"):
+            tx.execute(
+                f"INSERT INTO {self.clocking_table} ({clocking_columns}) "
+                f"SELECT {clocking_columns} FROM {CLOCKING_STAGE} ORDER BY activity_id",
+                rows=0,
+            )
+            tx.execute(f"DELETE FROM {CLOCKING_STAGE}", rows=0)
+            tx.execute(f"DELETE FROM {DAILY_STAGE}", rows=0)
+
+        from_fallback = self.staged_fallback - max(0, duplicate_fallbacks or 0)
+        self.counters.category_fixed_count += max(0, fixed or 0)
+        self.counters.inserted_from_json += self.staged_json
+        self.counters.inserted_from_fallback += from_fallback
+        self.counters.inserted_total += self.staged_json + from_fallback
+        self.staged_json = 0
+        self.staged_fallback = 0
+
+
+_PIPELINE_DONE = object()
+
+
+def apply_page(applier, items, metrics):
+    with metrics.stage("apply", rows=len(items)):
+        daily_rows, clocking_rows = [], []
+        for item in items:
+            page_daily, page_clocking = applier.apply(item)
+            daily_rows.extend(page_daily)
+            clocking_rows.extend(page_clocking)
+    return daily_rows, clocking_rows
+
+
+def run_clocking_pipeline(pages, applier, sink, workers, depth=None):
+    """Overlap source reads, JSON/time transforms and target writes.
+
+    A reader thread pulls keyset pages from the source, a process pool runs
+    transform_page, the main thread applies results strictly in page order,
+    and a writer thread owns the target connection for flush/commit/checkpoint.
+    """
+    depth = depth or workers * 2
+    page_queue = queue.Queue(maxsize=depth)
+    write_queue = queue.Queue(maxsize=depth)
+    errors = []
+    # Set as soon as any stage fails; every blocking put/get polls it, so no thread waits forever
+    stop = threading.Event()
+
+    def fail(exc):
+        errors.append(exc)
+        stop.set()
+
+    def put(target, item):
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(source):
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _PIPELINE_DONE
 
+    def read():
+        try:
+            for page in pages:
+                if not put(page_queue, page):
+                    break
+        except Exception as exc:
+            fail(exc)
+        finally:
+            put(page_queue, _PIPELINE_DONE)
+
+    def write():
+        while True:
+            item = get(write_queue)
+            if item is _PIPELINE_DONE:
+                break
+            daily_rows, clocking_rows, last_key = item
+            try:
+                sink.write(daily_rows, clocking_rows)
+                sink.commit_page(last_key)
+            except Exception as exc:
+                fail(exc)
+                break
+
+    reader = threading.Thread(target=read, daemon=True)
+    writer = threading.Thread(target=write, daemon=True)
+    reader.start()
+    writer.start()
+
+    def drain(in_flight):
+        future, last_key = in_flight.popleft()
+        # Time spent here is waiting on the pool, i.e. transform work not hidden by overlap
+        with sink.metrics.stage("transform"):
+            items = future.result()
+        daily_rows, clocking_rows = apply_page(applier, items, sink.metrics)
+        put(write_queue, (daily_rows, clocking_rows, last_key))
 
-def migrate_clocking_activities(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False):
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            while True:
+                page = get(page_queue)
+                if page is _PIPELINE_DONE:
+                    break
+                in_flight.append((pool.submit(transform_page, page), activity_key(page[-1])))
+                if len(in_flight) >= depth:
+                    drain(in_flight)
+            while in_flight and not stop.is_set():
+                drain(in_flight)
+    finally:
+        put(write_queue, _PIPELINE_DONE)
+        writer.join()
+        # Releases a reader still blocked on a full page queue (e.g. the transform raised)
+        stop.set()
+        reader.join()
+    if errors:
+        raise errors[0]
+
+
+def preload_fk_sets(target_cursor, context, daily_table=DAILY_TABLE, clocking_table=CLOCKING_TABLE):
+    """--fk-mode preload: the id sets/maps ClockingApplier checks FKs and duplicates against."""
+    if context is None:
+        # Preload existing daily_activity IDs from target to satisfy FK constraints
+        existing_daily_ids = load_existing_daily_ids(target_cursor, daily_table)
+
+        # Preload valid category IDs to guard FK constraints
+        valid_category_ids = load_valid_category_ids(target_cursor)
+
+        # Track which daily_activity_ids already have clocking entries to avoid duplicate fallbacks
+        daily_ids_with_clockings = load_daily_ids_with_clockings(target_cursor, clocking_table)
+
+        # Placeholder users (id_key@placeholder.local) for auto-created parents
+        user_id_by_id_key = load_placeholder_user_ids(target_cursor)
+    else:
+        existing_daily_ids = context.existing_daily_ids
+        valid_category_ids = context.valid_category_ids
+        daily_ids_with_clockings = context.daily_ids_with_clockings
+        user_id_by_id_key = context.user_id_by_id_key
+    return existing_daily_ids, valid_category_ids, daily_ids_with_clockings, user_id_by_id_key
+
+
+def resolve_fk_mode(fk_mode, dry_run, bulk, context):
+    if fk_mode == "staging" and (dry_run or bulk or context is not None):
+        print("ℹ️ --fk-mode staging needs real per-page writes; using preload for --dry-run/--bulk/--daemon.")
+        return "preload"
+    return fk_mode
+
+
+def migrate_clocking_activities(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False, batch_size: int = 1000, chunk_size: int = 1000,
+                                id_range: tuple = None, run_backfill: bool = True, backfill_chunk_size: int = 10000, bulk: bool = False,
+                                transform_workers: int = 0, metrics_json: str = None, record_run: bool = False, context=None, ids: list = None,
+                                daily_table: str = DAILY_TABLE, clocking_table: str = CLOCKING_TABLE, snapshot: str = None,
+                                commit_rows: int = 10000, commit_seconds: float = 5.0, max_retries: int = 5, fk_mode: str = "preload",
+                                rollup: bool = True, preloads: tuple = None, lease=None, target: str = LIVE_DB):
     config = {
         "host": "localhost",
         "user": "root",
         "password": ""  # Adjust with your credentials if needed
     }
 
-    source_db = connect_db(**config, db="system-smartpro")  # Adjust source db name
-    target_db = connect_db(**config, db="clocking_reports")  # Adjust target db name
-
-    source_cursor = source_db.cursor(dictionary=True)
+    mode = resolve_snapshot_mode(snapshot, mode)
+    if snapshot:
+        check_replay_target(target)
+    bulk = resolve_bulk(bulk, mode, dry_run)
+    fk_mode = resolve_fk_mode(fk_mode, dry_run, bulk, context)
+    metrics = RunMetrics("clocking_activities", {
+        "mode": mode, "since": since, "limit": limit, "dry_run": dry_run, "batch_size": batch_size,
+        "chunk_size": chunk_size, "bulk": bulk, "id_range": id_range, "transform_workers": transform_workers,
+        "daily_table": daily_table, "clocking_table": clocking_table, "snapshot": snapshot,
+        "commit_rows": commit_rows, "commit_seconds": commit_seconds, "max_retries": max_retries, "fk_mode": fk_mode,
+        "rollup": rollup,
+    })
+    if context is None:
+        # Snapshot replay never opens the source database
+        source_db = None if snapshot else metrics.connection(connect_db(**config, db="system-smartpro"))  # Adjust source db name
+        target_db = metrics.connection(connect_db(**config, db=target, allow_local_infile=bulk))  # Adjust target db name
+    else:
+        # Daemon mode: reuse the long-lived connections and caches
+        source_db = metrics.connection(context.source_db)
+        target_db = metrics.connection(context.target_db)
+
+    source_cursor = source_db.cursor(dictionary=True) if source_db else None
     target_cursor = target_db.cursor()
 
-    # Ensure watermark table exists
-    ensure_migration_state_table(target_cursor)
-    wm_updated_at, wm_last_id = get_watermark(target_cursor, "ss_daily_activity")
+    writer_lock = False
+    try:
+        # Ensure watermark table exists
+        ensure_migration_state_table(target_cursor)
+        # One writer at a time on the live tables: the backfill/rollup watermarks assume activity_ids
+        # commit in order (parallel workers are fenced by their leases and rebuild the rollups at the end)
+        if not dry_run and lease is None and clocking_table == CLOCKING_TABLE and target == LIVE_DB:
+            acquire_lock(target_cursor, WRITER_LOCK)
+            writer_lock = True
+
+        # Fetch required fields including fallbacks when da_clocking is empty
+        base_query = (
+            """
+            SELECT 
+                da_id,
+                da_clocking,
+                da_activity,
+                da_duration,
+                da_date,
+                da_start_tm,
+                da_end_tm,
+                da_project_code,
+                da_priority,
+                da_created_by,
+                da_created_date,
+                da_updated_date,
+                da_keterangan,
+                da_data
+            FROM ss_daily_activity
+            """
+        )
+        # --mode full ignores the stored watermark (an explicit --since still applies)
+        where_clauses, params, after_key, checkpoint = resolve_start_key(target_cursor, CLOCKING_JOB_NAME, mode, since)
+
+        # Restrict to a half-open da_id range [start, end) when run as a parallel worker
+        if id_range:
+            where_clauses.append("da_id >= %s AND da_id < %s")
+            params.extend([id_range[0], id_range[1]])
+        # Restrict to explicit da_ids (used by migration_reconcile.py to re-sync drifted rows)
+        if ids:
+            where_clauses.append(f"da_id IN ({', '.join(['%s'] * len(ids))})")
+            params.extend(ids)
+
+        # Keyset pages of chunk_size rows; memory stays flat regardless of table size
+        if snapshot:
+            pages = iter_snapshot_pages(snapshot, chunk_size, limit, id_range, ids)
+        else:
+            pages = iter_activity_pages(
+                source_cursor, base_query, where_clauses, params, after_key, chunk_size, limit, by_id=not checkpoint
+            )
+        pages = metrics.iterate("fetch", pages, rows=len)
 
-    # Fetch required fields including fallbacks when da_clocking is empty
-    base_query = (
-        """
-        SELECT 
-            da_id,
-            da_clocking,
-            da_activity,
-            da_duration,
-            da_date,
-            da_start_tm,
-            da_end_tm,
-            da_project_code,
-            da_priority,
-            da_created_by,
-            da_created_date,
-            da_updated_date,
-            da_keterangan,
-            da_data
-        FROM ss_daily_activity
+        transaction = WriteTransaction(
+            target_db, target_cursor, commit_rows, commit_seconds, max_retries, metrics=metrics,
+            fence=lease.fence if lease is not None else None,
+        )
+        sink_options = {
+            "batch_size": batch_size, "run_backfill": run_backfill, "backfill_chunk_size": backfill_chunk_size,
+            "checkpoint": checkpoint, "metrics": metrics, "daily_table": daily_table, "clocking_table": clocking_table,
+            "transaction": transaction, "max_retries": max_retries, "rollup": rollup, "lease": lease,
+        }
+        if fk_mode == "staging":
+            # FK checks run in MySQL per page; nothing is preloaded
+            applier = StagingApplier()
+            sink = StagedClockingSink(target_cursor, target_db, applier, **sink_options)
+        else:
+            if preloads is None:
+                with metrics.stage("preload"):
+                    preloads = preload_fk_sets(target_cursor, context, daily_table, clocking_table)
+            # Callers running many ranges (parallel workers) pass the sets in, loaded once per process
+            existing_daily_ids, valid_category_ids, daily_ids_with_clockings, user_id_by_id_key = preloads
+            applier = ClockingApplier(existing_daily_ids, valid_category_ids, daily_ids_with_clockings, user_id_by_id_key)
+            sink = ClockingSink(target_cursor, target_db, dry_run=dry_run, bulk=bulk, **sink_options)
+        timer = Throughput()
+
+        if transform_workers and transform_workers > 1:
+            run_clocking_pipeline(pages, applier, sink, transform_workers)
+        else:
+            for page in pages:
+                with metrics.stage("transform", rows=len(page)):
+                    items = transform_page(page)
+                daily_rows, clocking_rows = apply_page(applier, items, metrics)
+                sink.write(daily_rows, clocking_rows)
+                sink.commit_page(activity_key(page[-1]))
+        sink.finish()
+
+        print(
+            f"✅ Inserted: {applier.inserted_total} clocking activity records. "
+            f"(JSON: {applier.inserted_from_json}, Fallback: {applier.inserted_from_fallback}, "
+            f"Category fixed: {applier.category_fixed_count})"
+        )
+        print(f"⚠️ Skipped: {applier.skipped_count} records due to insufficient data.")
+        timer.report(
+            f"clocking_activities ({sink.clocking_writer.method}, batch_size={sink.clocking_writer.batch_size}, "
+            f"flushes={sink.clocking_writer.flushes}, "
+            f"transform_workers={transform_workers or 1})",
+            applier.inserted_total,
+        )
+
+        # Backfill berjalan per page hanya untuk baris yang di-insert run ini; cetak verifikasi singkat
+        # (parallel workers skip this; the coordinator runs it once at the end)
+        if run_backfill and not dry_run:
+            task_zero, task_null, duration_null = sink.backfill_counts
+            print(
+                f"🔎 Backfill check (activity_id {sink.backfill_start_id + 1}..{sink.backfill_from_id}) — "
+                f"task_id=0: {task_zero}, task_id NULL: {task_null}, duration NULL: {duration_null}"
+            )
+        if sink.rollup:
+            print(f"📊 Rollups updated with {sink.rolled_up} new activity ids.")
+
+        report_peak_rss("clocking_activities")
+        metrics.count(
+            inserted=applier.inserted_total, from_json=applier.inserted_from_json,
+            from_fallback=applier.inserted_from_fallback, category_fixed=applier.category_fixed_count,
+            skipped=applier.skipped_count, deadlock_retries=sink.transaction.retried,
+        )
+        report = metrics.emit(metrics_json, target_cursor if record_run and not dry_run else None, target_db)
+    finally:
+        # Also on LeaseLost and other failures: a daemon cycle must not keep the writer lock
+        # on its long-lived connection, and a worker moving on must not leak connections
+        if writer_lock:
+            try:
+                release_lock(target_cursor, WRITER_LOCK)
+            except Exception:
+                pass  # a dead session has already dropped the lock
+        if source_cursor:
+            source_cursor.close()
+        target_cursor.close()
+        if context is None:
+            if source_db:
+                source_db.close()
+            target_db.close()
+    return report
+
+
+def load_foreign_keys(target_cursor, table):
+    """FKs declared on ``table``; CREATE TABLE ... LIKE copies indexes but not these."""
+    target_cursor.execute(
         """
+        SELECT k.constraint_name, k.column_name, k.referenced_table_name, k.referenced_column_name,
+               r.update_rule, r.delete_rule
+        FROM information_schema.key_column_usage k
+        JOIN information_schema.referential_constraints r
+          ON r.constraint_schema = k.constraint_schema
+         AND r.constraint_name = k.constraint_name
+         AND r.table_name = k.table_name
+        WHERE k.table_schema = DATABASE() AND k.table_name = %s AND k.referenced_table_name IS NOT NULL
+        ORDER BY k.constraint_name, k.ordinal_position
+        """,
+        (table,),
     )
-    params = []
-    where_clauses = []
-
-    effective_since = since or (wm_updated_at.isoformat(sep=' ') if isinstance(wm_updated_at, datetime) else None)
-    if effective_since:
-        where_clauses.append("((da_updated_date IS NOT NULL AND da_updated_date >= %s) OR (da_created_date IS NOT NULL AND da_created_date >= %s))")
-        params.extend([effective_since, effective_since])
-
-    if where_clauses:
-        base_query += " WHERE " + " AND ".join(where_clauses)
-    base_query += " ORDER BY da_updated_date ASC, da_id ASC"
-    if limit and isinstance(limit, int) and limit > 0:
-        base_query += f" LIMIT {int(limit)}"
-
-    source_cursor.execute(base_query, tuple(params) if params else None)
-    rows = source_cursor.fetchall()
-
-    # Preload existing daily_activity IDs from target to satisfy FK constraints
-    target_cursor.execute("SELECT daily_activity_id FROM daily_activities")
-    existing_daily_ids = {row[0] for row in target_cursor.fetchall()}
-
-    # Preload valid category IDs to guard FK constraints
-    target_cursor.execute("SELECT category_id FROM category_clocking")
-    valid_category_ids = {row[0] for row in target_cursor.fetchall()}
-
-    # Track which daily_activity_ids already have clocking entries to avoid duplicate fallbacks
-    target_cursor.execute("SELECT DISTINCT daily_activity_id FROM clocking_activities")
-    daily_ids_with_clockings = {row[0] for row in target_cursor.fetchall()}
-
-    insert_query = """
-        INSERT INTO clocking_activities (
-            daily_activity_id, task_id, activity_description, duration_minutes, 
-            start_date, start_time, end_date, end_time, category_id
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
+    keys = {}
+    for name, column, ref_table, ref_column, on_update, on_delete in target_cursor.fetchall():
+        key = keys.setdefault(name, {
+            "columns": [], "ref_table": ref_table, "ref_columns": [], "on_update": on_update, "on_delete": on_delete,
+        })
+        key["columns"].append(column)
+        key["ref_columns"].append(ref_column)
+    return list(keys.values())
+
+
+def foreign_key_clause(key, renames):
+    # Left unnamed on purpose: InnoDB names it <shadow>_ibfk_N and renames it with the table on swap
+    ref_table = renames.get(key["ref_table"], key["ref_table"])
+    columns = ", ".join(f"`{column}`" for column in key["columns"])
+    ref_columns = ", ".join(f"`{column}`" for column in key["ref_columns"])
+    return (
+        f"ADD FOREIGN KEY ({columns}) REFERENCES `{ref_table}` ({ref_columns}) "
+        f"ON UPDATE {key['on_update']} ON DELETE {key['on_delete']}"
+    )
+
+
+def external_references(target_cursor, tables):
+    """Tables outside ``tables`` with a FK into them; those FKs would follow the old table on swap."""
+    placeholders = ", ".join(["%s"] * len(tables))
+    target_cursor.execute(
+        f"""
+        SELECT DISTINCT table_name, referenced_table_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE()
+          AND referenced_table_name IN ({placeholders})
+          AND table_name NOT IN ({placeholders})
+        """,
+        tuple(tables) + tuple(tables),
+    )
+    return target_cursor.fetchall()
+
+
+def snapshot_key(source_cursor, last_id):
+    """Largest keyset key among da_id <= last_id: the watermark incremental runs resume from after a swap."""
+    source_cursor.execute(f"SELECT MAX({ACTIVITY_KEY}) FROM ss_daily_activity WHERE da_id <= %s", (last_id,))
+    last_ts = source_cursor.fetchone()[0]
+    if last_ts is None:
+        return None, last_id
+    source_cursor.execute(
+        f"SELECT MAX(da_id) FROM ss_daily_activity WHERE {ACTIVITY_KEY} = %s AND da_id <= %s", (last_ts, last_id)
+    )
+    return last_ts, source_cursor.fetchone()[0]
 
-    # Prepare insert for missing parent daily_activities (auto-create)
-    daily_insert_query = """
-        INSERT INTO daily_activities (
-            daily_activity_id, project_code, activity_date, priority,
-            start_time, end_time, created_by, created_at,
-            updated_at, activity_type, description,
-            activity_duration_minutes, user_id
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+
+def validate_shadow(source_cursor, target_cursor, shadow, id_range, clocking_inserted):
+    """Row-count checks before the swap; returns a list of problems (empty means safe to swap)."""
+    problems = []
+    source_cursor.execute("SELECT COUNT(*) FROM ss_daily_activity WHERE da_id >= %s AND da_id < %s", id_range)
+    source_count = source_cursor.fetchone()[0]
+    target_cursor.execute(f"SELECT COUNT(*) FROM {shadow[DAILY_TABLE]}")
+    daily_count = target_cursor.fetchone()[0]
+    target_cursor.execute(f"SELECT COUNT(*), COUNT(DISTINCT daily_activity_id) FROM {shadow[CLOCKING_TABLE]}")
+    clocking_count, clocked_daily = target_cursor.fetchone()
+
+    print(
+        f"🔎 Shadow check — source rows: {source_count}, daily: {daily_count}, "
+        f"clocking: {clocking_count} (run inserted {clocking_inserted}), daily with clocking: {clocked_daily}"
+    )
+    if daily_count != source_count:
+        problems.append(f"{shadow[DAILY_TABLE]} has {daily_count} rows, source has {source_count}")
+    if clocking_count != clocking_inserted:
+        problems.append(f"{shadow[CLOCKING_TABLE]} has {clocking_count} rows, the run inserted {clocking_inserted}")
+    # Every source row yields at least one clocking row (JSON entries or the fallback)
+    if clocked_daily != daily_count:
+        problems.append(f"{daily_count - clocked_daily} daily activities have no clocking rows")
+    return problems
+
+
+def swap_tables(target_cursor, live_tables, shadow, lock_wait_timeout=5, attempts=3):
+    """Swap every shadow table in with a single atomic RENAME TABLE.
+
+    RENAME needs a brief metadata lock; a short lock_wait_timeout makes it
+    give up (and retry) instead of queueing report queries behind it while a
+    long-running reader holds the old table.
     """
+    renames = []
+    for table in live_tables:
+        renames.append(f"`{table}` TO `{table}{OLD_SUFFIX}`")
+        renames.append(f"`{shadow[table]}` TO `{table}`")
+    for table in reversed(live_tables):
+        target_cursor.execute(f"DROP TABLE IF EXISTS `{table}{OLD_SUFFIX}`")
+    target_cursor.execute(f"SET SESSION lock_wait_timeout = {int(lock_wait_timeout)}")
+    for attempt in range(1, attempts + 1):
+        try:
+            target_cursor.execute("RENAME TABLE " + ", ".join(renames))
+            return
+        except mysql.connector.Error as exc:
+            if attempt == attempts:
+                raise
+            print(f"⚠️ Swap attempt {attempt} failed ({exc}); retrying.")
+            time.sleep(attempt)
+
+
+def rebuild_via_shadow(batch_size: int = 1000, chunk_size: int = 1000, backfill_chunk_size: int = 10000, bulk: bool = False,
+                       transform_workers: int = 0, keep_old: bool = False, lock_wait_timeout: int = 5,
+                       metrics_json: str = None, record_run: bool = False):
+    """Full rebuild without touching the live tables until one atomic swap.
+
+    Loads daily/clocking activities into ``<table>__shadow`` copies with
+    secondary indexes dropped, rebuilds indexes and FKs once, validates row
+    counts and only then swaps them in with a single RENAME TABLE. Readers
+    see either the old or the new tables, never a partial load. On any
+    failure the live tables are untouched and the shadows are left for
+    inspection.
+    """
+    config = {
+        "host": "localhost",
+        "user": "root",
+        "password": ""  # Adjust with your credentials if needed
+    }
+    live_tables = [DAILY_TABLE, CLOCKING_TABLE]  # parents first
+    shadow = {table: table + SHADOW_SUFFIX for table in live_tables}
 
-    inserted_total = 0
-    inserted_from_json = 0
-    inserted_from_fallback = 0
-    skipped_count = 0
-    category_fixed_count = 0
-    max_updated_at = None
-    max_id = None
-
-    for row in rows:
-        da_id = row["da_id"]
+    source_db = connect_db(**config, db="system-smartpro")
+    target_db = connect_db(**config, db="clocking_reports")
+    source_cursor = source_db.cursor()
+    target_cursor = target_db.cursor()
+    try:
+        outside = external_references(target_cursor, live_tables)
+        if outside:
+            raise RuntimeError(
+                "Cannot swap: " + ", ".join(f"{table} references {ref}" for table, ref in outside)
+            )
+        foreign_keys = {table: load_foreign_keys(target_cursor, table) for table in live_tables}
+
+        # Pin the rebuild to the rows that exist now; later rows are picked up by incremental runs
+        source_cursor.execute("SELECT MIN(da_id), MAX(da_id) FROM ss_daily_activity")
+        first_id, last_id = source_cursor.fetchone()
+        id_range = (first_id or 0, (last_id or 0) + 1)
+        watermark = snapshot_key(source_cursor, last_id or 0)
+        source_db.commit()
+        print(f"📸 Rebuilding da_id {id_range[0]}..{id_range[1] - 1} into shadow tables")
+
+        for table in reversed(live_tables):
+            target_cursor.execute(f"DROP TABLE IF EXISTS `{shadow[table]}`")
+        index_clauses = {}
+        for table in live_tables:
+            target_cursor.execute(f"CREATE TABLE `{shadow[table]}` LIKE `{table}`")
+            index_clauses[table] = drop_secondary_indexes(target_cursor, shadow[table])
+
+        migrate_daily_activity(
+            mode="full", batch_size=batch_size, chunk_size=chunk_size, bulk=bulk, id_range=id_range,
+            daily_table=shadow[DAILY_TABLE], metrics_json=metrics_json, record_run=record_run,
+        )
+        clocking = migrate_clocking_activities(
+            mode="full", batch_size=batch_size, chunk_size=chunk_size, id_range=id_range,
+            backfill_chunk_size=backfill_chunk_size, bulk=bulk, transform_workers=transform_workers,
+            daily_table=shadow[DAILY_TABLE], clocking_table=shadow[CLOCKING_TABLE],
+            metrics_json=metrics_json, record_run=record_run, rollup=False,
+        )
 
-        # Normalize da_clocking: treat None/empty string/'null' as empty list
-        da_clocking_raw = row.get("da_clocking")
-        if da_clocking_raw is None or str(da_clocking_raw).strip() in ("", "null", "NULL"):
-            da_clocking = []
+        print("🧱 Building indexes and foreign keys on the shadow tables...")
+        for table in live_tables:
+            clauses = index_clauses[table] + [foreign_key_clause(key, shadow) for key in foreign_keys[table]]
+            rebuild_indexes(target_cursor, shadow[table], clauses)
+
+        problems = validate_shadow(source_cursor, target_cursor, shadow, id_range, clocking["counts"]["inserted"])
+        if problems:
+            raise RuntimeError("Shadow validation failed: " + "; ".join(problems))
+
+        swap_tables(target_cursor, live_tables, shadow, lock_wait_timeout)
+        print("🔀 Shadow tables swapped in.")
+        for job_name in (DAILY_JOB_NAME, CLOCKING_JOB_NAME):
+            update_watermark(target_cursor, target_db, job_name, *watermark)
+        # The shadow table was backfilled in full before the swap
+        update_watermark(target_cursor, target_db, BACKFILL_JOB_NAME, None, get_max_activity_id(target_cursor))
+        # activity_ids were reassigned by the rebuild, so the rollups are recomputed, not folded
+        rolled_up = rebuild_rollups(target_cursor, target_db)
+        print(f"📊 Rollups rebuilt over {rolled_up} activity ids.")
+        if not keep_old:
+            for table in reversed(live_tables):
+                target_cursor.execute(f"DROP TABLE IF EXISTS `{table}{OLD_SUFFIX}`")
         else:
-            try:
-                # If stored as JSON string, parse; if already list/dict, keep
-                da_clocking = (
-                    json.loads(da_clocking_raw)
-                    if isinstance(da_clocking_raw, str)
-                    else da_clocking_raw
-                )
-                if da_clocking is None:
-                    da_clocking = []
-            except json.JSONDecodeError:
-                # Fall back to empty list on invalid JSON
-                da_clocking = []
-
-        # Track maxima
-        upd = row.get("da_updated_date") or row.get("da_created_date")
-        try:
-            if isinstance(upd, datetime):
-                max_updated_at = upd if (max_updated_at is None or upd > max_updated_at) else max_updated_at
-            max_id = da_id if (max_id is None or (da_id is not None and da_id > max_id)) else max_id
-        except Exception:
-            pass
+            print(f"ℹ️ Previous tables kept as {', '.join(table + OLD_SUFFIX for table in live_tables)}.")
+    except Exception as exc:
+        print(f"❌ Shadow rebuild aborted; live tables untouched: {exc}")
+        raise
+    finally:
+        source_cursor.close()
+        target_cursor.close()
+        source_db.close()
+        target_db.close()
+
+
+class SyncContext:
+    """Connections and preloaded ID caches kept alive across daemon cycles.
+
+    The large ID sets are loaded once and then kept current by the jobs
+    themselves (they add every id they insert). The small lookup maps are
+    re-read every ``refresh_seconds``, so newly migrated users, categories and
+    placeholder users are picked up.
+    """
 
-        # Ensure parent daily_activities exists; auto-create minimal row if missing
-        if da_id not in existing_daily_ids:
-            # Try map user via id_key -> placeholder email
-            id_key = None
+    def __init__(self, config, refresh_seconds=60):
+        self.config = config
+        self.refresh_seconds = refresh_seconds
+        self.source_db = None
+        self.target_db = None
+        self.connect()
+
+    def connect(self):
+        self.close()
+        self.source_db = connect_db(**self.config, db="system-smartpro")
+        self.target_db = connect_db(**self.config, db="clocking_reports")
+        target_cursor = self.target_db.cursor()
+        ensure_migration_state_table(target_cursor)
+        self.existing_daily_ids = load_existing_daily_ids(target_cursor)
+        self.daily_ids_with_clockings = load_daily_ids_with_clockings(target_cursor)
+        target_cursor.close()
+        self.refresh_lookups(force=True)
+        print(
+            f"🔌 Daemon caches loaded: {len(self.existing_daily_ids)} daily ids, "
+            f"{len(self.daily_ids_with_clockings)} daily ids with clockings."
+        )
+
+    def refresh_lookups(self, force=False):
+        if not force and time.monotonic() - self.refreshed_at < self.refresh_seconds:
+            return
+        source_cursor = self.source_db.cursor()
+        target_cursor = self.target_db.cursor()
+        self.user_id_by_key = load_user_id_map(source_cursor)
+        self.valid_category_ids = load_valid_category_ids(target_cursor)
+        self.user_id_by_id_key = load_placeholder_user_ids(target_cursor)
+        source_cursor.close()
+        target_cursor.close()
+        self.refreshed_at = time.monotonic()
+
+    def source_marker(self):
+        """Cheap change probe: MAX() on indexed columns, no scan of the delta itself."""
+        # End the previous read snapshot (REPEATABLE READ) so newly committed rows are visible
+        self.source_db.commit()
+        cursor = self.source_db.cursor()
+        cursor.execute("SELECT MAX(da_updated_date), MAX(da_created_date), MAX(da_id) FROM ss_daily_activity")
+        marker = cursor.fetchall()[0]
+        cursor.close()
+        self.source_db.commit()
+        return marker
+
+    def close(self):
+        for db in (self.source_db, self.target_db):
             try:
-                da_data_raw = row.get("da_data")
-                if da_data_raw:
-                    da_json = json.loads(da_data_raw) if isinstance(da_data_raw, str) else da_data_raw
-                    if isinstance(da_json, dict):
-                        id_key = da_json.get("id_key")
-            except json.JSONDecodeError:
-                id_key = None
-            user_id = get_target_user_id_from_id_key(target_cursor, id_key)
-            if not dry_run:
-                target_cursor.execute(
-                    daily_insert_query,
-                    (
-                        da_id,
-                        row.get("da_project_code"),
-                        row.get("da_date"),
-                        map_priority(row.get("da_priority")),
-                        row.get("da_start_tm"),
-                        row.get("da_end_tm"),
-                        row.get("da_created_by"),
-                        row.get("da_created_date"),
-                        row.get("da_updated_date"),
-                        row.get("da_activity"),
-                        row.get("da_keterangan"),
-                        row.get("da_duration"),
-                        user_id,
-                    ),
-                )
-            # Update local set to avoid double counting even in dry-run
-            existing_daily_ids.add(da_id)
-
-        if isinstance(da_clocking, list) and len(da_clocking) > 0:
-            for entry in da_clocking:
-                task_id = entry.get("task_id")
-                activity = entry.get("activity")
-                duration = entry.get("duration")
-                start_date = entry.get("start_date")
-                start_time = entry.get("start_time")
-                end_date = entry.get("end_date")
-                end_time = entry.get("end_time")
-                # If duration missing, try compute from start/end
-                if duration is None:
-                    duration = compute_diff_minutes(start_date, start_time, end_date, end_time)
-                # If task_id missing, try mapping from activity label
-                if task_id is None and activity:
-                    task_id = TASK_ID_MAP.get(str(activity).strip().lower())
-                # Leave task_id as None (NULL) if no mapping
-                # Prefer explicit category_id; otherwise fall back to task_id; else default
-                category_id = (
-                    entry.get("category_id")
-                    if entry.get("category_id") is not None
-                    else (entry.get("task_id") if entry.get("task_id") is not None else DEFAULT_CATEGORY_ID)
-                )
+                if db is not None:
+                    db.close()
+            except Exception:
+                pass
 
-                # Guard against invalid category ids
-                if category_id not in valid_category_ids:
-                    category_id = DEFAULT_CATEGORY_ID
-                    category_fixed_count += 1
 
-                if not dry_run:
-                    target_cursor.execute(insert_query, (
-                        da_id,
-                        task_id,
-                        activity,
-                        duration,
-                        start_date,
-                        start_time,
-                        end_date,
-                        end_time,
-                        category_id,
-                    ))
-                inserted_total += 1
-                inserted_from_json += 1
-        else:
-            # Fallback: build a single clocking activity record from ss_daily_activity columns
-            # This reduces skipped rows and creates usable data even without JSON
-            activity_desc = row.get("da_activity") or None
-            duration_minutes = row.get("da_duration") or None
-
-            # Extract date/time parts from timestamps (if present)
-            start_ts = row.get("da_start_tm")
-            end_ts = row.get("da_end_tm")
-
-            def split_dt(ts):
-                if ts is None:
-                    return None, None
-                if isinstance(ts, datetime):
-                    return ts.date().isoformat(), ts.time().isoformat()
-                # If ts is a string, try to parse
-                try:
-                    parsed = datetime.fromisoformat(str(ts))
-                    return parsed.date().isoformat(), parsed.time().isoformat()
-                except ValueError:
-                    return None, None
-
-            start_date, start_time = split_dt(start_ts)
-            end_date, end_time = split_dt(end_ts)
-
-            # If duration missing, compute from start/end
-            if duration_minutes is None:
-                duration_minutes = compute_diff_minutes(start_date, start_time, end_date, end_time)
-            # Fallback to 0 if still None (ensure non-null)
-            if duration_minutes is None:
-                duration_minutes = 0
-
-            # Only insert fallback if this daily_activity_id has no existing clocking entries
-            if da_id not in daily_ids_with_clockings:
-                if not dry_run:
-                    target_cursor.execute(insert_query, (
-                        da_id,
-                        None,  # task_id unknown when no JSON
-                        activity_desc,
-                        duration_minutes,
-                        start_date,
-                        start_time,
-                        end_date,
-                        end_time,
-                        DEFAULT_CATEGORY_ID,  # use default category
-                    ))
-                inserted_total += 1
-                inserted_from_fallback += 1
-                daily_ids_with_clockings.add(da_id)
+def fetched_rows(report):
+    return report["stages"].get("fetch", {}).get("rows", 0)
 
-    if not dry_run:
-        target_db.commit()
-    print(
-        f"✅ Inserted: {inserted_total} clocking activity records. "
-        f"(JSON: {inserted_from_json}, Fallback: {inserted_from_fallback}, "
-        f"Category fixed: {category_fixed_count})"
-    )
-    print(f"⚠️ Skipped: {skipped_count} records due to insufficient data.")
-
-    # Jalankan backfill setelah migrasi untuk merapikan kolom
-    if not dry_run:
-        backfill_clocking_fields(target_cursor, target_db)
-
-    # Verifikasi singkat
-    if not dry_run:
-        target_cursor.execute("SELECT COUNT(*) FROM clocking_activities WHERE task_id=0")
-        task_zero = target_cursor.fetchone()[0]
-        target_cursor.execute("SELECT COUNT(*) FROM clocking_activities WHERE task_id IS NULL")
-        task_null = target_cursor.fetchone()[0]
-        target_cursor.execute("SELECT COUNT(*) FROM clocking_activities WHERE duration_minutes IS NULL")
-        duration_null = target_cursor.fetchone()[0]
-        print(f"🔎 Backfill check — task_id=0: {task_zero}, task_id NULL: {task_null}, duration NULL: {duration_null}")
-
-    # Update watermark if running incremental and not dry-run
-    if (mode == "incremental" or effective_since) and not dry_run:
-        update_watermark(target_cursor, target_db, "ss_daily_activity", max_updated_at, max_id)
-
-    source_cursor.close()
-    target_cursor.close()
-    source_db.close()
-    target_db.close()
+
+def run_daemon(limit: int = 5000, batch_size: int = 1000, chunk_size: int = 1000, min_interval: float = 2.0, max_interval: float = 60.0,
+               refresh_seconds: int = 60, transform_workers: int = 0, metrics_json: str = None, record_run: bool = False):
+    """Continuously sync daily and clocking activities from the stored watermarks.
+
+    Polls the source every ``min_interval`` seconds, backing off to
+    ``max_interval`` while idle and polling again immediately when a cycle hit
+    ``limit`` (more rows are waiting). SIGTERM/SIGINT stop the loop after the
+    current cycle, which always ends with its last page committed.
+    """
+    config = {
+        "host": "localhost",
+        "user": "root",
+        "password": ""  # Adjust with your credentials if needed
+    }
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"🛑 Signal {signum} received; stopping after the current batch.")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    context = SyncContext(config, refresh_seconds=refresh_seconds)
+    options = {
+        "mode": "incremental", "limit": limit, "batch_size": batch_size, "chunk_size": chunk_size,
+        "metrics_json": metrics_json, "record_run": record_run, "context": context,
+    }
+    last_marker = None
+    interval = min_interval
+    print(f"👀 Daemon started (limit={limit}, interval={min_interval}-{max_interval}s)")
+    while not stop.is_set():
+        try:
+            marker = context.source_marker()
+            if marker == last_marker:
+                interval = min(max_interval, max(interval, min_interval) * 2)
+            else:
+                context.refresh_lookups()
+                daily = migrate_daily_activity(**options)
+                clocking = migrate_clocking_activities(**options, transform_workers=transform_workers)
+                if max(fetched_rows(daily), fetched_rows(clocking)) >= limit:
+                    interval = 0  # backlog left; keep going without waiting
+                else:
+                    last_marker = marker
+                    interval = min_interval
+        except Exception as exc:
+            # Caches may hold ids of a batch that was rolled back: reconnect and reload everything
+            print(f"⚠️ Daemon cycle failed: {exc}. Reconnecting in {max(interval, min_interval):.0f}s.")
+            last_marker = None
+            interval = min(max_interval, max(interval, min_interval) * 2)
+            if stop.wait(interval):
+                break
+            try:
+                context.connect()
+            except Exception as reconnect_exc:
+                print(f"⚠️ Reconnect failed: {reconnect_exc}")
+            continue
+        stop.wait(interval)
+    context.close()
+    print("👋 Daemon stopped.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Migrate daily and clocking activities with incremental support")
@@ -583,8 +1673,70 @@ if __name__ == "__main__":
     parser.add_argument("--since", type=str, default=None, help="Process records updated/created since this DATETIME (YYYY-MM-DD[ HH:MM:SS])")
     parser.add_argument("--limit", type=int, default=None, help="Limit number of source rows to process")
     parser.add_argument("--dry-run", action="store_true", help="Do not insert/update; only compute and print counts")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per multi-row INSERT (1 = legacy row-by-row writes)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched from the source per round trip")
+    parser.add_argument("--backfill-chunk-size", type=int, default=10000, help="activity_id window per backfill UPDATE/commit")
+    parser.add_argument("--bulk", action="store_true", help="With --mode full: stage rows to TSV and LOAD DATA LOCAL INFILE them")
+    parser.add_argument("--transform-workers", type=int, default=0, help="Processes for the JSON/time transform pipeline (0/1 = serial)")
+    parser.add_argument("--metrics-json", type=str, default=None, help="Append the JSON run reports to this file ('-' for stdout)")
+    parser.add_argument("--record-run", action="store_true", help="Also append the run reports to migration_runs")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and sync new rows continuously (incremental only)")
+    parser.add_argument("--min-interval", type=float, default=2.0, help="Daemon: poll interval while rows keep arriving (seconds)")
+    parser.add_argument("--max-interval", type=float, default=60.0, help="Daemon: longest idle poll interval (seconds)")
+    parser.add_argument("--refresh-seconds", type=int, default=60, help="Daemon: how often user/category lookups are re-read")
+    parser.add_argument("--shadow", action="store_true", help="With --mode full: load into shadow tables and swap them in atomically")
+    parser.add_argument("--keep-old", action="store_true", help="Shadow: keep the replaced tables as <table>__old")
+    parser.add_argument("--lock-wait-timeout", type=int, default=5, help="Shadow: seconds the RENAME may wait for readers per attempt")
+    parser.add_argument("--commit-rows", type=int, default=10000, help="Commit after this many written rows (at a page boundary)")
+    parser.add_argument("--commit-seconds", type=float, default=5.0, help="...or after this many seconds, whichever comes first")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries (with backoff) for a batch hit by a deadlock/lock-wait timeout")
+    parser.add_argument("--fk-mode", choices=["preload", "staging"], default="preload",
+                        help="staging: check FKs in MySQL via TEMPORARY staging tables and anti-joins instead of Python preloads")
+    parser.add_argument("--snapshot", type=str, default=None, help="Replay from a migration_snapshot.py directory instead of the source DB")
+    parser.add_argument("--target", type=str, default=None,
+                        help="Snapshot: scratch database to replay into (reset first; never the live clocking_reports)")
     args = parser.parse_args()
 
-    print(f"🚀 Running migration (mode={args.mode}, since={args.since}, limit={args.limit}, dry_run={args.dry_run})")
-    migrate_daily_activity(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run)
-    migrate_clocking_activities(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run)
+    if args.snapshot and (args.daemon or args.shadow or args.since):
+        parser.error("--snapshot replays a fixed extract: drop --daemon/--shadow/--since")
+    if args.snapshot and (not args.target or args.target == LIVE_DB):
+        parser.error(f"--snapshot replays in full mode: pass --target <scratch db> (not {LIVE_DB})")
+    if args.target and not args.snapshot:
+        parser.error("--target is only used with --snapshot")
+    if args.snapshot:
+        prepare_replay_target(args.target)
+    if args.shadow:
+        if args.mode != "full" or args.daemon or args.dry_run or args.since or args.limit:
+            parser.error("--shadow rebuilds everything: use it with --mode full and without --daemon/--dry-run/--since/--limit")
+        rebuild_via_shadow(
+            batch_size=args.batch_size, chunk_size=args.chunk_size, backfill_chunk_size=args.backfill_chunk_size,
+            bulk=args.bulk, transform_workers=args.transform_workers, keep_old=args.keep_old,
+            lock_wait_timeout=args.lock_wait_timeout, metrics_json=args.metrics_json, record_run=args.record_run,
+        )
+        raise SystemExit(0)
+
+    if args.daemon:
+        if args.dry_run or args.bulk or args.mode == "full" or args.since:
+            parser.error("--daemon runs incremental from the stored watermark; drop --dry-run/--bulk/--mode full/--since")
+        run_daemon(
+            limit=args.limit or 5000, batch_size=args.batch_size, chunk_size=args.chunk_size,
+            min_interval=args.min_interval, max_interval=args.max_interval, refresh_seconds=args.refresh_seconds,
+            transform_workers=args.transform_workers, metrics_json=args.metrics_json, record_run=args.record_run,
+        )
+        raise SystemExit(0)
+
+    print(f"🚀 Running migration (mode={args.mode}, since={args.since}, limit={args.limit}, dry_run={args.dry_run}, batch_size={args.batch_size}, chunk_size={args.chunk_size}, bulk={args.bulk})")
+    migrate_daily_activity(
+        mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run,
+        batch_size=args.batch_size, chunk_size=args.chunk_size, bulk=args.bulk,
+        metrics_json=args.metrics_json, record_run=args.record_run, snapshot=args.snapshot, target=args.target or LIVE_DB,
+        commit_rows=args.commit_rows, commit_seconds=args.commit_seconds, max_retries=args.max_retries,
+    )
+    migrate_clocking_activities(
+        mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run,
+        batch_size=args.batch_size, chunk_size=args.chunk_size, backfill_chunk_size=args.backfill_chunk_size,
+        bulk=args.bulk, transform_workers=args.transform_workers,
+        metrics_json=args.metrics_json, record_run=args.record_run, snapshot=args.snapshot, target=args.target or LIVE_DB,
+        commit_rows=args.commit_rows, commit_seconds=args.commit_seconds, max_retries=args.max_retries,
+        fk_mode=args.fk_mode,
+    )
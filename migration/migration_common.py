@@ -0,0 +1,797 @@
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class BatchWriter:
+    """Buffer rows for one INSERT statement and flush them with executemany.
+
+    mysql-connector rewrites ``executemany`` on a plain ``INSERT ... VALUES``
+    into a single multi-row INSERT, so one flush costs one round trip instead
+    of one per row; ``affected_rows`` sums the server's affected-row counts.
+    A ``parent`` writer is flushed first so FK parents (e.g.
+    auto-created daily_activities) always land before their children. With
+    ``metrics`` set, each flush is timed as ``stage`` of that RunMetrics.
+    """
+
+    method = "executemany"
+
+    def __init__(self, cursor, query, batch_size=1000, parent=None, metrics=None, stage="insert", transaction=None):
+        self.cursor = cursor
+        self.query = query
+        self.batch_size = max(1, int(batch_size or 1))
+        self.parent = parent
+        self.metrics = metrics
+        self.stage = stage
+        self.transaction = transaction
+        self.buffer = []
+        self.rows_written = 0
+        self.affected_rows = 0
+        self.flushes = 0
+
+    def add(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.parent is not None:
+            self.parent.flush()
+        if not self.buffer:
+            return 0
+        count = len(self.buffer)
+        if self.metrics is not None:
+            with self.metrics.stage(self.stage, rows=count):
+                self._write()
+        else:
+            self._write()
+        self.rows_written += count
+        self.flushes += 1
+        self.buffer = []
+        return count
+
+    def _write(self):
+        many = len(self.buffer) > 1
+        params = self.buffer if many else self.buffer[0]
+        if self.transaction is not None:
+            # Journaled so a deadlock replays the whole open transaction, this batch included
+            rowcount = self.transaction.execute(self.query, params, rows=len(self.buffer), many=many)
+        elif many:
+            self.cursor.executemany(self.query, params)
+            rowcount = self.cursor.rowcount
+        else:
+            self.cursor.execute(self.query, params)
+            rowcount = self.cursor.rowcount
+        # For INSERT ... ON DUPLICATE KEY UPDATE: 1 per new row, 2 per changed row, 0 per unchanged row
+        self.affected_rows += max(0, rowcount or 0)
+
+
+class UpsertWriter(BatchWriter):
+    """BatchWriter for ``INSERT ... ON DUPLICATE KEY UPDATE`` that counts inserted, updated and unchanged rows.
+
+    The counts come from the server's affected rows alone (1 per insert,
+    2 per changed row, 0 per unchanged row), see ``upsert_outcomes``; no key
+    is probed or preloaded. With ``dry_run`` nothing is sent and every row
+    counts as updated.
+    """
+
+    def __init__(self, cursor, query, batch_size=1000, dry_run=False, **kwargs):
+        super().__init__(cursor, query, batch_size, **kwargs)
+        self.dry_run = dry_run
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    def _write(self):
+        if self.dry_run:
+            self.updated += len(self.buffer)
+            return
+        before = self.affected_rows
+        super()._write()
+        inserted, updated, unchanged = upsert_outcomes(self.affected_rows - before, len(self.buffer))
+        self.inserted += inserted
+        self.updated += updated
+        self.unchanged += unchanged
+
+
+# ER_LOCK_DEADLOCK rolls back the whole transaction; ER_LOCK_WAIT_TIMEOUT is treated the same way
+RETRYABLE_ERRNOS = (1213, 1205)
+
+
+class LeaseLost(RuntimeError):
+    """Raised when a WriteTransaction's fence refuses the commit (the writer no longer owns its work)."""
+
+
+class WriteTransaction:
+    """Group writes into transactions committed every ``commit_rows`` rows or ``commit_seconds``.
+
+    Every statement since the last commit is journaled. On a deadlock or
+    lock-wait timeout the transaction is rolled back and the journal is
+    replayed after a jittered exponential backoff, so a conflict costs one
+    commit window instead of the whole run. Committing often also keeps the
+    undo log short while the reports keep reading the same tables.
+    Callers commit at points where the committed state is consistent (e.g.
+    together with the page's watermark), which makes each window idempotent.
+    An optional ``fence(cursor) -> bool`` runs inside the transaction right
+    before every commit; if it fails the window is rolled back and LeaseLost
+    is raised, so a writer that lost its lease can never commit.
+    """
+
+    def __init__(self, db, cursor, commit_rows=10000, commit_seconds=5.0, retries=5, backoff=0.2, metrics=None,
+                 fence=None):
+        self.db = db
+        self.cursor = cursor
+        self.commit_rows = max(1, int(commit_rows or 1))
+        self.commit_seconds = commit_seconds
+        self.retries = max(0, int(retries or 0))
+        self.backoff = backoff
+        self.metrics = metrics
+        self.fence = fence
+        self.journal = []
+        self.pending_rows = 0
+        self.opened_at = time.monotonic()
+        self.commits = 0
+        self.retried = 0
+
+    def execute(self, query, params=None, rows=1, many=False):
+        """Run (and journal) one statement; returns its rowcount."""
+        entry = (query, params, many)
+        self.journal.append(entry)
+        self.pending_rows += rows
+        return self._with_retry(lambda: self._apply(*entry), self._replay)
+
+    def due(self):
+        if not self.journal:
+            return False
+        if self.pending_rows >= self.commit_rows:
+            return True
+        return bool(self.commit_seconds) and time.monotonic() - self.opened_at >= self.commit_seconds
+
+    def maybe_commit(self):
+        if self.due():
+            self.commit()
+            return True
+        return False
+
+    def commit(self):
+        if self.metrics is not None:
+            with self.metrics.stage("commit"):
+                self._commit()
+        else:
+            self._commit()
+
+    def _commit(self):
+        self._with_retry(self._fenced_commit, lambda: (self._replay(), self._fenced_commit()))
+        self.journal = []
+        self.pending_rows = 0
+        self.opened_at = time.monotonic()
+        self.commits += 1
+
+    def _fenced_commit(self):
+        if self.fence is not None and not self.fence(self.cursor):
+            self.db.rollback()
+            dropped = len(self.journal)
+            self.journal = []
+            self.pending_rows = 0
+            raise LeaseLost(f"Fence rejected the commit; rolled back {dropped} statements")
+        self.db.commit()
+
+    def _apply(self, query, params, many):
+        if many:
+            self.cursor.executemany(query, params)
+        else:
+            self.cursor.execute(query, params)
+        return self.cursor.rowcount
+
+    def _replay(self):
+        rowcount = 0
+        for entry in self.journal:
+            rowcount = self._apply(*entry)
+        return rowcount
+
+    def _with_retry(self, action, recover):
+        attempt = 0
+        while True:
+            try:
+                return action() if attempt == 0 else recover()
+            except Exception as exc:
+                if getattr(exc, "errno", None) not in RETRYABLE_ERRNOS or attempt >= self.retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+                # Jitter keeps two conflicting writers from retrying in lockstep
+                delay = self.backoff * 2 ** (attempt - 1) * (1 + random.random())
+                print(
+                    f"⚠️ {exc} — retry {attempt}/{self.retries} in {delay:.2f}s "
+                    f"(replaying {len(self.journal)} statements)"
+                )
+                try:
+                    self.db.rollback()
+                except Exception:
+                    pass
+                time.sleep(delay)
+
+
+def acquire_lock(cursor, name, timeout=60):
+    """Take the MySQL named lock ``name`` for this session (MySQL also drops it on disconnect).
+
+    Raises RuntimeError if another session still holds it after ``timeout`` seconds.
+    """
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (name, timeout))
+    row = cursor.fetchone()
+    if not row or row[0] != 1:
+        raise RuntimeError(f"Lock '{name}' is held by another session after {timeout}s")
+
+
+def release_lock(cursor, name):
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+    cursor.fetchone()
+
+
+class Throughput:
+    """Wall-clock timer used to report rows/sec at the end of a job."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self, label, rows):
+        elapsed = self.elapsed()
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        print(f"⏱️ {label}: {rows} rows in {elapsed:.2f}s ({rate:.1f} rows/sec)")
+        return rate
+
+
+def tsv_field(value):
+    """Encode one value in LOAD DATA's default format (\\N for NULL, backslash escapes)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (date, dt_time, timedelta)):
+        return str(value)
+    text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\0", "\\0")
+    )
+
+
+class TsvStager:
+    """Drop-in for BatchWriter that streams rows to a temporary TSV file.
+
+    Rows go straight to disk as they are added, so nothing accumulates in
+    memory; ``load`` then pushes the whole file with LOAD DATA LOCAL INFILE
+    (the connection needs ``allow_local_infile=True``).
+    """
+
+    method = "LOAD DATA"
+    batch_size = 0  # no per-batch flushes: the whole file is loaded once
+
+    def __init__(self, table, columns, directory=None):
+        self.table = table
+        self.columns = columns
+        self.file = tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", newline="\n", suffix=f".{table}.tsv", dir=directory, delete=False
+        )
+        self.path = self.file.name
+        self.rows_written = 0
+        self.flushes = 0
+
+    def add(self, row):
+        self.file.write("\t".join(tsv_field(value) for value in row) + "\n")
+        self.rows_written += 1
+
+    def flush(self):
+        self.file.flush()
+        return 0
+
+    def load(self, cursor):
+        self.file.close()
+        try:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE `{self.table}` CHARACTER SET utf8mb4 "
+                f"({', '.join(self.columns)})",
+                (self.path,),
+            )
+            self.flushes += 1
+            return cursor.rowcount
+        finally:
+            self.discard()
+
+    def discard(self):
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def drop_secondary_indexes(cursor, table):
+    """Drop non-unique secondary indexes of ``table``; returns ADD clauses to rebuild them.
+
+    Only for tables nobody reads yet (shadow copies, empty targets). Unique
+    indexes stay, and with unique_checks left on a duplicate key is still
+    rejected during the load (LOAD DATA LOCAL skips it with a warning).
+    Indexes MySQL refuses to drop (they back a foreign key) are kept as well.
+    """
+    cursor.execute(
+        """
+        SELECT index_name, column_name, sub_part, index_type
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+          AND index_name <> 'PRIMARY' AND non_unique = 1
+        ORDER BY index_name, seq_in_index
+        """,
+        (table,),
+    )
+    indexes = {}
+    for name, column, sub_part, index_type in cursor.fetchall():
+        part = f"`{column}`({sub_part})" if sub_part else f"`{column}`"
+        indexes.setdefault(name, (index_type, []))[1].append(part)
+
+    rebuild = []
+    for name, (index_type, parts) in indexes.items():
+        kind = "FULLTEXT INDEX" if index_type == "FULLTEXT" else "INDEX"
+        clause = f"ADD {kind} `{name}` ({', '.join(parts)})"
+        try:
+            cursor.execute(f"ALTER TABLE `{table}` DROP INDEX `{name}`")
+        except Exception:
+            continue
+        print(f"🧱 Dropped {table}.{name} for bulk load (rebuild: ALTER TABLE `{table}` {clause})")
+        rebuild.append(clause)
+    return rebuild
+
+
+def rebuild_indexes(cursor, table, clauses):
+    if clauses:
+        # One ALTER builds every index in a single table pass
+        cursor.execute(f"ALTER TABLE `{table}` " + ", ".join(clauses))
+
+
+def table_is_empty(cursor, table):
+    cursor.execute(f"SELECT 1 FROM `{table}` LIMIT 1")
+    return not cursor.fetchall()
+
+
+def bulk_load(cursor, db, stagers):
+    """Load staged files in order; empty tables get their secondary indexes dropped and rebuilt once.
+
+    Tables that already hold rows keep their indexes: they are being read
+    (the live target), and rebuilding would rescan every existing row anyway.
+    """
+    tables = list(dict.fromkeys(stager.table for stager in stagers))
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    dropped = {}
+    loaded = {}
+    try:
+        for table in tables:
+            if table_is_empty(cursor, table):
+                dropped[table] = drop_secondary_indexes(cursor, table)
+        for stager in stagers:
+            loaded[stager.table] = loaded.get(stager.table, 0) + stager.load(cursor)
+        db.commit()
+    finally:
+        for stager in stagers:
+            stager.discard()
+        for table, clauses in dropped.items():
+            rebuild_indexes(cursor, table, clauses)
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+    return loaded
+
+
+class IntSet:
+    """Compact set of non-negative ints for large ID preloads (roaring-style).
+
+    Values are split on their high bits into 65536-wide containers. Sparse
+    containers are sorted ``array('H')`` (2 bytes per id); once a container
+    passes 4096 ids it becomes an 8 KB bitmap. Ten million dense ids take about
+    1.3 MB instead of the ~600 MB of a Python ``set``. Supports ``in``,
+    ``add`` and ``len``; anything that is not a non-negative int is never a member.
+    """
+
+    ARRAY_LIMIT = 4096
+
+    def __init__(self, values=()):
+        self._containers = {}
+        self._size = 0
+        for value in values:
+            self.add(value)
+
+    def add(self, value):
+        if value < 0:
+            raise ValueError(f"IntSet holds non-negative ints only, got {value}")
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            self._containers[high] = array("H", [low])
+            self._size += 1
+        elif isinstance(container, bytearray):
+            byte, bit = low >> 3, 1 << (low & 7)
+            if not container[byte] & bit:
+                container[byte] |= bit
+                self._size += 1
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                return
+            container.insert(index, low)
+            self._size += 1
+            if len(container) > self.ARRAY_LIMIT:
+                bitmap = bytearray(8192)
+                for item in container:
+                    bitmap[item >> 3] |= 1 << (item & 7)
+                self._containers[high] = bitmap
+
+    def __contains__(self, value):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)  # same answer a set of ints would give for 3.0
+        if not isinstance(value, int) or value < 0:
+            return False
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] & (1 << (low & 7)))
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __len__(self):
+        return self._size
+
+    def nbytes(self):
+        return sum(
+            len(container) if isinstance(container, bytearray) else container.itemsize * len(container)
+            for container in self._containers.values()
+        )
+
+
+def load_int_set(cursor, table, column, chunk_size=100000, distinct=False):
+    """Load ``column`` of ``table`` into an IntSet in keyset chunks, so neither the
+    driver nor Python ever holds the full column at once."""
+    select = "SELECT DISTINCT" if distinct else "SELECT"
+    values = IntSet()
+    last = None
+    while True:
+        if last is None:
+            cursor.execute(f"{select} {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column} LIMIT {int(chunk_size)}")
+        else:
+            cursor.execute(f"{select} {column} FROM {table} WHERE {column} > %s ORDER BY {column} LIMIT {int(chunk_size)}", (last,))
+        rows = cursor.fetchall()
+        for (value,) in rows:
+            values.add(value)
+        if len(rows) < chunk_size:
+            return values
+        last = rows[-1][0]
+
+
+def upsert_outcomes(affected_rows, rows):
+    """Split one upsert statement's affected rows into (inserted, updated, unchanged).
+
+    MySQL counts 1 per inserted row, 2 per changed row and 0 per unchanged
+    row, and a multi-row statement reports only the sum, so an insert plus
+    an unchanged row (1) looks like half a change. At least one affected row
+    per row means no row was unchanged (new or edited source rows, the
+    incremental case); fewer means as few inserts as the parity allows (a
+    re-run over mostly unchanged rows). Only batches mixing inserts with
+    unchanged rows are split approximately; the three always add up to ``rows``.
+    """
+    if affected_rows >= rows:
+        updated = min(affected_rows - rows, rows)
+        return rows - updated, updated, 0
+    inserted = affected_rows % 2
+    updated = affected_rows // 2
+    return inserted, updated, rows - inserted - updated
+
+
+def stream_rows(cursor, query, params=None, chunk_size=1000):
+    """Yield source rows chunk by chunk instead of materializing fetchall().
+
+    ``cursor`` must be unbuffered (the mysql-connector default) so rows stay
+    on the server until fetched. While the generator is live, the owning
+    connection cannot run other statements; use a separate connection for
+    lookups.
+    """
+    chunk_size = max(1, int(chunk_size or 1))
+    cursor.execute(query, params)
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        for row in chunk:
+            yield row
+
+
+def snapshot_encode(value):
+    """json.dumps default: tag the MySQL driver types plain JSON cannot hold."""
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, dt_time):
+        return {"$t": value.isoformat()}
+    if isinstance(value, timedelta):
+        return {"$td": value.total_seconds()}
+    if isinstance(value, Decimal):
+        return {"$dec": str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$b": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Cannot snapshot {type(value).__name__}")
+
+
+def snapshot_decode(obj):
+    """json.loads object_hook: restore the exact types the driver returned at extract time."""
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        if tag == "$dt":
+            return datetime.fromisoformat(value)
+        if tag == "$d":
+            return date.fromisoformat(value)
+        if tag == "$t":
+            return dt_time.fromisoformat(value)
+        if tag == "$td":
+            return timedelta(seconds=value)
+        if tag == "$dec":
+            return Decimal(value)
+        if tag == "$b":
+            return base64.b64decode(value)
+    return obj
+
+
+def write_snapshot(path, rows):
+    """Write dict rows as gzip-compressed JSON lines; returns the row count."""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as handle:
+        for row in rows:
+            handle.write(json.dumps(row, default=snapshot_encode, ensure_ascii=False, separators=(",", ":")))
+            handle.write("\n")
+            count += 1
+    return count
+
+
+def read_snapshot(path):
+    """Yield the dict rows of a snapshot file written by write_snapshot, in file order."""
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            yield json.loads(line, object_hook=snapshot_decode)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unknown."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except Exception:
+        return None
+
+
+def report_peak_rss(label):
+    peak = peak_rss_mb()
+    if peak is None:
+        print(f"📈 {label}: peak RSS unavailable on this platform")
+    else:
+        print(f"📈 {label}: peak RSS {peak:.1f} MB")
+    return peak
+
+
+class MeteredCursor:
+    """Cursor proxy that counts every execute/executemany as one round trip."""
+
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def execute(self, *args, **kwargs):
+        self._metrics.round_trip()
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._metrics.round_trip()
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class MeteredConnection:
+    """Connection proxy: cursors are metered and commit() counts as a round trip."""
+
+    def __init__(self, db, metrics):
+        self._db = db
+        self._metrics = metrics
+
+    def cursor(self, *args, **kwargs):
+        return MeteredCursor(self._db.cursor(*args, **kwargs), self._metrics)
+
+    def commit(self):
+        self._metrics.round_trip()
+        return self._db.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+class RunMetrics:
+    """Per-stage wall time, row counts and round trips for one migration run.
+
+    Wrap connections with ``connection()`` and time code with ``stage()``;
+    round trips are charged to the innermost stage active in the calling
+    thread (``other`` when none is). ``report()`` returns the JSON run report.
+    """
+
+    def __init__(self, job, options=None):
+        self.job = job
+        self.options = dict(options or {})
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counts = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _entry(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "rows": 0, "round_trips": 0})
+
+    def connection(self, db):
+        return MeteredConnection(db, self)
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """Time a block; nested stages are subtracted so stage times add up to the run."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        frame = [name, 0.0]
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                entry = self._entry(name)
+                entry["seconds"] += elapsed - frame[1]
+                entry["rows"] += rows
+
+    def add_rows(self, name, rows):
+        with self._lock:
+            self._entry(name)["rows"] += rows
+
+    def round_trip(self):
+        stack = getattr(self._local, "stack", None)
+        name = stack[-1][0] if stack else "other"
+        with self._lock:
+            self._entry(name)["round_trips"] += 1
+
+    def iterate(self, name, iterable, rows=None):
+        """Yield from ``iterable`` charging the time spent producing items to ``name``.
+
+        ``rows(item)`` gives the row count of one item (default 1, e.g. ``len`` for pages).
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            self.add_rows(name, rows(item) if rows else 1)
+            yield item
+
+    def count(self, **counts):
+        self.counts.update(counts)
+
+    def report(self):
+        if self.finished_at is None:
+            self.finished_at = datetime.now()
+        seconds = time.perf_counter() - self.started
+        stages = {}
+        for name, entry in self.stages.items():
+            stage_seconds = entry["seconds"]
+            stages[name] = {
+                "seconds": round(stage_seconds, 4),
+                "rows": entry["rows"],
+                "round_trips": entry["round_trips"],
+                "rows_per_sec": round(entry["rows"] / stage_seconds, 1) if entry["rows"] and stage_seconds > 0 else None,
+            }
+        return {
+            "job": self.job,
+            "started_at": self.started_at.isoformat(sep=" ", timespec="seconds"),
+            "finished_at": self.finished_at.isoformat(sep=" ", timespec="seconds"),
+            "seconds": round(seconds, 3),
+            "round_trips": sum(entry["round_trips"] for entry in self.stages.values()),
+            "peak_rss_mb": peak_rss_mb(),
+            "options": self.options,
+            "counts": self.counts,
+            "stages": stages,
+        }
+
+    def emit(self, path=None, target_cursor=None, target_db=None):
+        """Print a per-stage summary; write the JSON report to ``path`` ("-" for stdout)
+        and append it to ``migration_runs`` when a target cursor is given."""
+        report = self.report()
+        print(f"🧭 {self.job} stages ({report['seconds']:.2f}s, {report['round_trips']} round trips):")
+        for name, stage in sorted(report["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            rate = f", {stage['rows_per_sec']} rows/sec" if stage["rows_per_sec"] else ""
+            print(f"   {name:<12} {stage['seconds']:>9.3f}s  rows={stage['rows']}  round_trips={stage['round_trips']}{rate}")
+        payload = json.dumps(report, default=str)
+        if path == "-":
+            print(payload)
+        elif path:
+            # One JSON object per line so nightly runs can append to the same file
+            with open(path, "a", encoding="utf-8") as handle:
+                handle.write(payload + "\n")
+        if target_cursor is not None:
+            record_run(target_cursor, target_db, report)
+        return report
+
+
+def ensure_migration_runs_table(target_cursor):
+    target_cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS migration_runs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            job_name VARCHAR(128) NOT NULL,
+            started_at DATETIME NOT NULL,
+            finished_at DATETIME NOT NULL,
+            seconds DECIMAL(12, 3) NOT NULL,
+            round_trips BIGINT NOT NULL,
+            report JSON NOT NULL,
+            KEY idx_job_started (job_name, started_at)
+        )
+        """
+    )
+
+
+def record_run(target_cursor, target_db, report):
+    """Append a run report next to migration_state; best-effort, never fails the job."""
+    try:
+        ensure_migration_runs_table(target_cursor)
+        target_cursor.execute(
+            """
+            INSERT INTO migration_runs (job_name, started_at, finished_at, seconds, round_trips, report)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            (
+                report["job"], report["started_at"], report["finished_at"],
+                report["seconds"], report["round_trips"], json.dumps(report, default=str),
+            ),
+        )
+        target_db.commit()
+    except Exception as exc:
+        print(f"⚠️ Could not record run in migration_runs: {exc}")
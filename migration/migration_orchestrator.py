@@ -0,0 +1,120 @@
+import argparse
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from migration_user import migrate_users
+from migration_category_clocking import migrate_category_docking
+from migration_project import migrate_projects
+from migration_project_user import migrate_project_users
+from migration_clocking_activities import migrate_daily_activity, migrate_clocking_activities
+
+# Writer options only some jobs accept; the rest are dropped per job in run_job
+WRITER_OPTIONS = ("batch_size", "bulk", "snapshot", "target")
+
+# Job name -> (function, parents, accepted writer options). Parents follow the FK graph
+# of clocking_reports: a job starts as soon as every parent has finished.
+JOBS = {
+    "users": (migrate_users, [], ("batch_size", "target")),
+    "categories": (migrate_category_docking, [], ("batch_size", "target")),
+    "projects": (migrate_projects, [], ("batch_size", "target")),
+    "project_users": (migrate_project_users, ["users", "projects"], ("batch_size", "target")),
+    "daily_activities": (migrate_daily_activity, ["users"], ("batch_size", "bulk", "snapshot", "target")),
+    "clocking_activities": (migrate_clocking_activities, ["daily_activities", "categories"], ("batch_size", "bulk", "snapshot", "target")),
+}
+
+
+def run_job(name, options):
+    """Run one job in a worker process; returns (name, started, finished) as epoch seconds."""
+    func, _, writer_options = JOBS[name]
+    kwargs = dict(options)
+    for option in WRITER_OPTIONS:
+        if option not in writer_options:
+            kwargs.pop(option, None)
+    started = time.time()
+    func(**kwargs)
+    return name, started, time.time()
+
+
+def print_waterfall(origin, timings, width=50):
+    total = max((finished for _, finished in timings.values()), default=origin) - origin
+    scale = width / total if total > 0 else 0
+    print("\n📊 Job timing waterfall")
+    for name in JOBS:
+        if name not in timings:
+            print(f"  {name:<20} {'skipped':>9}")
+            continue
+        started, finished = timings[name]
+        offset = int((started - origin) * scale)
+        length = max(1, int((finished - started) * scale))
+        bar = " " * offset + "█" * length
+        print(f"  {name:<20} {finished - started:8.2f}s |{bar:<{width}}|")
+    print(f"  {'total':<20} {total:8.2f}s")
+
+
+def run_all(options, max_workers=None, only=None):
+    """Start every job whose parents are done; independent jobs run concurrently."""
+    selected = set(only or JOBS)
+    pending = {name for name in JOBS if name in selected}
+    done, failed, timings = set(), set(), {}
+    origin = time.time()
+
+    with ProcessPoolExecutor(max_workers=max_workers or len(JOBS)) as pool:
+        running = {}
+        while pending or running:
+            # Parents outside the selection are treated as already satisfied
+            for name in sorted(pending):
+                parents = [p for p in JOBS[name][1] if p in selected]
+                if any(p in failed for p in parents):
+                    print(f"⏭️ Skipping {name}: parent failed")
+                    pending.discard(name)
+                    failed.add(name)
+                elif all(p in done for p in parents):
+                    print(f"▶️ Starting {name}")
+                    running[pool.submit(run_job, name, options)] = name
+                    pending.discard(name)
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    _, started, ended = future.result()
+                    timings[name] = (started, ended)
+                    done.add(name)
+                    print(f"✅ Finished {name} in {ended - started:.2f}s")
+                except Exception:
+                    failed.add(name)
+                    print(f"❌ {name} failed:\n{traceback.format_exc()}")
+
+    print_waterfall(origin, timings)
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run all migrations following the FK dependency graph")
+    parser.add_argument("--mode", choices=["incremental", "full"], default="incremental")
+    parser.add_argument("--since", type=str, default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--bulk", action="store_true", help="LOAD DATA bulk mode for activity jobs (with --mode full)")
+    parser.add_argument("--max-workers", type=int, default=None, help="Concurrent jobs (default: all ready jobs)")
+    parser.add_argument("--only", nargs="+", choices=list(JOBS), default=None, help="Run a subset of jobs")
+    parser.add_argument("--metrics-json", type=str, default=None, help="Append each job's JSON run report to this file")
+    parser.add_argument("--record-run", action="store_true", help="Also append the run reports to migration_runs")
+    args = parser.parse_args()
+
+    options = {
+        "mode": args.mode,
+        "since": args.since,
+        "limit": args.limit,
+        "dry_run": args.dry_run,
+        "batch_size": args.batch_size,
+        "chunk_size": args.chunk_size,
+        "bulk": args.bulk,
+        "metrics_json": args.metrics_json,
+        "record_run": args.record_run,
+    }
+    ok = run_all(options, max_workers=args.max_workers, only=args.only)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,365 @@
+import mysql.connector
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+from migration_clocking_activities import (
+    CLOCKING_JOB_NAME,
+    WATERMARK_UPSERT,
+    backfill_clocking_fields,
+    ensure_migration_state_table,
+    get_watermark,
+    migrate_clocking_activities,
+    preload_fk_sets,
+    snapshot_key,
+    update_watermark,
+)
+from migration_common import LeaseLost
+from migration_rollup import rebuild_rollups
+
+JOB_NAME = CLOCKING_JOB_NAME
+# Highest keyset key covered by the planned ranges; finalize turns it into the watermark
+PLAN_JOB_NAME = f"{JOB_NAME}_parallel_plan"
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": ""  # Adjust with your credentials if needed
+}
+
+
+def connect_db(host, user, password, db):
+    return mysql.connector.connect(
+        host=host,
+        user=user,
+        password=password,
+        database=db
+    )
+
+
+def ensure_lease_table(target_cursor):
+    """Lease table living next to migration_state; one row per da_id range."""
+    target_cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS migration_leases (
+            job_name VARCHAR(128) NOT NULL,
+            range_start BIGINT NOT NULL,
+            range_end BIGINT NOT NULL,
+            status ENUM('pending', 'leased', 'done') NOT NULL DEFAULT 'pending',
+            owner VARCHAR(255) NULL,
+            lease_expires_at DATETIME NULL,
+            attempts INT NOT NULL DEFAULT 0,
+            progress_id BIGINT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (job_name, range_start),
+            KEY idx_claim (job_name, status, lease_expires_at)
+        )
+        """
+    )
+    # Lease tables created before progress tracking existed
+    target_cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'migration_leases' AND COLUMN_NAME = 'progress_id'
+        """
+    )
+    if target_cursor.fetchone()[0] == 0:
+        target_cursor.execute("ALTER TABLE migration_leases ADD COLUMN progress_id BIGINT NULL AFTER attempts")
+
+
+def plan_ranges(range_size: int = 50000, reset: bool = False):
+    """Split ss_daily_activity into half-open da_id ranges and record them as pending leases.
+
+    The keyset key of the planned snapshot is stored under ``PLAN_JOB_NAME``;
+    rows added or updated after planning fall outside every range and are left
+    for the incremental run that resumes from it.
+    """
+    source_db = connect_db(**DB_CONFIG, db="system-smartpro")
+    target_db = connect_db(**DB_CONFIG, db="clocking_reports")
+    source_cursor = source_db.cursor()
+    target_cursor = target_db.cursor()
+
+    ensure_migration_state_table(target_cursor)
+    ensure_lease_table(target_cursor)
+    if reset:
+        target_cursor.execute("DELETE FROM migration_leases WHERE job_name = %s", (JOB_NAME,))
+
+    source_cursor.execute("SELECT MIN(da_id), MAX(da_id) FROM ss_daily_activity")
+    min_id, max_id = source_cursor.fetchone()
+    planned = 0
+    if min_id is not None:
+        ranges = [
+            (JOB_NAME, start, min(start + range_size, max_id + 1))
+            for start in range(min_id, max_id + 1, range_size)
+        ]
+        # INSERT IGNORE keeps re-planning idempotent; existing leases keep their state
+        target_cursor.executemany(
+            "INSERT IGNORE INTO migration_leases (job_name, range_start, range_end) VALUES (%s, %s, %s)",
+            ranges,
+        )
+        planned = len(ranges)
+        # Same snapshot as MIN/MAX above. Re-planning without --reset keeps the first key:
+        # updates to ranges already done since then must still be picked up incrementally
+        last_updated_at, last_id = snapshot_key(source_cursor, max_id)
+        plan_key = WATERMARK_UPSERT if reset else (
+            "INSERT IGNORE INTO migration_state (job_name, last_updated_at, last_id) VALUES (%s, %s, %s)"
+        )
+        target_cursor.execute(plan_key, (PLAN_JOB_NAME, last_updated_at, last_id))
+    target_db.commit()
+    print(f"🗂️ Planned {planned} ranges of {range_size} da_id (min={min_id}, max={max_id}).")
+
+    source_cursor.close()
+    target_cursor.close()
+    source_db.close()
+    target_db.close()
+
+
+def claim_range(target_cursor, target_db, owner, lease_seconds):
+    """Atomically claim one pending or expired range; returns (start, end, attempts, progress_id) or None."""
+    # LAST_INSERT_ID(expr) remembers the claimed range_start for this session, so the
+    # read-back finds exactly that row even if this owner still holds an older lease
+    target_cursor.execute(
+        """
+        UPDATE migration_leases
+        SET range_start = LAST_INSERT_ID(range_start),
+            status = 'leased', owner = %s,
+            lease_expires_at = NOW() + INTERVAL %s SECOND,
+            attempts = attempts + 1
+        WHERE job_name = %s
+          AND (status = 'pending' OR (status = 'leased' AND lease_expires_at < NOW()))
+        ORDER BY range_start ASC
+        LIMIT 1
+        """,
+        (owner, lease_seconds, JOB_NAME),
+    )
+    target_db.commit()
+    if target_cursor.rowcount == 0:
+        return None
+    target_cursor.execute(
+        """
+        SELECT range_start, range_end, attempts, progress_id FROM migration_leases
+        WHERE job_name = %s AND range_start = LAST_INSERT_ID() AND owner = %s
+        """,
+        (JOB_NAME, owner),
+    )
+    return target_cursor.fetchone()
+
+
+def complete_range(target_cursor, target_db, owner, range_start):
+    """Mark a range done; only succeeds while the caller still owns the lease."""
+    target_cursor.execute(
+        """
+        UPDATE migration_leases SET status = 'done', lease_expires_at = NULL
+        WHERE job_name = %s AND range_start = %s AND owner = %s AND status = 'leased'
+        """,
+        (JOB_NAME, range_start, owner),
+    )
+    target_db.commit()
+    return target_cursor.rowcount == 1
+
+
+def start_heartbeat(owner, range_start, lease_seconds):
+    """Extend the lease every lease_seconds/3 on its own connection until stopped.
+
+    A failed beat is logged and retried on a fresh connection at the next
+    interval; if the lease expires meanwhile, ``Lease.fence`` refuses the
+    worker's next commit.
+    """
+    stop = threading.Event()
+
+    def beat():
+        db = cursor = None
+        while not stop.wait(max(1, lease_seconds // 3)):
+            try:
+                if db is None:
+                    db = connect_db(**DB_CONFIG, db="clocking_reports")
+                    cursor = db.cursor()
+                cursor.execute(
+                    """
+                    UPDATE migration_leases SET lease_expires_at = NOW() + INTERVAL %s SECOND
+                    WHERE job_name = %s AND range_start = %s AND owner = %s AND status = 'leased'
+                    """,
+                    (lease_seconds, JOB_NAME, range_start, owner),
+                )
+                db.commit()
+            except Exception as exc:
+                print(f"⚠️ [{owner}] heartbeat for da_id range {range_start} failed: {exc}; reconnecting")
+                close_quietly(cursor, db)
+                db = cursor = None
+        close_quietly(cursor, db)
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    return stop
+
+
+def close_quietly(*handles):
+    for handle in handles:
+        try:
+            if handle is not None:
+                handle.close()
+        except Exception:
+            pass
+
+
+class Lease:
+    """Ownership of one range, checked and advanced inside every page transaction.
+
+    ``fence`` locks the lease row (FOR UPDATE) right before each commit and
+    refuses it unless this worker still owns an unexpired lease, so a worker
+    that lost its lease can never commit; a concurrent claim waits on the row
+    lock until the page is committed. ``progress`` records the page's last
+    da_id in the same transaction as its rows, so a re-claimed range resumes
+    after the last committed page instead of deleting and redoing work.
+    """
+
+    def __init__(self, owner, range_start):
+        self.owner = owner
+        self.range_start = range_start
+
+    def fence(self, cursor):
+        cursor.execute(
+            """
+            SELECT 1 FROM migration_leases
+            WHERE job_name = %s AND range_start = %s AND owner = %s
+              AND status = 'leased' AND lease_expires_at > NOW()
+            FOR UPDATE
+            """,
+            (JOB_NAME, self.range_start, self.owner),
+        )
+        return bool(cursor.fetchall())
+
+    def progress(self, last_key):
+        return (
+            "UPDATE migration_leases SET progress_id = %s WHERE job_name = %s AND range_start = %s AND owner = %s",
+            (last_key[-1], JOB_NAME, self.range_start, self.owner),
+        )
+
+
+def run_worker(lease_seconds: int = 900, batch_size: int = 1000, chunk_size: int = 1000):
+    """Claim, process and complete ranges until none are left."""
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    target_db = connect_db(**DB_CONFIG, db="clocking_reports")
+    target_cursor = target_db.cursor()
+    # FK lookups are loaded once per worker process and shared by all its ranges
+    # (ranges are disjoint da_id spans, so the in-memory sets stay accurate)
+    preloads = preload_fk_sets(target_cursor, None)
+    target_db.commit()
+
+    processed = 0
+    while True:
+        lease = claim_range(target_cursor, target_db, owner, lease_seconds)
+        if lease is None:
+            break
+        range_start, range_end, attempts, progress_id = lease
+        # Pages up to progress_id were committed under an earlier lease; continue after them
+        resume_from = max(range_start, progress_id + 1) if progress_id is not None else range_start
+        print(f"🔒 [{owner}] da_id [{resume_from}, {range_end}) attempt {attempts}")
+        stop = start_heartbeat(owner, range_start, lease_seconds)
+        try:
+            migrate_clocking_activities(
+                mode="full",
+                batch_size=batch_size,
+                chunk_size=chunk_size,
+                id_range=(resume_from, range_end),
+                run_backfill=False,
+                rollup=False,
+                preloads=preloads,
+                lease=Lease(owner, range_start),
+            )
+        except LeaseLost as exc:
+            print(f"⚠️ [{owner}] lost lease on da_id [{range_start}, {range_end}): {exc}")
+            # The in-memory sets already saw the rolled-back page; reload them from committed state
+            preloads = preload_fk_sets(target_cursor, None)
+            target_db.commit()
+            continue
+        finally:
+            stop.set()
+        if complete_range(target_cursor, target_db, owner, range_start):
+            processed += 1
+        else:
+            print(f"⚠️ [{owner}] lost lease on da_id [{range_start}, {range_end}); another worker will redo it")
+
+    print(f"✅ [{owner}] processed {processed} ranges.")
+    target_cursor.close()
+    target_db.close()
+    return processed
+
+
+def run_workers(workers: int = 1, **kwargs):
+    if workers <= 1:
+        return run_worker(**kwargs)
+    processes = [multiprocessing.Process(target=run_worker, kwargs=kwargs) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def lease_status(target_cursor):
+    target_cursor.execute(
+        "SELECT status, COUNT(*) FROM migration_leases WHERE job_name = %s GROUP BY status",
+        (JOB_NAME,),
+    )
+    counts = {"pending": 0, "leased": 0, "done": 0}
+    counts.update({status: count for status, count in target_cursor.fetchall()})
+    return counts
+
+
+def finalize():
+    """Run the backfill and rollup rebuild once and advance the watermark after every range is done.
+
+    The watermark is the key stored by ``plan_ranges``, not the source's
+    current maximum: rows written after planning were never part of a range.
+    """
+    target_db = connect_db(**DB_CONFIG, db="clocking_reports")
+    target_cursor = target_db.cursor()
+
+    counts = lease_status(target_cursor)
+    if counts["pending"] or counts["leased"]:
+        print(f"⏳ Not finished yet: {counts}")
+    else:
+        task_zero, task_null, duration_null = backfill_clocking_fields(target_cursor, target_db, checkpoint=True)
+        print(f"🔎 Backfill check — task_id=0: {task_zero}, task_id NULL: {task_null}, duration NULL: {duration_null}")
+        # Ranges commit out of activity_id order across workers, so recompute
+        print(f"📊 Rollups rebuilt over {rebuild_rollups(target_cursor, target_db)} activity ids.")
+        planned_updated_at, planned_id = get_watermark(target_cursor, PLAN_JOB_NAME)
+        if planned_id is None:
+            print("⚠️ No planned key stored (plan again with --reset); watermark left unchanged.")
+        else:
+            update_watermark(target_cursor, target_db, JOB_NAME, planned_updated_at, planned_id)
+            print(f"✅ Finalized {counts['done']} ranges; watermark set to {planned_updated_at} / {planned_id}.")
+
+    target_cursor.close()
+    target_db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel clocking migration with da_id range leases")
+    parser.add_argument("command", choices=["plan", "work", "status", "finalize"])
+    parser.add_argument("--range-size", type=int, default=50000, help="da_id values per range (plan)")
+    parser.add_argument("--reset", action="store_true", help="Drop existing leases before planning (plan)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Worker processes on this host (work)")
+    parser.add_argument("--lease-seconds", type=int, default=900, help="Lease TTL; expired leases can be re-claimed (work)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        plan_ranges(range_size=args.range_size, reset=args.reset)
+    elif args.command == "work":
+        run_workers(
+            workers=args.workers,
+            lease_seconds=args.lease_seconds,
+            batch_size=args.batch_size,
+            chunk_size=args.chunk_size,
+        )
+    elif args.command == "status":
+        db = connect_db(**DB_CONFIG, db="clocking_reports")
+        cursor = db.cursor()
+        print(f"📋 Leases: {lease_status(cursor)}")
+        cursor.close()
+        db.close()
+    else:
+        finalize()
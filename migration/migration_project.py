@@ -1,6 +1,7 @@
 import mysql.connector
 from datetime import datetime
 import argparse
+from migration_common import RunMetrics, UpsertWriter, WriteTransaction, stream_rows, report_peak_rss
 
 def connect_db(host, user, password, db):
     return mysql.connector.connect(
@@ -65,23 +66,26 @@ def update_watermark(target_cursor, target_db, job_name, last_updated_at, last_i
         pass
 
 
-def project_exists(cursor, project_code):
-    try:
-        cursor.execute("SELECT 1 FROM projects WHERE project_code = %s LIMIT 1", (project_code,))
-        return cursor.fetchone() is not None
-    except Exception:
-        return False
+def project_key(project_code):
+    # project_code compares case-insensitively in MySQL
+    return str(project_code).rstrip(" ").casefold()
 
 
-def migrate_projects(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False):
+def migrate_projects(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False, chunk_size: int = 1000,
+                     batch_size: int = 1000, metrics_json: str = None, record_run: bool = False,
+                     commit_rows: int = 10000, commit_seconds: float = 5.0, max_retries: int = 5, target: str = "clocking_reports"):
     config = {
         "host": "localhost",
         "user": "root",
         "password": ""  # Leave empty if no password
     }
 
-    source_db = connect_db(**config, db="system-smartpro")
-    target_db = connect_db(**config, db="clocking_reports")
+    metrics = RunMetrics("projects", {
+        "mode": mode, "since": since, "limit": limit, "dry_run": dry_run, "chunk_size": chunk_size, "batch_size": batch_size,
+        "commit_rows": commit_rows, "commit_seconds": commit_seconds, "max_retries": max_retries,
+    })
+    source_db = metrics.connection(connect_db(**config, db="system-smartpro"))
+    target_db = metrics.connection(connect_db(**config, db=target))
 
     source_cursor = source_db.cursor(dictionary=True)
     target_cursor = target_db.cursor()
@@ -119,68 +123,50 @@ def migrate_projects(mode: str = "incremental", since: str = None, limit: int =
     if limit and isinstance(limit, int) and limit > 0:
         base_query += f" LIMIT {int(limit)}"
 
-    source_cursor.execute(base_query, tuple(params) if params else None)
-    records = source_cursor.fetchall()
+    # Stream source rows in chunks so memory stays flat regardless of table size
+    records = metrics.iterate("fetch", stream_rows(source_cursor, base_query, tuple(params) if params else None, chunk_size))
 
-    insert_query = """
+    upsert_query = """
         INSERT INTO projects (
             project_code, project_name, customer_name,
             project_manager_id, created_by, created_at,
             last_update, status
         ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            project_name = VALUES(project_name),
+            customer_name = VALUES(customer_name),
+            project_manager_id = VALUES(project_manager_id),
+            created_by = VALUES(created_by),
+            created_at = VALUES(created_at),
+            last_update = VALUES(last_update),
+            status = VALUES(status)
     """
-    update_query = """
-        UPDATE projects SET 
-            project_name = %s,
-            customer_name = %s,
-            project_manager_id = %s,
-            created_by = %s,
-            created_at = %s,
-            last_update = %s,
-            status = %s
-        WHERE project_code = %s
-    """
 
-    inserted = 0
-    updated = 0
+    transaction = WriteTransaction(target_db, target_cursor, commit_rows, commit_seconds, max_retries, metrics=metrics)
+    writer = UpsertWriter(
+        target_cursor, upsert_query, batch_size, dry_run=dry_run,
+        metrics=metrics, stage="upsert", transaction=transaction,
+    )
+
     max_updated_at = None
     max_id = None
 
     for row in records:
-        exists = project_exists(target_cursor, row["project_code"])
+        writer.add(
+            (
+                row["project_code"],
+                row["project_name"],
+                row["customer_name"],
+                row["project_manager_id"],
+                row["created_by"],
+                row["created_at"],
+                row["last_update"],
+                map_status(row["status"]),
+            )
+        )
         if not dry_run:
-            if exists:
-                target_cursor.execute(
-                    update_query,
-                    (
-                        row["project_name"],
-                        row["customer_name"],
-                        row["project_manager_id"],
-                        row["created_by"],
-                        row["created_at"],
-                        row["last_update"],
-                        map_status(row["status"]),
-                        row["project_code"],
-                    ),
-                )
-            else:
-                target_cursor.execute(
-                    insert_query,
-                    (
-                        row["project_code"],
-                        row["project_name"],
-                        row["customer_name"],
-                        row["project_manager_id"],
-                        row["created_by"],
-                        row["created_at"],
-                        row["last_update"],
-                        map_status(row["status"]),
-                    ),
-                )
-        if exists:
-            updated += 1
-        else:
-            inserted += 1
+            # Upserts are idempotent, so any flushed prefix is a safe commit point
+            transaction.maybe_commit()
 
         upd = row.get("last_update") or row.get("created_at")
         try:
@@ -189,14 +175,21 @@ def migrate_projects(mode: str = "incremental", since: str = None, limit: int =
         except Exception:
             pass
 
+    writer.flush()
     if not dry_run:
-        target_db.commit()
+        transaction.commit()
 
-    total = inserted + updated
-    print(f"✅ Projects processed: {total}. Inserted: {inserted}, Updated: {updated}.")
+    inserted, updated, unchanged = writer.inserted, writer.updated, writer.unchanged
+    total = inserted + updated + unchanged
+    print(f"✅ Projects processed: {total}. Inserted: {inserted}, Updated: {updated}, Unchanged: {unchanged}.")
 
     if (mode == "incremental" or effective_since) and not dry_run:
-        update_watermark(target_cursor, target_db, "ss_project_management", max_updated_at, max_id)
+        with metrics.stage("watermark"):
+            update_watermark(target_cursor, target_db, "ss_project_management", max_updated_at, max_id)
+
+    report_peak_rss("projects")
+    metrics.count(processed=total, inserted=inserted, updated=updated, unchanged=unchanged, deadlock_retries=transaction.retried)
+    metrics.emit(metrics_json, target_cursor if record_run and not dry_run else None, target_db)
 
     # Cleanup
     source_cursor.close()
@@ -211,5 +204,14 @@ if __name__ == "__main__":
     parser.add_argument("--since", type=str, default=None)
     parser.add_argument("--limit", type=int, default=None)
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched from the source per round trip")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per multi-row INSERT ... ON DUPLICATE KEY UPDATE")
+    parser.add_argument("--metrics-json", type=str, default=None, help="Append the JSON run report to this file ('-' for stdout)")
+    parser.add_argument("--record-run", action="store_true", help="Also append the run report to migration_runs")
+    parser.add_argument("--commit-rows", type=int, default=10000, help="Commit after this many written rows")
+    parser.add_argument("--commit-seconds", type=float, default=5.0, help="...or after this many seconds, whichever comes first")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries (with backoff) for a batch hit by a deadlock/lock-wait timeout")
     args = parser.parse_args()
-    migrate_projects(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run)
+    migrate_projects(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run, chunk_size=args.chunk_size,
+                     batch_size=args.batch_size, metrics_json=args.metrics_json, record_run=args.record_run,
+                     commit_rows=args.commit_rows, commit_seconds=args.commit_seconds, max_retries=args.max_retries)
@@ -2,6 +2,8 @@ import mysql.connector
 import json
 from datetime import datetime
 import argparse
+from migration_common import BatchWriter, RunMetrics, WriteTransaction, stream_rows, report_peak_rss
+from migration_project import project_key
 
 def connect_db(host, user, password, db):
     return mysql.connector.connect(
@@ -11,17 +13,21 @@ def connect_db(host, user, password, db):
         database=db
     )
 
-def get_user_id_from_email(cursor, email):
-    cursor.execute("SELECT user_id FROM users WHERE email = %s", (email,))
-    result = cursor.fetchone()
-    return result[0] if result else None
+def email_key(email):
+    # Match MySQL's case-insensitive, trailing-space-insensitive email comparison
+    return str(email).rstrip(" ").casefold()
 
-def project_user_exists(cursor, project_code, user_id):
-    cursor.execute(
-        "SELECT 1 FROM project_users WHERE project_code = %s AND user_id = %s LIMIT 1",
-        (project_code, user_id),
-    )
-    return cursor.fetchone() is not None
+def load_user_ids_by_email(cursor):
+    """Preload users.email -> user_id once; the lowest user_id wins like the old per-row SELECT."""
+    cursor.execute("SELECT email, user_id FROM users WHERE email IS NOT NULL ORDER BY user_id ASC")
+    user_ids = {}
+    for email, user_id in cursor.fetchall():
+        user_ids.setdefault(email_key(email), user_id)
+    return user_ids
+
+def load_project_user_pairs(cursor):
+    cursor.execute("SELECT project_code, user_id FROM project_users")
+    return {(project_key(project_code), user_id) for project_code, user_id in cursor.fetchall()}
 
 def normalize_position(jabatan):
     try:
@@ -34,28 +40,29 @@ def normalize_position(jabatan):
     except Exception:
         return None
 
-def get_or_create_user(target_cursor, lookup_cursor, email, nickname, jabatan, id_key, next_id_func):
+def get_or_create_user(user_ids_by_email, user_writer, email, nickname, jabatan, id_key, next_id_func):
+    """Resolve a member to a user_id in memory, queueing a new (placeholder) user when unknown.
+
+    ``user_ids_by_email`` is updated right away so later members with the same
+    email reuse the queued user instead of creating a duplicate.
+    """
     # Prefer existing by email
     if email:
-        existing = get_user_id_from_email(lookup_cursor, email)
+        existing = user_ids_by_email.get(email_key(email))
         if existing:
             return existing
     # Build placeholder email if missing
     placeholder_email = email if email else f"{id_key}@placeholder.local"
     # Check again to avoid duplicate placeholder creation
-    existing_pl = get_user_id_from_email(lookup_cursor, placeholder_email)
+    existing_pl = user_ids_by_email.get(email_key(placeholder_email))
     if existing_pl:
         return existing_pl
     full_name = nickname or (email or placeholder_email)
     position = normalize_position(jabatan)
     new_user_id = next_id_func()
-    target_cursor.execute(
-        """
-        INSERT INTO users (user_id, full_name, email, position, created_at, updated_at)
-        VALUES (%s, %s, %s, %s, NOW(), NOW())
-        """,
-        (new_user_id, full_name, placeholder_email, position),
-    )
+    if user_writer is not None:
+        user_writer.add((new_user_id, full_name, placeholder_email, position))
+    user_ids_by_email[email_key(placeholder_email)] = new_user_id
     return new_user_id
 
 def ensure_migration_state_table(target_cursor):
@@ -104,15 +111,21 @@ def update_watermark(target_cursor, target_db, job_name, last_updated_at, last_i
         pass
 
 
-def migrate_project_users(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False):
+def migrate_project_users(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False, chunk_size: int = 1000,
+                          batch_size: int = 1000, metrics_json: str = None, record_run: bool = False,
+                          commit_rows: int = 10000, commit_seconds: float = 5.0, max_retries: int = 5, target: str = "clocking_reports"):
     config = {
         "host": "localhost",
         "user": "root",
         "password": ""
     }
 
-    source_db = connect_db(**config, db="system-smartpro")
-    target_db = connect_db(**config, db="clocking_reports")
+    metrics = RunMetrics("project_users", {
+        "mode": mode, "since": since, "limit": limit, "dry_run": dry_run, "chunk_size": chunk_size, "batch_size": batch_size,
+        "commit_rows": commit_rows, "commit_seconds": commit_seconds, "max_retries": max_retries,
+    })
+    source_db = metrics.connection(connect_db(**config, db="system-smartpro"))
+    target_db = metrics.connection(connect_db(**config, db=target))
 
     source_cursor = source_db.cursor(dictionary=True)
     target_cursor = target_db.cursor()
@@ -122,8 +135,12 @@ def migrate_project_users(mode: str = "incremental", since: str = None, limit: i
     wm_updated_at, wm_last_id = get_watermark(target_cursor, "ss_project_management_members")
 
     # Prepare next user_id generator for placeholder users (if table lacks AUTO_INCREMENT)
-    user_lookup_cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users")
-    current_max_user_id = user_lookup_cursor.fetchone()[0] or 0
+    with metrics.stage("preload"):
+        user_lookup_cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users")
+        current_max_user_id = user_lookup_cursor.fetchone()[0] or 0
+        # Resolve members and duplicate pairs in memory instead of per-member SELECTs
+        user_ids_by_email = load_user_ids_by_email(user_lookup_cursor)
+        existing_pairs = load_project_user_pairs(user_lookup_cursor)
     state = {"max_user_id": current_max_user_id}
 
     def next_user_id():
@@ -151,10 +168,26 @@ def migrate_project_users(mode: str = "incremental", since: str = None, limit: i
     if limit and isinstance(limit, int) and limit > 0:
         base_query += f" LIMIT {int(limit)}"
 
-    source_cursor.execute(base_query, tuple(params) if params else None)
-    rows = source_cursor.fetchall()
+    # Stream source rows in chunks so memory stays flat regardless of table size
+    rows = metrics.iterate("fetch", stream_rows(source_cursor, base_query, tuple(params) if params else None, chunk_size))
 
+    insert_user_query = """
+        INSERT INTO users (user_id, full_name, email, position, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, NOW(), NOW())
+    """
     insert_query = "INSERT INTO project_users (project_code, user_id) VALUES (%s, %s)"
+    # New users are flushed before the memberships that reference them
+    user_writer = None
+    member_writer = None
+    transaction = WriteTransaction(target_db, target_cursor, commit_rows, commit_seconds, max_retries, metrics=metrics)
+    if not dry_run:
+        user_writer = BatchWriter(
+            target_cursor, insert_user_query, batch_size, metrics=metrics, stage="insert_users", transaction=transaction
+        )
+        member_writer = BatchWriter(
+            target_cursor, insert_query, batch_size, parent=user_writer, metrics=metrics, stage="insert_members",
+            transaction=transaction,
+        )
     inserted_count = 0
     skipped_count = 0
     duplicate_skipped = 0
@@ -166,7 +199,8 @@ def migrate_project_users(mode: str = "incremental", since: str = None, limit: i
         if not members_json or str(members_json).strip() == "":
             continue
         try:
-            members = json.loads(members_json)
+            with metrics.stage("parse_json", rows=1):
+                members = json.loads(members_json)
             if isinstance(members, dict):
                 for id_key, member in members.items():
                     if not isinstance(member, dict):
@@ -175,18 +209,25 @@ def migrate_project_users(mode: str = "incremental", since: str = None, limit: i
                     email = member.get("email")
                     nickname = member.get("nickname")
                     jabatan = member.get("jabatan")
-                    user_id = get_or_create_user(target_cursor, user_lookup_cursor, email, nickname, jabatan, id_key, next_user_id)
-                    if project_user_exists(target_cursor, project_code, user_id):
+                    with metrics.stage("resolve", rows=1):
+                        user_id = get_or_create_user(user_ids_by_email, user_writer, email, nickname, jabatan, id_key, next_user_id)
+                        pair = (project_key(project_code), user_id)
+                        duplicate = pair in existing_pairs
+                        existing_pairs.add(pair)
+                    if duplicate:
                         duplicate_skipped += 1
                         continue
-                    if not dry_run:
-                        target_cursor.execute(insert_query, (project_code, user_id))
+                    if member_writer is not None:
+                        member_writer.add((project_code, user_id))
                     inserted_count += 1
             else:
                 skipped_count += 1
                 print(f"⚠️ Unexpected members format for project {project_code}, expected dict. Skipping.")
         except json.JSONDecodeError:
             print(f"⚠️ JSON parse error in project {project_code}, skipping row.")
+        # Users are always flushed before their memberships, and reruns skip existing users/pairs,
+        # so committing between projects is safe
+        transaction.maybe_commit()
 
         upd = row.get("pr_last_update") or row.get("pr_created_date")
         try:
@@ -196,14 +237,23 @@ def migrate_project_users(mode: str = "incremental", since: str = None, limit: i
             pass
 
     if not dry_run:
-        target_db.commit()
+        member_writer.flush()
+        transaction.commit()
 
     print(f"✅ Inserted: {inserted_count} rows.")
     print(f"⚠️ Skipped: {skipped_count} rows due to missing email/user or bad JSON.")
     print(f"ℹ️ Duplicate pairs ignored: {duplicate_skipped} rows.")
 
     if (mode == "incremental" or effective_since) and not dry_run:
-        update_watermark(target_cursor, target_db, "ss_project_management_members", max_updated_at, None)
+        with metrics.stage("watermark"):
+            update_watermark(target_cursor, target_db, "ss_project_management_members", max_updated_at, None)
+
+    report_peak_rss("project_users")
+    metrics.count(
+        inserted=inserted_count, skipped=skipped_count, duplicates=duplicate_skipped,
+        users_created=state["max_user_id"] - current_max_user_id, deadlock_retries=transaction.retried,
+    )
+    metrics.emit(metrics_json, target_cursor if record_run and not dry_run else None, target_db)
 
     # Cleanup
     source_cursor.close()
@@ -218,5 +268,14 @@ if __name__ == "__main__":
     parser.add_argument("--since", type=str, default=None)
     parser.add_argument("--limit", type=int, default=None)
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched from the source per round trip")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per multi-row INSERT for new users and memberships")
+    parser.add_argument("--metrics-json", type=str, default=None, help="Append the JSON run report to this file ('-' for stdout)")
+    parser.add_argument("--record-run", action="store_true", help="Also append the run report to migration_runs")
+    parser.add_argument("--commit-rows", type=int, default=10000, help="Commit after this many written rows")
+    parser.add_argument("--commit-seconds", type=float, default=5.0, help="...or after this many seconds, whichever comes first")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries (with backoff) for a batch hit by a deadlock/lock-wait timeout")
     args = parser.parse_args()
-    migrate_project_users(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run)
+    migrate_project_users(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run, chunk_size=args.chunk_size,
+                          batch_size=args.batch_size, metrics_json=args.metrics_json, record_run=args.record_run,
+                          commit_rows=args.commit_rows, commit_seconds=args.commit_seconds, max_retries=args.max_retries)
@@ -0,0 +1,271 @@
+import mysql.connector
+import argparse
+import json
+from migration_user import migrate_users
+from migration_category_clocking import migrate_category_docking
+from migration_clocking_activities import migrate_daily_activity, migrate_clocking_activities
+from migration_rollup import rebuild_rollups
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": ""  # Adjust with your credentials if needed
+}
+
+# da_clocking when it yields clocking rows (a non-empty JSON array); anything else gets one
+# fallback row built from the ss_daily_activity columns, like transform_activity_row
+CLOCKING_ARRAY = (
+    "IF(JSON_VALID(da_clocking) AND JSON_TYPE(da_clocking) = 'ARRAY' AND JSON_LENGTH(da_clocking) > 0, "
+    "da_clocking, NULL)"
+)
+
+# Source/target pairs with an integer key. Columns are (source expression, target expression)
+# normalized so a migrated, unchanged row hashes the same on both sides.
+PAIRS = {
+    "daily_activities": {
+        "source_table": "ss_daily_activity",
+        "source_key": "da_id",
+        "target_table": "daily_activities",
+        "target_key": "daily_activity_id",
+        "columns": [
+            ("da_project_code", "project_code"),
+            ("DATE(da_date)", "DATE(activity_date)"),
+            ("CASE BINARY da_priority WHEN 'H' THEN 'High' WHEN 'M' THEN 'Medium' WHEN 'L' THEN 'Low' END", "priority"),
+            ("da_start_tm", "start_time"),
+            ("da_end_tm", "end_time"),
+            ("da_created_by", "created_by"),
+            ("da_created_date", "created_at"),
+            ("da_updated_date", "updated_at"),
+            ("da_activity", "activity_type"),
+            ("da_keterangan", "description"),
+            ("da_duration", "activity_duration_minutes"),
+        ],
+        # Target rows only ever come from ss_daily_activity, so extra rows are source deletions
+        "tombstone": True,
+    },
+    # Per-activity clocking digest: how many clocking rows da_clocking yields and which
+    # descriptions, against the clocking_activities rows of that daily_activity_id
+    "clockings": {
+        "source_table": "ss_daily_activity",
+        "source_key": "da_id",
+        "target_table": (
+            "(SELECT daily_activity_id, COUNT(*) AS clockings, "
+            "SUM(CRC32(COALESCE(activity_description, ''))) AS descriptions "
+            "FROM clocking_activities GROUP BY daily_activity_id) AS clockings"
+        ),
+        "target_key": "daily_activity_id",
+        "columns": [
+            (f"COALESCE(JSON_LENGTH({CLOCKING_ARRAY}), 1)", "clockings"),
+            (
+                f"IF({CLOCKING_ARRAY} IS NULL, CRC32(COALESCE(da_activity, '')), "
+                f"(SELECT SUM(CRC32(COALESCE(j.activity, ''))) FROM JSON_TABLE({CLOCKING_ARRAY}, '$[*]' "
+                f"COLUMNS (activity TEXT PATH '$.activity')) AS j))",
+                "descriptions",
+            ),
+        ],
+        "tombstone": True,
+    },
+    "users": {
+        "source_table": "ss_user",
+        "source_key": "id",
+        "target_table": "users",
+        "target_key": "user_id",
+        "columns": [
+            ("name", "full_name"),
+            ("email", "email"),
+            ("created_at", "created_at"),
+            ("updated_at", "updated_at"),
+        ],
+        # users also holds placeholder/guest users created by migration_project_user.py
+        "tombstone": False,
+    },
+    "categories": {
+        "source_table": "ss_category_clocking",
+        "source_key": "cc_id",
+        "target_table": "category_clocking",
+        "target_key": "category_id",
+        "columns": [
+            ("cc_definition", "category_description"),
+            ("COALESCE(cc_productive, 0)", "is_productive"),
+            ("COALESCE(cc_billable, 0)", "is_billable"),
+            ("COALESCE(cc_used, 0)", "is_used"),
+            ("COALESCE(cc_direct, 0)", "is_direct"),
+        ],
+        "tombstone": False,
+    },
+}
+
+
+def connect_db(host, user, password, db):
+    return mysql.connector.connect(
+        host=host,
+        user=user,
+        password=password,
+        database=db
+    )
+
+
+def row_hash(columns):
+    # NULL-safe: CONCAT_WS would silently skip NULLs, so encode them explicitly
+    parts = ", ".join(f"COALESCE(CAST({column} AS CHAR), '\\\\N')" for column in columns)
+    return f"CRC32(CONCAT_WS('|', {parts}))"
+
+
+class Side:
+    """One side (source or target) of a pair: bucket checksums and leaf row hashes."""
+
+    def __init__(self, cursor, table, key, columns):
+        self.cursor = cursor
+        self.table = table
+        self.key = key
+        self.hash = row_hash(columns)
+        self.queries = 0
+
+    def key_bounds(self):
+        self.cursor.execute(f"SELECT MIN({self.key}), MAX({self.key}) FROM {self.table}")
+        self.queries += 1
+        return self.cursor.fetchone()
+
+    def buckets(self, lo, hi, width):
+        """{bucket: (count, checksum)} for keys in [lo, hi) split into buckets of ``width`` keys."""
+        self.cursor.execute(
+            f"""
+            SELECT FLOOR(({self.key} - %s) / %s) AS bucket, COUNT(*), SUM({self.hash})
+            FROM {self.table}
+            WHERE {self.key} >= %s AND {self.key} < %s
+            GROUP BY bucket
+            """,
+            (lo, width, lo, hi),
+        )
+        self.queries += 1
+        return {int(bucket): (count, int(checksum or 0)) for bucket, count, checksum in self.cursor.fetchall()}
+
+    def leaf(self, lo, hi):
+        self.cursor.execute(
+            f"SELECT {self.key}, {self.hash} FROM {self.table} WHERE {self.key} >= %s AND {self.key} < %s",
+            (lo, hi),
+        )
+        self.queries += 1
+        return dict(self.cursor.fetchall())
+
+
+def reconcile_pair(source, target, fanout=16, leaf_size=512):
+    """Merkle-style narrowing: compare bucket checksums, descend only into mismatched
+    buckets, and diff row hashes once a bucket holds at most ``leaf_size`` keys.
+
+    Returns (missing, changed, extra): keys absent from the target, keys whose
+    hash differs, and keys only present in the target.
+    """
+    missing, changed, extra = [], [], []
+    bounds = [b for b in source.key_bounds() + target.key_bounds() if b is not None]
+    if not bounds:
+        return missing, changed, extra
+    pending = [(min(bounds), max(bounds) + 1)]
+    while pending:
+        lo, hi = pending.pop()
+        if hi - lo <= leaf_size:
+            source_rows = source.leaf(lo, hi)
+            target_rows = target.leaf(lo, hi)
+            for key, checksum in source_rows.items():
+                if key not in target_rows:
+                    missing.append(key)
+                elif target_rows[key] != checksum:
+                    changed.append(key)
+            extra.extend(key for key in target_rows if key not in source_rows)
+            continue
+        width = -(-(hi - lo) // fanout)
+        source_buckets = source.buckets(lo, hi, width)
+        target_buckets = target.buckets(lo, hi, width)
+        for bucket in set(source_buckets) | set(target_buckets):
+            if source_buckets.get(bucket) != target_buckets.get(bucket):
+                start = lo + bucket * width
+                pending.append((start, min(start + width, hi)))
+    return sorted(missing), sorted(changed), sorted(extra)
+
+
+def chunks(values, size=5000):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def delete_keys(target_cursor, target_db, table, key, values):
+    for chunk in chunks(values):
+        target_cursor.execute(
+            f"DELETE FROM {table} WHERE {key} IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk)
+        )
+    target_db.commit()
+
+
+def resync(name, target_cursor, target_db, missing, changed, extra):
+    """Re-migrate only the drifted keys and tombstone rows deleted at the source."""
+    resync_ids = sorted(set(missing) | set(changed))
+    if name == "daily_activities":
+        # Changed parents are rebuilt from scratch: drop them and their clocking rows first
+        dropped = sorted(set(changed) | set(extra))
+        delete_keys(target_cursor, target_db, "clocking_activities", "daily_activity_id", dropped)
+        delete_keys(target_cursor, target_db, "daily_activities", "daily_activity_id", dropped)
+        for chunk in chunks(resync_ids):
+            migrate_daily_activity(mode="full", ids=chunk)
+            migrate_clocking_activities(mode="full", ids=chunk, rollup=False)
+        # Deleted clocking rows cannot be subtracted from the rollup buckets; recompute them
+        rebuild_rollups(target_cursor, target_db)
+    elif name == "clockings":
+        # Only the clocking rows are rebuilt; their daily_activities parents are kept
+        delete_keys(target_cursor, target_db, "clocking_activities", "daily_activity_id", sorted(set(changed) | set(extra)))
+        for chunk in chunks(resync_ids):
+            migrate_clocking_activities(mode="full", ids=chunk, rollup=False)
+        rebuild_rollups(target_cursor, target_db)
+    elif name == "users":
+        for chunk in chunks(resync_ids):
+            migrate_users(mode="full", ids=chunk)
+    elif name == "categories":
+        for chunk in chunks(resync_ids):
+            migrate_category_docking(mode="full", ids=chunk)
+
+
+def reconcile(pairs=None, fanout=16, leaf_size=512, apply=False, output=None):
+    source_db = connect_db(**DB_CONFIG, db="system-smartpro")
+    target_db = connect_db(**DB_CONFIG, db="clocking_reports")
+    source_cursor = source_db.cursor()
+    target_cursor = target_db.cursor()
+
+    report = {}
+    for name in pairs or PAIRS:
+        spec = PAIRS[name]
+        source = Side(source_cursor, spec["source_table"], spec["source_key"], [c[0] for c in spec["columns"]])
+        target = Side(target_cursor, spec["target_table"], spec["target_key"], [c[1] for c in spec["columns"]])
+        missing, changed, extra = reconcile_pair(source, target, fanout, leaf_size)
+        print(
+            f"🔍 {name}: missing={len(missing)}, changed={len(changed)}, extra={len(extra)} "
+            f"({source.queries + target.queries} checksum queries)"
+        )
+        if extra and not spec["tombstone"]:
+            print(f"ℹ️ {name}: {len(extra)} target-only rows kept (not tombstoned for this table).")
+        if apply and (missing or changed or (extra and spec["tombstone"])):
+            resync(name, target_cursor, target_db, missing, changed, extra if spec["tombstone"] else [])
+            print(f"🔁 {name}: re-synced {len(set(missing) | set(changed))} keys"
+                  + (f", tombstoned {len(extra)}" if spec["tombstone"] else ""))
+        report[name] = {"missing": missing, "changed": changed, "extra": extra}
+
+    if output:
+        with open(output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"📝 Drift report written to {output}")
+
+    source_cursor.close()
+    target_cursor.close()
+    source_db.close()
+    target_db.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect (and optionally repair) drift between system-smartpro and clocking_reports")
+    parser.add_argument("--only", nargs="+", choices=list(PAIRS), default=None, help="Reconcile a subset of tables")
+    parser.add_argument("--fanout", type=int, default=16, help="Buckets per level")
+    parser.add_argument("--leaf-size", type=int, default=512, help="Key span compared row by row")
+    parser.add_argument("--apply", action="store_true", help="Re-sync drifted keys and tombstone deleted rows")
+    parser.add_argument("--output", type=str, default=None, help="Write the drifted keys as JSON")
+    args = parser.parse_args()
+
+    reconcile(pairs=args.only, fanout=max(2, args.fanout), leaf_size=max(1, args.leaf_size), apply=args.apply, output=args.output)
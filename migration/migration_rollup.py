@@ -0,0 +1,174 @@
+import mysql.connector
+import argparse
+from migration_common import WriteTransaction, acquire_lock, release_lock
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": ""  # Adjust with your credentials if needed
+}
+
+# Watermark (migration_state.last_id) = highest clocking_activities.activity_id already rolled up
+ROLLUP_JOB_NAME = "clocking_rollup"
+# Watermark (migration_state.last_id) = highest activity_id whose backfill has committed.
+# It only moves in the transaction that backfills the rows, so rollups never fold past it.
+BACKFILL_JOB_NAME = "clocking_backfill"
+# Server-wide named lock held by whoever appends to clocking_activities or folds the rollups.
+# Both watermarks assume activity_ids commit in order, i.e. one writer at a time.
+WRITER_LOCK = "clocking_reports.clocking_writer"
+
+# Rollup table -> (period column, period expression over clocking_activities ca).
+# Periods are ints (ISO YEARWEEK 202501 / YEAR_MONTH 202501); 0 holds clocking rows without start_date.
+ROLLUPS = {
+    "clocking_rollup_week": ("iso_week", "COALESCE(YEARWEEK(ca.start_date, 3), 0)"),
+    "clocking_rollup_month": ("cal_month", "COALESCE(EXTRACT(YEAR_MONTH FROM ca.start_date), 0)"),
+}
+
+
+def connect_db(host, user, password, db):
+    return mysql.connector.connect(
+        host=host,
+        user=user,
+        password=password,
+        database=db
+    )
+
+
+def ensure_rollup_tables(target_cursor):
+    for table, (period, _) in ROLLUPS.items():
+        target_cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INT NOT NULL,
+                category_id INT NOT NULL,
+                {period} INT NOT NULL,
+                minutes BIGINT NOT NULL DEFAULT 0,
+                activity_count INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, category_id, {period}),
+                KEY idx_{period} ({period}, user_id)
+            )
+            """
+        )
+
+
+def rollup_delta_query(table, period, expression, bounded=True):
+    # Adds the window's rows onto existing buckets; activities without a user never reach the reports
+    upper = "AND ca.activity_id <= %s" if bounded else ""
+    return f"""
+        INSERT INTO {table} (user_id, category_id, {period}, minutes, activity_count)
+        SELECT da.user_id, COALESCE(ca.category_id, 0), {expression},
+               COALESCE(SUM(ca.duration_minutes), 0), COUNT(*)
+        FROM clocking_activities ca
+        JOIN daily_activities da ON ca.daily_activity_id = da.daily_activity_id
+        WHERE ca.activity_id > %s {upper} AND da.user_id IS NOT NULL
+        GROUP BY da.user_id, COALESCE(ca.category_id, 0), {expression}
+        ON DUPLICATE KEY UPDATE
+            minutes = minutes + VALUES(minutes),
+            activity_count = activity_count + VALUES(activity_count)
+    """
+
+
+def fold_rollups(transaction, id_from, id_to=None):
+    """Journal the deltas for activity_id in (id_from, id_to] and the watermark move into ``transaction``.
+
+    Without ``id_to`` the range is open-ended and the watermark becomes
+    MAX(activity_id), which stays right when a deadlock replay re-inserts the
+    window's rows under new ids. The caller commits, after the rows' backfill.
+    """
+    params = (id_from,) if id_to is None else (id_from, id_to)
+    for table, (period, expression) in ROLLUPS.items():
+        transaction.execute(rollup_delta_query(table, period, expression, bounded=id_to is not None), params, rows=0)
+    if id_to is None:
+        transaction.execute(
+            """
+            INSERT INTO migration_state (job_name, last_updated_at, last_id)
+            SELECT %s, NULL, COALESCE(MAX(activity_id), 0) FROM clocking_activities
+            ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)
+            """,
+            (ROLLUP_JOB_NAME,), rows=0,
+        )
+    else:
+        transaction.execute(
+            """
+            INSERT INTO migration_state (job_name, last_updated_at, last_id)
+            VALUES (%s, NULL, %s)
+            ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)
+            """,
+            (ROLLUP_JOB_NAME, id_to), rows=0,
+        )
+
+
+def last_id(target_cursor, job_name):
+    target_cursor.execute("SELECT last_id FROM migration_state WHERE job_name = %s", (job_name,))
+    row = target_cursor.fetchone()
+    return row[0] if row else None
+
+
+def rolled_up_to(target_cursor):
+    return last_id(target_cursor, ROLLUP_JOB_NAME) or 0
+
+
+def refresh_rollups(target_cursor, target_db, window=50000, max_retries=5, lock_timeout=60):
+    """Fold backfilled clocking rows above the rollup watermark into the rollups.
+
+    Walks activity_id windows from the rollup watermark up to the backfill
+    watermark (rows above it may not be final yet). Each window's deltas and
+    the watermark commit in one transaction, so a row is counted exactly once
+    even if the run dies in between. Holds WRITER_LOCK meanwhile, so no
+    migration run can commit ids below the window behind it; out-of-order
+    writers (parallel workers) need rebuild_rollups once they are done.
+    Returns the number of activity_ids folded in.
+    """
+    ensure_rollup_tables(target_cursor)
+    acquire_lock(target_cursor, WRITER_LOCK, lock_timeout)
+    try:
+        lo = rolled_up_to(target_cursor)
+        target_cursor.execute("SELECT COALESCE(MAX(activity_id), 0) FROM clocking_activities")
+        hi = target_cursor.fetchone()[0]
+        backfilled = last_id(target_cursor, BACKFILL_JOB_NAME)
+        if backfilled is not None:
+            hi = min(hi, backfilled)
+        target_db.commit()
+        transaction = WriteTransaction(target_db, target_cursor, retries=max_retries)
+        start = lo
+        step = max(1, int(window or 1))
+        while start < hi:
+            end = min(start + step, hi)
+            fold_rollups(transaction, start, end)
+            transaction.commit()
+            start = end
+    finally:
+        release_lock(target_cursor, WRITER_LOCK)
+    return max(0, hi - lo)
+
+
+def rebuild_rollups(target_cursor, target_db, window=50000, max_retries=5, lock_timeout=60):
+    """Recompute every bucket from scratch (after deletes, table swaps or out-of-order writers)."""
+    ensure_rollup_tables(target_cursor)
+    # Re-entrant for this session: refresh_rollups takes it again
+    acquire_lock(target_cursor, WRITER_LOCK, lock_timeout)
+    try:
+        for table in ROLLUPS:
+            target_cursor.execute(f"DELETE FROM {table}")
+        target_cursor.execute("DELETE FROM migration_state WHERE job_name = %s", (ROLLUP_JOB_NAME,))
+        target_db.commit()
+        return refresh_rollups(target_cursor, target_db, window, max_retries, lock_timeout)
+    finally:
+        release_lock(target_cursor, WRITER_LOCK)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the clocking rollup tables read by the report templates")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all buckets instead of folding in new rows")
+    parser.add_argument("--window", type=int, default=50000, help="activity_id values per rollup transaction")
+    args = parser.parse_args()
+
+    db = connect_db(**DB_CONFIG, db="clocking_reports")
+    cursor = db.cursor()
+    if args.rebuild:
+        rows = rebuild_rollups(cursor, db, window=args.window)
+    else:
+        rows = refresh_rollups(cursor, db, window=args.window)
+    print(f"✅ Rollups {'rebuilt' if args.rebuild else 'refreshed'} over {rows} activity ids.")
+    cursor.close()
+    db.close()
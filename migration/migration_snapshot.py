@@ -0,0 +1,120 @@
+import mysql.connector
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from migration_common import report_peak_rss, stream_rows, write_snapshot
+from migration_rollup import ROLLUPS
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": ""  # Adjust with your credentials if needed
+}
+
+# Source columns the activity jobs read, in the order they are replayed (da_id, like --mode full)
+SNAPSHOT_TABLES = {
+    "ss_daily_activity": "SELECT * FROM ss_daily_activity ORDER BY da_id ASC",
+    "ss_user": "SELECT id, id_key FROM ss_user ORDER BY id ASC",
+}
+MANIFEST = "manifest.json"
+
+# Replays always run as --mode full, which would duplicate every row of the live database.
+# They go into a scratch schema instead: lookup tables copied from the live one, activity tables empty.
+LIVE_DB = "clocking_reports"
+REPLAY_LOOKUP_TABLES = ["users", "projects", "category_clocking"]
+REPLAY_TABLES = ["daily_activities", "clocking_activities"]
+
+
+def connect_db(host, user, password, db):
+    return mysql.connector.connect(
+        host=host,
+        user=user,
+        password=password,
+        database=db
+    )
+
+
+def snapshot_path(directory, table):
+    return os.path.join(directory, f"{table}.jsonl.gz")
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def extract(directory, chunk_size=5000, only=None):
+    """Dump the source tables the activity jobs need to gzip JSONL files plus a manifest.
+
+    Each table is streamed in primary-key order (no fetchall), so memory
+    stays flat; the files can then be replayed with --snapshot as often as
+    needed without touching system-smartpro again.
+    """
+    os.makedirs(directory, exist_ok=True)
+    source_db = connect_db(**DB_CONFIG, db="system-smartpro")
+    manifest = {"created_at": datetime.now().isoformat(timespec="seconds"), "source": "system-smartpro", "tables": {}}
+    try:
+        for table, query in SNAPSHOT_TABLES.items():
+            if only and table not in only:
+                continue
+            path = snapshot_path(directory, table)
+            started = time.perf_counter()
+            cursor = source_db.cursor(dictionary=True)
+            # Write to a temp name first so an aborted extract never leaves a truncated snapshot behind
+            rows = write_snapshot(path + ".tmp", stream_rows(cursor, query, None, chunk_size))
+            cursor.close()
+            os.replace(path + ".tmp", path)
+            elapsed = time.perf_counter() - started
+            size = os.path.getsize(path)
+            manifest["tables"][table] = {"file": os.path.basename(path), "rows": rows, "bytes": size, "seconds": round(elapsed, 3)}
+            print(f"📦 {table}: {rows} rows → {path} ({size / 1024 / 1024:.1f} MB, {elapsed:.1f}s)")
+    finally:
+        source_db.close()
+
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2)
+    report_peak_rss("snapshot")
+    return manifest
+
+
+def check_replay_target(target):
+    if not target or target == LIVE_DB:
+        raise ValueError(f"Replays and benchmarks need a scratch target database, not the live {LIVE_DB}")
+
+
+def prepare_replay_target(target):
+    """Create (or reset) the scratch schema a snapshot is replayed into."""
+    check_replay_target(target)
+    db = connect_db(**DB_CONFIG, db=LIVE_DB)
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{target}`")
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+        for table in REPLAY_LOOKUP_TABLES + REPLAY_TABLES:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS `{target}`.`{table}` LIKE `{LIVE_DB}`.`{table}`")
+        for table in REPLAY_LOOKUP_TABLES + REPLAY_TABLES:
+            cursor.execute(f"TRUNCATE TABLE `{target}`.`{table}`")
+        for table in REPLAY_LOOKUP_TABLES:
+            cursor.execute(f"INSERT INTO `{target}`.`{table}` SELECT * FROM `{LIVE_DB}`.`{table}`")
+        # Watermarks and rollups of an earlier replay would be folded onto again
+        for table in ["migration_state", *ROLLUPS]:
+            cursor.execute(f"DROP TABLE IF EXISTS `{target}`.`{table}`")
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+        db.commit()
+    finally:
+        cursor.close()
+        db.close()
+    print(f"🧪 Replay target {target} reset (lookups copied from {LIVE_DB}).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extract-only step: dump the source rows the activity migrations read to a compressed local snapshot"
+    )
+    parser.add_argument("--output", type=str, default="snapshot", help="Snapshot directory")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows fetched from the source per round trip")
+    parser.add_argument("--only", nargs="+", choices=list(SNAPSHOT_TABLES), default=None, help="Extract a subset of tables")
+    args = parser.parse_args()
+    extract(args.output, chunk_size=args.chunk_size, only=args.only)
@@ -1,6 +1,7 @@
 import mysql.connector
 from datetime import datetime
 import argparse
+from migration_common import RunMetrics, UpsertWriter, WriteTransaction, stream_rows, report_peak_rss
 
 def connect_db(host, user, password, db):
     return mysql.connector.connect(
@@ -65,23 +66,21 @@ def normalize_position(value):
         return None
 
 
-def user_exists(cursor, user_id):
-    try:
-        cursor.execute("SELECT 1 FROM users WHERE user_id = %s LIMIT 1", (user_id,))
-        return cursor.fetchone() is not None
-    except Exception:
-        return False
-
-
-def migrate_users(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False):
+def migrate_users(mode: str = "incremental", since: str = None, limit: int = None, dry_run: bool = False, chunk_size: int = 1000,
+                  batch_size: int = 1000, metrics_json: str = None, record_run: bool = False, ids: list = None,
+                  commit_rows: int = 10000, commit_seconds: float = 5.0, max_retries: int = 5, target: str = "clocking_reports"):
     config = {
         "host": "localhost",
         "user": "root",
         "password": ""
     }
 
-    source_db = connect_db(**config, db="system-smartpro")
-    target_db = connect_db(**config, db="clocking_reports")
+    metrics = RunMetrics("users", {
+        "mode": mode, "since": since, "limit": limit, "dry_run": dry_run, "chunk_size": chunk_size, "batch_size": batch_size,
+        "commit_rows": commit_rows, "commit_seconds": commit_seconds, "max_retries": max_retries,
+    })
+    source_db = metrics.connection(connect_db(**config, db="system-smartpro"))
+    target_db = metrics.connection(connect_db(**config, db=target))
 
     source_cursor = source_db.cursor(dictionary=True)
     target_cursor = target_db.cursor()
@@ -111,6 +110,10 @@ def migrate_users(mode: str = "incremental", since: str = None, limit: int = Non
             "((updated_at IS NOT NULL AND updated_at >= %s) OR (created_at IS NOT NULL AND created_at >= %s))"
         )
         params.extend([effective_since, effective_since])
+    # Restrict to explicit ids (used by migration_reconcile.py to re-sync drifted rows)
+    if ids:
+        where_clauses.append(f"id IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
 
     if where_clauses:
         base_query += " WHERE " + " AND ".join(where_clauses)
@@ -118,8 +121,8 @@ def migrate_users(mode: str = "incremental", since: str = None, limit: int = Non
     if limit and isinstance(limit, int) and limit > 0:
         base_query += f" LIMIT {int(limit)}"
 
-    source_cursor.execute(base_query, tuple(params) if params else None)
-    rows = source_cursor.fetchall()
+    # Stream source rows in chunks so memory stays flat regardless of table size
+    rows = metrics.iterate("fetch", stream_rows(source_cursor, base_query, tuple(params) if params else None, chunk_size))
 
     upsert_query = """
         INSERT INTO users (
@@ -133,30 +136,30 @@ def migrate_users(mode: str = "incremental", since: str = None, limit: int = Non
             updated_at = VALUES(updated_at)
     """
 
-    inserted_new = 0
-    updated_existing = 0
+    transaction = WriteTransaction(target_db, target_cursor, commit_rows, commit_seconds, max_retries, metrics=metrics)
+    writer = UpsertWriter(
+        target_cursor, upsert_query, batch_size, dry_run=dry_run,
+        metrics=metrics, stage="upsert", transaction=transaction,
+    )
+
     skipped = 0
     max_updated_at = None
     max_id = None
 
     for row in rows:
-        exists = user_exists(target_cursor, row["user_id"])
-        if not dry_run:
-            target_cursor.execute(
-                upsert_query,
-                (
-                    row["user_id"],
-                    row["full_name"],
-                    row.get("email"),
-                    normalize_position(row.get("position")),
-                    row.get("created_at"),
-                    row.get("updated_at"),
-                ),
+        writer.add(
+            (
+                row["user_id"],
+                row["full_name"],
+                row.get("email"),
+                normalize_position(row.get("position")),
+                row.get("created_at"),
+                row.get("updated_at"),
             )
-        if exists:
-            updated_existing += 1
-        else:
-            inserted_new += 1
+        )
+        if not dry_run:
+            # Upserts are idempotent, so any flushed prefix is a safe commit point
+            transaction.maybe_commit()
 
         upd = row.get("updated_at") or row.get("created_at")
         try:
@@ -167,16 +170,25 @@ def migrate_users(mode: str = "incremental", since: str = None, limit: int = Non
         except Exception:
             pass
 
+    writer.flush()
     if not dry_run:
-        target_db.commit()
+        transaction.commit()
 
-    total = inserted_new + updated_existing
+    inserted_new, updated_existing, unchanged = writer.inserted, writer.updated, writer.unchanged
+    total = inserted_new + updated_existing + unchanged
     print(
-        f"✅ Users processed: {total}. Inserted: {inserted_new}, Updated: {updated_existing}, Skipped: {skipped}."
+        f"✅ Users processed: {total}. Inserted: {inserted_new}, Updated: {updated_existing}, "
+        f"Unchanged: {unchanged}, Skipped: {skipped}."
     )
 
     if (mode == "incremental" or effective_since) and not dry_run:
-        update_watermark(target_cursor, target_db, "ss_user", max_updated_at, max_id)
+        with metrics.stage("watermark"):
+            update_watermark(target_cursor, target_db, "ss_user", max_updated_at, max_id)
+
+    report_peak_rss("users")
+    metrics.count(processed=total, inserted=inserted_new, updated=updated_existing, unchanged=unchanged, skipped=skipped,
+                  deadlock_retries=transaction.retried)
+    metrics.emit(metrics_json, target_cursor if record_run and not dry_run else None, target_db)
 
     # Cleanup
     source_cursor.close()
@@ -191,5 +203,14 @@ if __name__ == "__main__":
     parser.add_argument("--since", type=str, default=None)
     parser.add_argument("--limit", type=int, default=None)
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows fetched from the source per round trip")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per multi-row INSERT ... ON DUPLICATE KEY UPDATE")
+    parser.add_argument("--metrics-json", type=str, default=None, help="Append the JSON run report to this file ('-' for stdout)")
+    parser.add_argument("--record-run", action="store_true", help="Also append the run report to migration_runs")
+    parser.add_argument("--commit-rows", type=int, default=10000, help="Commit after this many written rows")
+    parser.add_argument("--commit-seconds", type=float, default=5.0, help="...or after this many seconds, whichever comes first")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries (with backoff) for a batch hit by a deadlock/lock-wait timeout")
     args = parser.parse_args()
-    migrate_users(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run)
+    migrate_users(mode=args.mode, since=args.since, limit=args.limit, dry_run=args.dry_run, chunk_size=args.chunk_size,
+                  batch_size=args.batch_size, metrics_json=args.metrics_json, record_run=args.record_run,
+                  commit_rows=args.commit_rows, commit_seconds=args.commit_seconds, max_retries=args.max_retries)
@@ -0,0 +1,335 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from migration_common import (
+    IntSet,
+    LeaseLost,
+    UpsertWriter,
+    TsvStager,
+    WriteTransaction,
+    bulk_load,
+    read_snapshot,
+    snapshot_decode,
+    snapshot_encode,
+    upsert_outcomes,
+    write_snapshot,
+)
+
+
+class FakeKeyedCursor:
+    """Cursor over one in-memory keyed table reporting MySQL's ON DUPLICATE KEY UPDATE
+    affected rows (1 insert, 2 change, 0 same), summed over an executemany like the server."""
+
+    def __init__(self, rows=None):
+        self.rows = dict(rows or {})
+        self.rowcount = 0
+        self.statements = []
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        self.rowcount = self._upsert(params)
+
+    def executemany(self, query, params):
+        self.statements.append(query)
+        self.rowcount = sum(self._upsert(row) for row in params)
+
+    def _upsert(self, row):
+        key, value = row
+        if key not in self.rows:
+            self.rows[key] = value
+            return 1
+        if self.rows[key] != value:
+            self.rows[key] = value
+            return 2
+        return 0
+
+
+UPSERT = "INSERT INTO users (user_id, full_name) VALUES (%s, %s) ON DUPLICATE KEY UPDATE full_name = VALUES(full_name)"
+
+
+class UpsertWriterTest(unittest.TestCase):
+    def write(self, cursor, rows, batch_size=10, **kwargs):
+        writer = UpsertWriter(cursor, UPSERT, batch_size, **kwargs)
+        for row in rows:
+            writer.add(row)
+        writer.flush()
+        return writer
+
+    def test_new_and_edited_rows(self):
+        cursor = FakeKeyedCursor({1: "Ani", 2: "Budi"})
+        writer = self.write(cursor, [(1, "Ani Lestari"), (2, "Budi Santoso"), (3, "Citra"), (4, "Dewi")])
+        self.assertEqual((writer.inserted, writer.updated, writer.unchanged), (2, 2, 0))
+        self.assertEqual(cursor.rows[2], "Budi Santoso")
+
+    def test_rerun_over_mostly_unchanged_rows(self):
+        cursor = FakeKeyedCursor({1: "Ani", 2: "Budi", 3: "Citra"})
+        writer = self.write(cursor, [(1, "Ani"), (2, "Budi Santoso"), (3, "Citra")])
+        self.assertEqual((writer.inserted, writer.updated, writer.unchanged), (0, 1, 2))
+
+    def test_one_statement_per_batch(self):
+        cursor = FakeKeyedCursor({1: "Ani"})
+        writer = self.write(cursor, [(1, "Ani"), (2, "Budi"), (3, "Citra")], batch_size=2)
+        self.assertEqual(len(cursor.statements), 2)
+        self.assertTrue(all(statement == UPSERT for statement in cursor.statements))
+        self.assertEqual((writer.inserted, writer.updated, writer.unchanged), (2, 0, 1))
+
+    def test_repeated_key_in_batch_is_inserted_once(self):
+        writer = self.write(FakeKeyedCursor(), [(7, "Gita"), (7, "Gita Putri")])
+        self.assertEqual((writer.inserted, writer.updated, writer.unchanged), (1, 1, 0))
+
+    def test_dry_run_sends_nothing(self):
+        cursor = FakeKeyedCursor({1: "Ani"})
+        writer = self.write(cursor, [(1, "Ani Lestari"), (2, "Budi")], dry_run=True)
+        self.assertEqual((writer.inserted, writer.updated, writer.unchanged), (0, 2, 0))
+        self.assertEqual((cursor.rows, cursor.statements), ({1: "Ani"}, []))
+
+
+class UpsertOutcomesTest(unittest.TestCase):
+    def test_splits_are_exact_unless_inserts_mix_with_unchanged_rows(self):
+        cases = [
+            # (inserted, updated, unchanged) -> affected rows
+            (5, 0, 0), (0, 5, 0), (2, 3, 0), (0, 0, 5), (0, 2, 3), (1, 0, 4),
+        ]
+        for inserted, updated, unchanged in cases:
+            affected = inserted + 2 * updated
+            with self.subTest(outcome=(inserted, updated, unchanged)):
+                self.assertEqual(upsert_outcomes(affected, inserted + updated + unchanged), (inserted, updated, unchanged))
+
+    def test_always_adds_up_to_the_batch(self):
+        for rows in range(1, 6):
+            for affected in range(0, 2 * rows + 1):
+                self.assertEqual(sum(upsert_outcomes(affected, rows)), rows)
+
+
+class FakeLoadCursor:
+    """Answers the queries bulk_load sends: emptiness probe, index listing, ALTERs and LOAD DATA."""
+
+    def __init__(self, populated):
+        self.populated = populated
+        self.statements = []
+        self.result = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        self.result = []
+        if query.startswith("SELECT 1 FROM"):
+            table = query.split("`")[1]
+            self.result = [(1,)] if table in self.populated else []
+        elif "information_schema.statistics" in query:
+            self.result = [("idx_user", "user_id", None, "BTREE")]
+        elif query.startswith("LOAD DATA"):
+            self.rowcount = 1
+
+    def fetchall(self):
+        return self.result
+
+
+class BulkLoadTest(unittest.TestCase):
+    def load(self, populated):
+        cursor = FakeLoadCursor(populated)
+        with tempfile.TemporaryDirectory() as tmp:
+            stagers = [TsvStager(table, ("a",), directory=tmp) for table in ("daily_activities", "clocking_activities")]
+            for stager in stagers:
+                stager.add((1,))
+            loaded = bulk_load(cursor, mock.Mock(), stagers)
+        self.assertEqual(loaded, {"daily_activities": 1, "clocking_activities": 1})
+        return cursor.statements
+
+    def test_only_empty_tables_lose_their_indexes(self):
+        statements = self.load(populated={"clocking_activities"})
+        alters = [statement for statement in statements if statement.startswith("ALTER")]
+        self.assertEqual(alters, [
+            "ALTER TABLE `daily_activities` DROP INDEX `idx_user`",
+            "ALTER TABLE `daily_activities` ADD INDEX `idx_user` (`user_id`)",
+        ])
+
+    def test_unique_checks_stay_on(self):
+        self.assertFalse(any("unique_checks" in statement for statement in self.load(populated=set())))
+
+
+class IntSetTest(unittest.TestCase):
+    def test_matches_a_set_across_containers(self):
+        values = [0, 1, 65535, 65536, 65537, 10 ** 9, 3, 3]
+        ints = IntSet(values)
+        self.assertEqual(len(ints), len(set(values)))
+        for value in values:
+            self.assertIn(value, ints)
+        for value in (2, 65534, 131072, 10 ** 9 + 1):
+            self.assertNotIn(value, ints)
+
+    def test_dense_container_switches_to_bitmap(self):
+        ints = IntSet(range(0, 2 * IntSet.ARRAY_LIMIT, 2))
+        self.assertNotIsInstance(ints._containers[0], bytearray)
+        ints.add(2 * IntSet.ARRAY_LIMIT)
+        self.assertIsInstance(ints._containers[0], bytearray)
+        self.assertEqual(len(ints), IntSet.ARRAY_LIMIT + 1)
+        self.assertIn(2 * IntSet.ARRAY_LIMIT, ints)
+        self.assertNotIn(1, ints)
+        ints.add(4)
+        self.assertEqual(len(ints), IntSet.ARRAY_LIMIT + 1)
+        self.assertEqual(ints.nbytes(), 8192)
+
+    def test_non_members_never_raise(self):
+        ints = IntSet([5])
+        self.assertIn(5.0, ints)
+        for value in (-5, 5.5, "5", None):
+            self.assertNotIn(value, ints)
+
+    def test_rejects_negative_values(self):
+        with self.assertRaises(ValueError):
+            IntSet().add(-1)
+
+
+class ServerError(Exception):
+    def __init__(self, errno):
+        super().__init__(f"error {errno}")
+        self.errno = errno
+
+
+class FlakyConnection:
+    """Connection + cursor that log every call and raise the queued errors at chosen steps.
+
+    ``failures`` maps (call kind, nth call of that kind) to the errno to raise,
+    e.g. {("execute", 2): 1213} deadlocks the second execute.
+    """
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.counts = {}
+        self.rowcount = 1
+
+    def _step(self, kind, detail=None):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.calls.append((kind, detail))
+        errno = self.failures.pop((kind, self.counts[kind]), None)
+        if errno is not None:
+            raise ServerError(errno)
+
+    def execute(self, query, params=None):
+        self._step("execute", query)
+
+    def executemany(self, query, params):
+        self._step("executemany", query)
+
+    def commit(self):
+        self._step("commit")
+
+    def rollback(self):
+        self._step("rollback")
+
+
+class WriteTransactionTest(unittest.TestCase):
+    def transaction(self, conn, **kwargs):
+        return WriteTransaction(conn, conn, backoff=0, **kwargs)
+
+    def statements(self, conn):
+        return [detail for kind, detail in conn.calls if kind in ("execute", "executemany")]
+
+    def test_deadlock_replays_the_open_transaction(self):
+        conn = FlakyConnection({("execute", 2): 1213})
+        transaction = self.transaction(conn)
+        transaction.execute("A")
+        transaction.execute("B")
+        transaction.commit()
+        self.assertEqual(self.statements(conn), ["A", "B", "A", "B"])
+        self.assertEqual([kind for kind, _ in conn.calls].count("rollback"), 1)
+        self.assertEqual(transaction.retried, 1)
+        self.assertEqual((transaction.commits, transaction.journal), (1, []))
+
+    def test_deadlock_on_commit_replays_before_committing_again(self):
+        conn = FlakyConnection({("commit", 1): 1205})
+        transaction = self.transaction(conn)
+        transaction.execute("A", ("x",), many=True)
+        transaction.commit()
+        self.assertEqual(
+            [kind for kind, _ in conn.calls], ["executemany", "commit", "rollback", "executemany", "commit"]
+        )
+
+    def test_only_the_window_since_the_last_commit_is_replayed(self):
+        conn = FlakyConnection({("execute", 3): 1213})
+        transaction = self.transaction(conn)
+        transaction.execute("A")
+        transaction.commit()
+        transaction.execute("B")
+        transaction.execute("C")
+        self.assertEqual(self.statements(conn), ["A", "B", "C", "B", "C"])
+
+    def test_other_errors_are_not_retried(self):
+        conn = FlakyConnection({("execute", 1): 1062})
+        transaction = self.transaction(conn)
+        with self.assertRaises(ServerError):
+            transaction.execute("A")
+        self.assertEqual(transaction.retried, 0)
+
+    def test_gives_up_after_the_retry_budget(self):
+        conn = FlakyConnection({("execute", n): 1213 for n in range(1, 4)})
+        transaction = self.transaction(conn, retries=2)
+        with self.assertRaises(ServerError):
+            transaction.execute("A")
+        self.assertEqual(transaction.retried, 2)
+
+    def test_rejected_fence_rolls_back_and_raises(self):
+        conn = FlakyConnection()
+        transaction = self.transaction(conn, fence=lambda cursor: False)
+        transaction.execute("A")
+        with self.assertRaises(LeaseLost):
+            transaction.commit()
+        self.assertNotIn(("commit", None), conn.calls)
+        self.assertEqual(conn.calls[-1], ("rollback", None))
+        self.assertEqual(transaction.journal, [])
+
+    def test_due_after_commit_rows(self):
+        transaction = self.transaction(FlakyConnection(), commit_rows=3, commit_seconds=0)
+        self.assertFalse(transaction.due())
+        transaction.execute("A", rows=2)
+        self.assertFalse(transaction.maybe_commit())
+        transaction.execute("B", rows=1)
+        self.assertTrue(transaction.maybe_commit())
+        self.assertFalse(transaction.due())
+
+
+class SnapshotCodecTest(unittest.TestCase):
+    ROW = {
+        "da_id": 42,
+        "da_date": date(2025, 3, 1),
+        "da_created_date": datetime(2025, 3, 1, 8, 30, 15, 250000),
+        "da_start_tm": time(8, 30),
+        "da_duration": timedelta(hours=7, minutes=45),
+        "da_rate": Decimal("12.50"),
+        "da_blob": b"\x00\xffraw",
+        "da_keterangan": "Rapat {\"$d\"} ✅",
+        "da_updated_date": None,
+    }
+
+    def test_round_trip_keeps_driver_types(self):
+        line = json.dumps(self.ROW, default=snapshot_encode)
+        restored = json.loads(line, object_hook=snapshot_decode)
+        self.assertEqual(restored, self.ROW)
+        for key, value in self.ROW.items():
+            self.assertIs(type(restored[key]), type(value), key)
+
+    def test_plain_objects_are_left_alone(self):
+        self.assertEqual(snapshot_decode({"$d": "2025-03-01", "other": 1}), {"$d": "2025-03-01", "other": 1})
+        self.assertEqual(snapshot_decode({"$unknown": 1}), {"$unknown": 1})
+
+    def test_unsupported_type_raises(self):
+        with self.assertRaises(TypeError):
+            snapshot_encode(object())
+
+    def test_file_round_trip_keeps_order(self):
+        rows = [dict(self.ROW, da_id=i) for i in range(3)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ss_daily_activity.jsonl.gz")
+            self.assertEqual(write_snapshot(path, iter(rows)), 3)
+            self.assertEqual(list(read_snapshot(path)), rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import types
+import unittest
+from unittest import mock
+
+try:
+    import mysql.connector  # noqa: F401
+except ImportError:
+    # Only the pure narrowing logic is tested here; no server is ever contacted
+    mysql = types.ModuleType("mysql")
+    mysql.connector = types.ModuleType("mysql.connector")
+    sys.modules.update({"mysql": mysql, "mysql.connector": mysql.connector})
+
+import migration_reconcile
+from migration_reconcile import PAIRS, reconcile_pair, resync
+
+
+class FakeSide:
+    """In-memory stand-in for Side: {key: row hash}, answering the same three queries."""
+
+    def __init__(self, rows):
+        self.rows = dict(rows)
+        self.queries = 0
+
+    def key_bounds(self):
+        self.queries += 1
+        if not self.rows:
+            return (None, None)
+        return (min(self.rows), max(self.rows))
+
+    def buckets(self, lo, hi, width):
+        self.queries += 1
+        buckets = {}
+        for key, checksum in self.rows.items():
+            if lo <= key < hi:
+                count, total = buckets.get((key - lo) // width, (0, 0))
+                buckets[(key - lo) // width] = (count + 1, total + checksum)
+        return buckets
+
+    def leaf(self, lo, hi):
+        self.queries += 1
+        return {key: checksum for key, checksum in self.rows.items() if lo <= key < hi}
+
+
+class ReconcilePairTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = {key: key * 7 + 3 for key in range(1, 20001)}
+
+    def test_identical_sides_stop_at_the_root(self):
+        source, target = FakeSide(self.rows), FakeSide(self.rows)
+        self.assertEqual(reconcile_pair(source, target), ([], [], []))
+        # Bounds plus one bucket query per side: no leaf was ever read
+        self.assertEqual(source.queries, 2)
+
+    def test_finds_missing_changed_and_extra_keys(self):
+        target_rows = dict(self.rows)
+        del target_rows[17], target_rows[15000]
+        target_rows[9001] += 1
+        target_rows[20005] = 1
+        result = reconcile_pair(FakeSide(self.rows), FakeSide(target_rows), fanout=8, leaf_size=64)
+        self.assertEqual(result, ([17, 15000], [9001], [20005]))
+
+    def test_only_mismatched_buckets_are_descended(self):
+        target_rows = dict(self.rows)
+        target_rows[12345] += 1
+        source = FakeSide(self.rows)
+        reconcile_pair(source, FakeSide(target_rows), fanout=16, leaf_size=512)
+        # One path from the root to a single leaf, not a full scan
+        self.assertLess(source.queries, 10)
+
+    def test_empty_sides(self):
+        self.assertEqual(reconcile_pair(FakeSide({}), FakeSide({})), ([], [], []))
+        self.assertEqual(reconcile_pair(FakeSide({}), FakeSide({5: 1})), ([], [], [5]))
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+
+
+class ResyncTest(unittest.TestCase):
+    def test_pairs_hash_the_same_number_of_columns(self):
+        for name, spec in PAIRS.items():
+            with self.subTest(pair=name):
+                self.assertTrue(all(len(column) == 2 for column in spec["columns"]))
+        self.assertIn(("da_activity", "activity_type"), PAIRS["daily_activities"]["columns"])
+
+    def test_clocking_drift_rebuilds_only_the_clocking_rows(self):
+        cursor, db = RecordingCursor(), mock.Mock()
+        with mock.patch.object(migration_reconcile, "migrate_clocking_activities") as migrate, \
+                mock.patch.object(migration_reconcile, "migrate_daily_activity") as migrate_daily, \
+                mock.patch.object(migration_reconcile, "rebuild_rollups") as rebuild:
+            resync("clockings", cursor, db, missing=[3], changed=[7], extra=[9])
+        self.assertEqual(
+            cursor.statements, [("DELETE FROM clocking_activities WHERE daily_activity_id IN (%s, %s)", (7, 9))]
+        )
+        migrate.assert_called_once_with(mode="full", ids=[3, 7], rollup=False)
+        migrate_daily.assert_not_called()
+        rebuild.assert_called_once_with(cursor, db)
+
+
+if __name__ == "__main__":
+    unittest.main()